@@ -0,0 +1,142 @@
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy import select
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from database import CountryTable, ReferrerDomainTable, UserAgentTable
+from typing import Any, Callable, Dict, Iterable, List, Optional
+from collections import OrderedDict
+from functools import lru_cache
+from urllib.parse import urlsplit
+import hashlib
+import logging
+import os
+
+logger = logging.getLogger(__name__)
+
+# Values remembered per dimension; each entry is a short string and an int
+ANALYTICS_DIMENSION_CACHE_SIZE = int(os.getenv("ANALYTICS_DIMENSION_CACHE_SIZE", "100000"))
+
+@lru_cache(maxsize=10000)
+def normalize_referrer(referrer: str) -> Optional[str]:
+    """Reduce a Referer header to its lower-cased host, without a leading www."""
+    try:
+        host = urlsplit(referrer.strip()).hostname
+    except ValueError:
+        return None
+    if not host:
+        return None
+    return host[4:] if host.startswith("www.") else host
+
+def _sha1(value: str) -> str:
+    return hashlib.sha1(value.encode("utf-8", "surrogatepass")).hexdigest()
+
+class DimensionInterner:
+    """Maps dimension values to integer surrogate keys, creating rows on first sight
+    
+    Known values are answered from a per-process LRU. Misses for a whole
+    batch are resolved with one INSERT ... ON CONFLICT DO NOTHING RETURNING,
+    plus one SELECT for values another worker inserted concurrently.
+    """
+    
+    def __init__(
+        self,
+        table,
+        key_column: str,
+        key: Callable[[str], str] = lambda value: value,
+        extra_columns: Optional[Dict[str, Callable[[str], Any]]] = None,
+        max_entries: int = ANALYTICS_DIMENSION_CACHE_SIZE
+    ):
+        self.table = table.__table__
+        self.key_column = self.table.c[key_column]
+        self.key = key
+        self.extra_columns = extra_columns or {}
+        self.max_entries = max_entries
+        self._ids: "OrderedDict[str, int]" = OrderedDict()
+    
+    def get_cached(self, value: str) -> Optional[int]:
+        dimension_id = self._ids.get(value)
+        if dimension_id is not None:
+            self._ids.move_to_end(value)
+        return dimension_id
+    
+    def _remember(self, value: str, dimension_id: int):
+        self._ids[value] = dimension_id
+        if len(self._ids) > self.max_entries:
+            self._ids.popitem(last=False)
+    
+    async def resolve(self, db: AsyncSession, values: Iterable[Optional[str]]) -> Dict[str, int]:
+        """Ids for every non-empty value, interning the ones never seen before"""
+        ids: Dict[str, int] = {}
+        missing: Dict[str, str] = {}
+        for value in values:
+            if not value or value in ids:
+                continue
+            dimension_id = self.get_cached(value)
+            if dimension_id is None:
+                missing[self.key(value)] = value
+            else:
+                ids[value] = dimension_id
+        
+        if not missing:
+            return ids
+        
+        # Sorted so concurrent flushers take row locks in the same order
+        rows = [
+            {self.key_column.name: key, **{name: make(value) for name, make in self.extra_columns.items()}}
+            for key, value in sorted(missing.items())
+        ]
+        stmt = pg_insert(self.table).values(rows).on_conflict_do_nothing(
+            index_elements=[self.key_column]
+        ).returning(self.table.c.id, self.key_column)
+        found = {row[1]: row[0] for row in (await db.execute(stmt)).fetchall()}
+        
+        if len(found) < len(missing):
+            stmt = select(self.table.c.id, self.key_column).where(
+                self.key_column.in_([key for key in missing if key not in found])
+            )
+            found.update({row[1]: row[0] for row in (await db.execute(stmt)).fetchall()})
+        
+        for key, dimension_id in found.items():
+            value = missing[key]
+            ids[value] = dimension_id
+            self._remember(value, dimension_id)
+        return ids
+    
+    def clear(self):
+        self._ids.clear()
+
+country_dimension = DimensionInterner(CountryTable, "code")
+referrer_domain_dimension = DimensionInterner(ReferrerDomainTable, "domain")
+user_agent_dimension = DimensionInterner(
+    UserAgentTable, "user_agent_hash", key=_sha1, extra_columns={"user_agent": lambda value: value}
+)
+
+def normalize_referrers(events: List) -> None:
+    """Analytics pipeline stage: reduce referrers to their domain"""
+    for event in events:
+        event.referrer = normalize_referrer(event.referrer) if event.referrer else None
+
+async def intern_dimensions(db: AsyncSession, events: List) -> List[Dict[str, Optional[int]]]:
+    """Surrogate keys of each event's country, referrer domain and user agent
+    
+    New dimension rows are committed straight away, so the caches never hold
+    the id of a row that was rolled back.
+    """
+    try:
+        countries = await country_dimension.resolve(db, (event.country for event in events))
+        referrers = await referrer_domain_dimension.resolve(db, (event.referrer for event in events))
+        user_agents = await user_agent_dimension.resolve(db, (event.user_agent for event in events))
+        await db.commit()
+    except Exception:
+        await db.rollback()
+        for dimension in (country_dimension, referrer_domain_dimension, user_agent_dimension):
+            dimension.clear()
+        raise
+    
+    return [
+        {
+            "country_id": countries.get(event.country) if event.country else None,
+            "referrer_domain_id": referrers.get(event.referrer) if event.referrer else None,
+            "user_agent_id": user_agents.get(event.user_agent) if event.user_agent else None,
+        }
+        for event in events
+    ]
@@ -0,0 +1,269 @@
+from sqlalchemy import select, insert, update, bindparam, func
+from database import AsyncSessionLocal, AnalyticsTable, LinkTable
+from ua_enrichment import enrich_user_agents
+from geo_enrichment import geo_enricher
+from analytics_dimensions import normalize_referrers, intern_dimensions
+from user_stats_services import UserStatsService
+from metrics_services import record_daily_clicks
+from sharding import link_shards
+from typing import Callable, Deque, Dict, List, Optional
+from collections import Counter, deque
+from datetime import datetime
+import asyncio
+import logging
+import os
+import uuid
+
+logger = logging.getLogger(__name__)
+
+ANALYTICS_BATCH_SIZE = int(os.getenv("ANALYTICS_BATCH_SIZE", "500"))
+ANALYTICS_FLUSH_SECONDS = float(os.getenv("ANALYTICS_FLUSH_SECONDS", "2"))
+# Clicks buffered beyond this are dropped (and counted) rather than growing memory without bound
+ANALYTICS_MAX_QUEUE = int(os.getenv("ANALYTICS_MAX_QUEUE", "100000"))
+
+class ClickEvent:
+    """One redirect, as captured on the request path and filled in by the pipeline stages"""
+    
+    __slots__ = (
+        "link_id", "short_url", "original_url", "user_id", "click_date", "is_bot", "shard",
+        "user_agent", "ip_address", "referrer",
+        "device_type", "browser", "os", "country", "city",
+    )
+    
+    def __init__(
+        self,
+        link_id: str,
+        short_url: Optional[str],
+        original_url: Optional[str],
+        user_id: Optional[str] = None,
+        user_agent: Optional[str] = None,
+        ip_address: Optional[str] = None,
+        referrer: Optional[str] = None,
+        is_bot: bool = False,
+        shard: int = 0
+    ):
+        self.link_id = link_id
+        self.short_url = short_url
+        self.original_url = original_url
+        self.user_id = user_id
+        self.click_date = datetime.utcnow()
+        self.is_bot = is_bot
+        self.shard = shard
+        self.user_agent = user_agent
+        self.ip_address = ip_address
+        self.referrer = referrer
+        self.device_type = None
+        self.browser = None
+        self.os = None
+        self.country = None
+        self.city = None
+
+# A stage takes a batch of human click events and annotates them in place
+PipelineStage = Callable[[List[ClickEvent]], None]
+
+class AnalyticsPipeline:
+    """Buffers click events and writes them to the database in batches
+    
+    The redirect handlers only call submit(), an O(1) append. A background
+    flusher drains the buffer every ANALYTICS_FLUSH_SECONDS (or as soon as a
+    full batch is waiting), runs the enrichment stages on a worker thread,
+    inserts the analytics rows with one executemany and adds the per-link
+    click totals with one UPDATE per batch and shard, folding them into
+    user_stats. Bot clicks only bump links.bot_clicks.
+    """
+    
+    def __init__(
+        self,
+        stages: Optional[List[PipelineStage]] = None,
+        batch_size: int = ANALYTICS_BATCH_SIZE,
+        max_queue: int = ANALYTICS_MAX_QUEUE
+    ):
+        self.stages: List[PipelineStage] = list(stages or [])
+        self.batch_size = batch_size
+        self.max_queue = max_queue
+        self.dropped = 0
+        self._queue: Deque[ClickEvent] = deque()
+        self._wakeup = asyncio.Event()
+        self._flush_lock = asyncio.Lock()
+        self._task: Optional[asyncio.Task] = None
+    
+    def add_stage(self, stage: PipelineStage):
+        self.stages.append(stage)
+    
+    def submit(self, event: ClickEvent) -> bool:
+        """Queue a click for recording; False if the buffer is full and the click was dropped"""
+        if len(self._queue) >= self.max_queue:
+            self.dropped += 1
+            if self.dropped % 1000 == 1:
+                logger.warning(f"Analytics buffer full, {self.dropped} click(s) dropped so far")
+            return False
+        
+        self._queue.append(event)
+        if len(self._queue) >= self.batch_size:
+            self._wakeup.set()
+        return True
+    
+    def pending(self) -> int:
+        return len(self._queue)
+    
+    def _take_batch(self) -> List[ClickEvent]:
+        count = min(self.batch_size, len(self._queue))
+        return [self._queue.popleft() for _ in range(count)]
+    
+    def _enrich(self, events: List[ClickEvent]):
+        for stage in self.stages:
+            try:
+                stage(events)
+            except Exception as e:
+                # A broken stage must not cost us the clicks themselves
+                logger.error(f"Analytics stage {getattr(stage, '__name__', type(stage).__name__)} failed: {e}")
+    
+    async def flush(self):
+        """Write everything buffered so far"""
+        async with self._flush_lock:
+            while self._queue:
+                batch = self._take_batch()
+                humans = [event for event in batch if not event.is_bot]
+                if humans and self.stages:
+                    await asyncio.to_thread(self._enrich, humans)
+                
+                try:
+                    unwritten = await self._write(batch, humans)
+                except Exception as e:
+                    logger.error(f"Error writing {len(batch)} click event(s): {e}")
+                    unwritten = batch
+                
+                if unwritten:
+                    # Put them back for the next attempt, within the buffer bound
+                    room = self.max_queue - len(self._queue)
+                    self._queue.extendleft(reversed(unwritten[:max(room, 0)]))
+                    self.dropped += max(len(unwritten) - room, 0)
+                    return
+    
+    async def _write(self, batch: List[ClickEvent], humans: List[ClickEvent]) -> List[ClickEvent]:
+        """Write a batch shard by shard; returns the events that were not written"""
+        now = datetime.utcnow()
+        events_by_shard: Dict[int, List[ClickEvent]] = {}
+        for event in batch:
+            events_by_shard.setdefault(event.shard, []).append(event)
+        
+        async with AsyncSessionLocal() as db:
+            rows_by_shard: Dict[int, List[dict]] = {}
+            if humans:
+                # Country, referrer domain and user agent are stored as dimension ids
+                dimensions = await intern_dimensions(db, humans)
+                for event, event_dimensions in zip(humans, dimensions):
+                    rows_by_shard.setdefault(event.shard, []).append({
+                        "id": str(uuid.uuid4()),
+                        "link_id": event.link_id,
+                        "short_url": event.short_url,
+                        "original_url": event.original_url,
+                        "clicks": 1,
+                        "unique_clicks": 1,
+                        "click_date": event.click_date,
+                        "city": event.city,
+                        "device_type": event.device_type,
+                        "browser": event.browser,
+                        "os": event.os,
+                        "ip_address": event.ip_address,
+                        "created_at": now,
+                        **event_dimensions,
+                    })
+            
+            # Shards in their own database commit on their own; a shard on the
+            # primary shares this session and commits with the stats below
+            committed: List[ClickEvent] = []
+            pending: List[ClickEvent] = []
+            failed: List[ClickEvent] = []
+            clicked_links = []
+            for shard, events in sorted(events_by_shard.items()):
+                try:
+                    async with link_shards.session(shard, db) as shard_db:
+                        links = await self._write_shard(shard_db, events, rows_by_shard.get(shard, []), now)
+                        if link_shards.is_separate(shard_db, db):
+                            # Owners stay locked until the deltas commit, so a summary rebuild
+                            # cannot count these clicks and then get their delta on top
+                            await UserStatsService(db).lock(link.user_id for link in links)
+                            await shard_db.commit()
+                            committed.extend(events)
+                        else:
+                            pending.extend(events)
+                    clicked_links.extend(links)
+                except Exception as e:
+                    logger.error(f"Error writing {len(events)} click event(s) to shard {shard}: {e}")
+                    if link_shards.shards[shard].is_primary:
+                        # Only this shard's writes are in the shared session so far
+                        await db.rollback()
+                    failed.extend(events)
+            
+            written = [event for event in committed + pending if not event.is_bot]
+            try:
+                if written:
+                    await record_daily_clicks(db, (event.click_date for event in written))
+                if clicked_links:
+                    # Keep the dashboard summaries in step with the link totals
+                    await UserStatsService(db).record_clicks(
+                        Counter(event.link_id for event in written), links=clicked_links
+                    )
+                await db.commit()
+            except Exception as e:
+                # Only the primary's events go back for a retry: clicks already committed
+                # on their own shards must not be written twice
+                logger.error(f"Error updating click summaries for {len(written)} click event(s): {e}")
+                await db.rollback()
+                return failed + pending
+            return failed
+    
+    async def _write_shard(self, db, events: List[ClickEvent], rows: List[dict], now: datetime) -> list:
+        """Analytics rows and link counters for one shard; returns the clicked links for user_stats"""
+        clicks_by_link = Counter(event.link_id for event in events if not event.is_bot)
+        bot_clicks_by_link = Counter(event.link_id for event in events if event.is_bot)
+        links = LinkTable.__table__
+        clicked_links = []
+        
+        if rows:
+            await db.execute(insert(AnalyticsTable.__table__), rows)
+        if clicks_by_link:
+            await db.execute(
+                update(links).where(links.c.id == bindparam("link_id")).values(
+                    clicks=func.coalesce(links.c.clicks, 0) + bindparam("delta"),
+                    updated_at=now
+                ),
+                [{"link_id": link_id, "delta": delta} for link_id, delta in clicks_by_link.items()]
+            )
+            clicked_links = (await db.execute(
+                select(links.c.id, links.c.user_id, links.c.short_url, links.c.title, links.c.clicks).where(
+                    links.c.id.in_(list(clicks_by_link)),
+                    links.c.user_id.isnot(None)
+                )
+            )).fetchall()
+        if bot_clicks_by_link:
+            await db.execute(
+                update(links).where(links.c.id == bindparam("link_id")).values(
+                    bot_clicks=func.coalesce(links.c.bot_clicks, 0) + bindparam("delta")
+                ),
+                [{"link_id": link_id, "delta": delta} for link_id, delta in bot_clicks_by_link.items()]
+            )
+        return clicked_links
+    
+    async def _run(self, interval: float):
+        while True:
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+            await self.flush()
+    
+    def start(self, interval: float = ANALYTICS_FLUSH_SECONDS):
+        """Start the background flusher"""
+        self._task = asyncio.create_task(self._run(interval))
+    
+    async def stop(self):
+        """Stop the flusher and write what is still buffered"""
+        if self._task:
+            self._task.cancel()
+            self._task = None
+        await self.flush()
+
+analytics_pipeline = AnalyticsPipeline(stages=[enrich_user_agents, geo_enricher, normalize_referrers])
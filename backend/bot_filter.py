@@ -0,0 +1,149 @@
+from typing import Iterable, List, Optional, Tuple
+from rate_limit import RATE_LIMIT_TRUSTED_HOPS, forwarded_client_ip
+from bisect import bisect_right
+from functools import lru_cache
+import ipaddress
+import logging
+import os
+import re
+import socket
+
+logger = logging.getLogger(__name__)
+
+# count: bump links.bot_clicks only; drop: record nothing; record: treat bots like humans
+BOT_CLICK_POLICY = os.getenv("BOT_CLICK_POLICY", "count").lower()
+
+# Proxies in front of the app that append to X-Forwarded-For; the same as the rate limiter's unless set
+BOT_FILTER_TRUSTED_HOPS = int(os.getenv("BOT_FILTER_TRUSTED_HOPS", str(RATE_LIMIT_TRUSTED_HOPS)))
+
+# Optional file with extra crawler networks, one CIDR per line ('#' starts a comment)
+BOT_IP_RANGES_FILE = os.getenv("BOT_IP_RANGES_FILE")
+
+# =====================================================
+# USER AGENT PATTERNS
+# =====================================================
+
+# "bot" where it ends a word (googlebot/2.1, adsbot-google, yandex_bot), but not in the
+# CUBOT phone brand that Android browsers put in their user agent
+BOT_USER_AGENT_WORD = r"(?<! cu)bot(?:\b|_)"
+
+# User-agent fragments of crawlers, link preview fetchers, monitors and HTTP libraries.
+# Pinterest's crawlers are named explicitly: its in-app browser sends "[Pinterest/Android]"
+BOT_USER_AGENT_TOKENS = [
+    "crawl", "spider", "slurp", "scrape", "archiver", "preview",
+    "facebookexternalhit", "facebookcatalog", "meta-externalagent", "embedly",
+    "whatsapp", "skypeuripreview", "bitlyapp", "outbrain", "pinterestbot", "pinterest/0.", "vkshare",
+    "w3c_validator", "quora link preview", "google-inspectiontool", "googleother",
+    "mediapartners-google", "adsbot", "apis-google", "feedfetcher", "lighthouse",
+    "pingdom", "uptime", "statuscake", "monitor", "headlesschrome", "phantomjs",
+    "curl/", "wget/", "python-requests", "python-urllib", "aiohttp", "httpx",
+    "go-http-client", "okhttp", "java/", "libwww-perl", "node-fetch", "axios/",
+    "postmanruntime", "insomnia", "httpie", "scrapy",
+]
+
+# Matched against the lower-cased user agent; much faster than re.IGNORECASE on a long alternation
+BOT_USER_AGENT_PATTERN = re.compile("|".join([BOT_USER_AGENT_WORD, *(re.escape(token) for token in BOT_USER_AGENT_TOKENS)]))
+
+BOT_USER_AGENT_CACHE_SIZE = int(os.getenv("BOT_USER_AGENT_CACHE_SIZE", "50000"))
+
+@lru_cache(maxsize=BOT_USER_AGENT_CACHE_SIZE)
+def is_bot_user_agent(user_agent: str) -> bool:
+    """Whether a user agent belongs to a crawler, preview fetcher or HTTP library"""
+    return BOT_USER_AGENT_PATTERN.search(user_agent.lower()) is not None
+
+# =====================================================
+# CRAWLER NETWORKS
+# =====================================================
+
+# Published crawler networks (Googlebot, Bingbot, Applebot, Meta crawlers)
+DEFAULT_BOT_NETWORKS = [
+    "66.249.64.0/19",
+    "157.55.39.0/24", "207.46.13.0/24", "40.77.167.0/24", "13.66.139.0/24",
+    "17.241.208.0/20", "17.22.237.0/24",
+    "69.63.176.0/20", "66.220.144.0/20", "31.13.24.0/21", "173.252.64.0/18",
+    "2001:4860:4801::/48",
+    "2a03:2880::/32",
+]
+
+class IPRangeSet:
+    """Membership test for a set of CIDR networks
+    
+    Networks are merged into sorted, non-overlapping integer ranges per IP
+    version, so a lookup is one int conversion plus a bisect.
+    """
+    
+    def __init__(self, networks: Iterable[str] = ()):
+        ranges = {4: [], 6: []}
+        for network in networks:
+            try:
+                parsed = ipaddress.ip_network(network.strip(), strict=False)
+            except ValueError:
+                logger.warning(f"Ignoring invalid bot network: {network!r}")
+                continue
+            ranges[parsed.version].append((int(parsed.network_address), int(parsed.broadcast_address)))
+        
+        self._starts = {}
+        self._ends = {}
+        for version, version_ranges in ranges.items():
+            merged = self._merge(version_ranges)
+            self._starts[version] = [start for start, _ in merged]
+            self._ends[version] = [end for _, end in merged]
+    
+    @staticmethod
+    def _merge(ranges: List[Tuple[int, int]]) -> List[Tuple[int, int]]:
+        merged = []
+        for start, end in sorted(ranges):
+            if merged and start <= merged[-1][1] + 1:
+                merged[-1] = (merged[-1][0], max(merged[-1][1], end))
+            else:
+                merged.append((start, end))
+        return merged
+    
+    def __contains__(self, ip: str) -> bool:
+        try:
+            if ":" in ip:
+                version, value = 6, int(ipaddress.IPv6Address(ip))
+            else:
+                version, value = 4, int.from_bytes(socket.inet_aton(ip), "big")
+        except (OSError, ValueError):
+            return False
+        index = bisect_right(self._starts[version], value) - 1
+        return index >= 0 and value <= self._ends[version][index]
+
+def _load_networks() -> List[str]:
+    networks = list(DEFAULT_BOT_NETWORKS)
+    if BOT_IP_RANGES_FILE:
+        try:
+            with open(BOT_IP_RANGES_FILE) as f:
+                for line in f:
+                    line = line.split("#", 1)[0].strip()
+                    if line:
+                        networks.append(line)
+        except OSError as e:
+            logger.error(f"Could not read BOT_IP_RANGES_FILE: {e}")
+    return networks
+
+# =====================================================
+# CLASSIFIER
+# =====================================================
+
+def client_ip(headers, client, trusted_hops: int = BOT_FILTER_TRUSTED_HOPS) -> Optional[str]:
+    """Client address of a request, from the proxy-appended X-Forwarded-For hop when configured"""
+    forwarded_for = ",".join(headers.getlist("x-forwarded-for")) if trusted_hops else None
+    return forwarded_client_ip(forwarded_for or None, client.host if client else None, trusted_hops)
+
+class BotClassifier:
+    """Decides whether a click comes from a bot, from its user agent and IP"""
+    
+    def __init__(self, networks: Optional[Iterable[str]] = None):
+        self.networks = IPRangeSet(_load_networks() if networks is None else networks)
+    
+    def is_bot(self, user_agent: Optional[str], ip: Optional[str]) -> bool:
+        # Browsers always send a user agent
+        if not user_agent:
+            return True
+        if is_bot_user_agent(user_agent):
+            return True
+        return bool(ip) and ip in self.networks
+
+bot_classifier = BotClassifier()
@@ -0,0 +1,68 @@
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy import select
+from database import ReplicaSessionLocal, LinkTable
+from sharding import link_shards
+from redirect_cache import RedirectCache, redirect_cache
+import asyncio
+import logging
+import os
+import time
+
+logger = logging.getLogger(__name__)
+
+# How many of the most clicked active links each worker preloads on startup (0 disables)
+REDIRECT_WARMUP_LINKS = int(os.getenv("REDIRECT_WARMUP_LINKS", "10000"))
+# Startup waits at most this long; whatever has not loaded by then is left to cache misses
+REDIRECT_WARMUP_SECONDS = float(os.getenv("REDIRECT_WARMUP_SECONDS", "3"))
+
+async def top_links(limit: int):
+    """The `limit` most clicked active links across all shards"""
+    stmt = select(
+        LinkTable.id, LinkTable.short_code, LinkTable.short_url, LinkTable.original_url,
+        LinkTable.user_id, LinkTable.is_active, LinkTable.clicks
+    ).where(
+        LinkTable.is_active == True,
+        LinkTable.short_code.isnot(None)
+    ).order_by(LinkTable.clicks.desc()).limit(limit)
+    
+    async def on_shard(db: AsyncSession):
+        return (await db.execute(stmt)).fetchall()
+    
+    async with ReplicaSessionLocal() as db:
+        per_shard = await link_shards.fan_out(on_shard, db)
+    
+    rows = [row for rows in per_shard for row in rows]
+    if len(per_shard) > 1:
+        rows.sort(key=lambda row: row.clicks or 0, reverse=True)
+    return rows[:limit]
+
+async def warm_redirect_cache(
+    cache: RedirectCache = redirect_cache,
+    limit: int = REDIRECT_WARMUP_LINKS,
+    budget_seconds: float = REDIRECT_WARMUP_SECONDS
+) -> int:
+    """Preload the hottest links into this worker's redirect cache; returns how many were loaded
+    
+    Ranked by the all-time click counter on the link row, read from the
+    replica. Never raises and never runs past the budget: a slow or failed
+    query only means the worker starts cold.
+    """
+    if limit <= 0:
+        return 0
+    
+    started = time.monotonic()
+    try:
+        rows = await asyncio.wait_for(top_links(limit), timeout=budget_seconds)
+    except asyncio.TimeoutError:
+        logger.warning(f"Redirect cache warm-up skipped, top {limit} links took over {budget_seconds}s")
+        return 0
+    except Exception as e:
+        logger.error(f"Redirect cache warm-up failed: {e}")
+        return 0
+    
+    # Coldest first, so the hottest links are the last the LRU would evict
+    for row in reversed(rows):
+        cache.prime(row.short_code, row)
+    
+    logger.info(f"Redirect cache warmed with {len(rows)} links in {time.monotonic() - started:.2f}s")
+    return len(rows)
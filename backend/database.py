@@ -1,6 +1,6 @@
 from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
 from sqlalchemy.orm import sessionmaker, declarative_base
-from sqlalchemy import Column, String, Integer, Float, Boolean, DateTime, JSON, Text, ForeignKey
+from sqlalchemy import Column, String, Integer, SmallInteger, BigInteger, Float, Boolean, Date, DateTime, JSON, Text, ForeignKey, Index, text
 from sqlalchemy.dialects.postgresql import UUID
 from dotenv import load_dotenv
 import os
@@ -10,18 +10,30 @@ from datetime import datetime
 # Load environment variables
 load_dotenv()
 
+def _async_url(url):
+    if url and url.startswith("postgresql://"):
+        return url.replace("postgresql://", "postgresql+asyncpg://", 1)
+    return url
+
 # Database URL from environment
-DATABASE_URL = os.getenv("DATABASE_URL")
-if DATABASE_URL and DATABASE_URL.startswith("postgresql://"):
-    DATABASE_URL = DATABASE_URL.replace("postgresql://", "postgresql+asyncpg://", 1)
+DATABASE_URL = _async_url(os.getenv("DATABASE_URL"))
+
+# Optional streaming read replica for read-only queries (see db_routing.py)
+DATABASE_REPLICA_URL = _async_url(os.getenv("DATABASE_REPLICA_URL"))
 
 # Create async engine
 engine = create_async_engine(DATABASE_URL, echo=True)
 
-# Create session factory
+# Without a replica, reads share the primary engine
+replica_engine = create_async_engine(DATABASE_REPLICA_URL, echo=True) if DATABASE_REPLICA_URL else engine
+
+# Create session factories
 AsyncSessionLocal = sessionmaker(
     engine, class_=AsyncSession, expire_on_commit=False
 )
+ReplicaSessionLocal = sessionmaker(
+    replica_engine, class_=AsyncSession, expire_on_commit=False
+)
 
 # Base class for database models
 Base = declarative_base()
@@ -49,6 +61,33 @@ class UserTable(Base):
     is_active = Column(Boolean, default=True)
     created_at = Column(DateTime, default=datetime.utcnow)
     updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    
+    __table_args__ = (
+        Index("ix_users_created_at", "created_at"),
+    )
+
+class UserStatsTable(Base):
+    __tablename__ = "user_stats"
+    
+    user_id = Column(String, ForeignKey("users.id", ondelete="CASCADE"), primary_key=True)
+    total_links = Column(Integer, nullable=False, default=0)
+    active_links = Column(Integer, nullable=False, default=0)
+    total_clicks = Column(BigInteger, nullable=False, default=0)
+    top_links = Column(JSON, default=[])  # [{"id", "short_url", "title", "clicks"}] by clicks, descending
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+class UserClickCounterTable(Base):
+    __tablename__ = "user_click_counters"
+    
+    user_id = Column(String, ForeignKey("users.id", ondelete="CASCADE"), primary_key=True)
+    month = Column(String, primary_key=True)  # YYYY-MM (UTC)
+    clicks = Column(BigInteger, nullable=False, default=0)
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    
+    __table_args__ = (
+        # Loading a month's counters at startup
+        Index("ix_user_click_counters_month", "month"),
+    )
 
 class SubscriptionTable(Base):
     __tablename__ = "subscriptions"
@@ -61,6 +100,12 @@ class SubscriptionTable(Base):
     auto_renew = Column(Boolean, default=True)
     created_at = Column(DateTime, default=datetime.utcnow)
     updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    
+    __table_args__ = (
+        Index("ix_subscriptions_user_id", "user_id"),
+        # Current-subscription lookups only ever want the active row
+        Index("ix_subscriptions_active_user_id", "user_id", postgresql_where=text("is_active")),
+    )
 
 class LinkTable(Base):
     __tablename__ = "links"
@@ -68,6 +113,7 @@ class LinkTable(Base):
     id = Column(String, primary_key=True, default=lambda: str(uuid.uuid4()))
     original_url = Column(Text, nullable=False)
     short_url = Column(String, unique=True, nullable=True)
+    short_code = Column(String, nullable=True)  # last path segment of short_url, what redirects look up
     title = Column(String, nullable=True)
     description = Column(Text, nullable=True)
     category = Column(String, default="General")
@@ -75,10 +121,22 @@ class LinkTable(Base):
     custom_domain = Column(String, nullable=True)
     is_active = Column(Boolean, default=True)
     clicks = Column(Integer, default=0)
+    bot_clicks = Column(Integer, default=0)  # crawler/preview hits, kept out of analytics
     user_id = Column(String, ForeignKey("users.id"), nullable=True)
     user_email = Column(String, nullable=True)
     created_at = Column(DateTime, default=datetime.utcnow)
     updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    
+    __table_args__ = (
+        Index("ix_links_short_code", "short_code", unique=True),
+        # Per-user listings (newest first) and top links
+        Index("ix_links_user_id_created_at", "user_id", "created_at"),
+        Index("ix_links_user_id_clicks", "user_id", "clicks"),
+        Index("ix_links_user_email", "user_email"),
+        Index("ix_links_created_at", "created_at"),
+        # Most clicked active links, for the redirect cache warm-up
+        Index("ix_links_active_clicks", text("clicks DESC"), postgresql_where=text("is_active")),
+    )
 
 class ImportJobTable(Base):
     __tablename__ = "import_jobs"
@@ -95,9 +153,55 @@ class ImportJobTable(Base):
     created_at = Column(DateTime, default=datetime.utcnow)
     updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
     completed_at = Column(DateTime, nullable=True)
-    errors = Column(JSON, default=[])
+    errors = Column(JSON, default=[])  # Summary only: [{"error_type", "count", "sample"}]
     job_metadata = Column(JSON, default={})  # Renamed from metadata to job_metadata
     created_by = Column(String, nullable=False)  # User ID who initiated
+    
+    __table_args__ = (
+        # Job listings filter by creator or type and sort newest first
+        Index("ix_import_jobs_created_at", "created_at"),
+        Index("ix_import_jobs_created_by_created_at", "created_by", "created_at"),
+        Index("ix_import_jobs_import_type_created_at", "import_type", "created_at"),
+    )
+
+class ImportJobErrorTable(Base):
+    __tablename__ = "import_job_errors"
+    
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    job_id = Column(String, ForeignKey("import_jobs.id", ondelete="CASCADE"), nullable=False)
+    row_number = Column(Integer, nullable=True)
+    field = Column(String, nullable=True)
+    error_type = Column(String, nullable=False, default="error")
+    message = Column(Text, nullable=False)
+    created_at = Column(DateTime, default=datetime.utcnow)
+    
+    __table_args__ = (
+        # Serves both the per-job filter and keyset/offset pagination in insertion order
+        Index("ix_import_job_errors_job_id_id", "job_id", "id"),
+    )
+
+class ExportJobTable(Base):
+    __tablename__ = "export_jobs"
+    
+    id = Column(String, primary_key=True, default=lambda: str(uuid.uuid4()))
+    export_type = Column(String, nullable=False)  # links, users, analytics, contacts
+    format = Column(String, nullable=False)  # csv, json, ndjson, excel
+    status = Column(String, default="pending")  # pending, processing, completed, failed, expired
+    filters = Column(JSON, default={})
+    date_range_start = Column(DateTime, nullable=True)
+    date_range_end = Column(DateTime, nullable=True)
+    filename = Column(String, nullable=True)
+    file_size = Column(Integer, default=0)
+    record_count = Column(Integer, default=0)
+    error = Column(Text, nullable=True)
+    created_at = Column(DateTime, default=datetime.utcnow)
+    completed_at = Column(DateTime, nullable=True)
+    expires_at = Column(DateTime, nullable=True)
+    
+    __table_args__ = (
+        # Retention cleanup only looks at completed exports
+        Index("ix_export_jobs_expires_at", "expires_at", postgresql_where=text("status = 'completed'")),
+    )
 
 class AnalyticsTable(Base):
     __tablename__ = "analytics"
@@ -109,15 +213,59 @@ class AnalyticsTable(Base):
     clicks = Column(Integer, default=0)
     unique_clicks = Column(Integer, default=0)
     click_date = Column(DateTime, nullable=False)
-    country = Column(String, nullable=True)
+    country = Column(String, nullable=True)  # free text; tracked clicks use country_id
+    country_id = Column(SmallInteger, ForeignKey("countries.id"), nullable=True)
     city = Column(String, nullable=True)
     device_type = Column(String, nullable=True)
     browser = Column(String, nullable=True)
     os = Column(String, nullable=True)
-    referrer = Column(String, nullable=True)
-    user_agent = Column(Text, nullable=True)
+    referrer = Column(String, nullable=True)  # free text; tracked clicks use referrer_domain_id
+    referrer_domain_id = Column(Integer, ForeignKey("referrer_domains.id"), nullable=True)
+    user_agent = Column(Text, nullable=True)  # free text; tracked clicks use user_agent_id
+    user_agent_id = Column(Integer, ForeignKey("user_agents.id"), nullable=True)
     ip_address = Column(String, nullable=True)
     created_at = Column(DateTime, default=datetime.utcnow)
+    
+    __table_args__ = (
+        Index("ix_analytics_link_id_click_date", "link_id", "click_date"),
+        Index("ix_analytics_click_date", "click_date"),
+    )
+
+class DailyClickCountTable(Base):
+    __tablename__ = "daily_click_counts"
+    
+    day = Column(Date, primary_key=True)  # UTC
+    clicks = Column(BigInteger, nullable=False, default=0)
+
+class PlatformMetricsTable(Base):
+    __tablename__ = "platform_metrics"
+    
+    name = Column(String, primary_key=True)  # snapshot name, "platform"; "daily_clicks_backfill" marks the one-off seed
+    data = Column(JSON, nullable=False, default={})
+    refreshed_at = Column(DateTime, nullable=False, default=datetime.utcnow)
+    refresh_duration_ms = Column(Integer, nullable=True)
+
+# Analytics dimensions: each distinct value is stored once and referenced by a small integer key
+class CountryTable(Base):
+    __tablename__ = "countries"
+    
+    id = Column(SmallInteger, primary_key=True, autoincrement=True)
+    code = Column(String, unique=True, nullable=False)
+
+class ReferrerDomainTable(Base):
+    __tablename__ = "referrer_domains"
+    
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    domain = Column(String, unique=True, nullable=False)
+    created_at = Column(DateTime, default=datetime.utcnow)
+
+class UserAgentTable(Base):
+    __tablename__ = "user_agents"
+    
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    user_agent_hash = Column(String(40), unique=True, nullable=False)  # SHA-1 of user_agent, keeps the unique index small
+    user_agent = Column(Text, nullable=False)
+    created_at = Column(DateTime, default=datetime.utcnow)
 
 class DomainTable(Base):
     __tablename__ = "domains"
@@ -132,6 +280,10 @@ class DomainTable(Base):
     settings = Column(JSON, default={})
     created_at = Column(DateTime, default=datetime.utcnow)
     updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    
+    __table_args__ = (
+        Index("ix_domains_owner_user_id", "owner_user_id"),
+    )
 
 class ContactTable(Base):
     __tablename__ = "contacts"
@@ -149,6 +301,11 @@ class ContactTable(Base):
     contact_metadata = Column(JSON, default={})  # Renamed from metadata to contact_metadata
     created_at = Column(DateTime, default=datetime.utcnow)
     updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    
+    __table_args__ = (
+        Index("ix_contacts_email", "email"),
+        Index("ix_contacts_created_at", "created_at"),
+    )
 
 # Database utility functions
 async def get_db():
@@ -159,10 +316,19 @@ async def get_db():
         finally:
             await session.close()
 
-async def create_tables():
-    """Create all database tables"""
-    async with engine.begin() as conn:
-        await conn.run_sync(Base.metadata.create_all)
+async def get_replica_db():
+    """Get read replica session (the primary when no replica is configured)"""
+    async with ReplicaSessionLocal() as session:
+        try:
+            yield session
+        finally:
+            await session.close()
+
+async def dispose_engines():
+    """Close the primary and replica connection pools"""
+    await engine.dispose()
+    if replica_engine is not engine:
+        await replica_engine.dispose()
 
 async def drop_tables():
     """Drop all database tables"""
@@ -0,0 +1,65 @@
+from fastapi import Request
+from database import AsyncSessionLocal, ReplicaSessionLocal, DATABASE_REPLICA_URL
+from typing import Optional
+import logging
+import os
+import time
+
+logger = logging.getLogger(__name__)
+
+# After a mutation the same client reads from the primary for this long, so it
+# sees its own writes despite replication lag (0 disables the window)
+READ_YOUR_WRITES_SECONDS = float(os.getenv("READ_YOUR_WRITES_SECONDS", "5"))
+READ_YOUR_WRITES_COOKIE = os.getenv("READ_YOUR_WRITES_COOKIE", "linkly_rw")
+
+REPLICA_ENABLED = bool(DATABASE_REPLICA_URL)
+
+SAFE_METHODS = frozenset({"GET", "HEAD", "OPTIONS"})
+
+def primary_required_until(cookie: Optional[str]) -> float:
+    """Epoch time until which a client's reads must go to the primary"""
+    try:
+        return float(cookie) if cookie else 0.0
+    except ValueError:
+        return 0.0
+
+def reads_from_primary(request: Request) -> bool:
+    """Whether this request's reads must see the primary"""
+    if not REPLICA_ENABLED:
+        return True
+    return primary_required_until(request.cookies.get(READ_YOUR_WRITES_COOKIE)) > time.time()
+
+async def get_read_db(request: Request):
+    """Session for read-only handlers: the replica, or the primary inside a read-your-writes window"""
+    session_factory = AsyncSessionLocal if reads_from_primary(request) else ReplicaSessionLocal
+    async with session_factory() as session:
+        try:
+            yield session
+        finally:
+            await session.close()
+
+class ReadYourWritesMiddleware:
+    """ASGI middleware opening a read-your-writes window after successful mutations
+    
+    Any non-GET request answered with a 2xx/3xx gets a short-lived cookie
+    holding the time its window ends; get_read_db sends that client's reads
+    to the primary until then.
+    """
+    
+    def __init__(self, app, window_seconds: float = READ_YOUR_WRITES_SECONDS, cookie: str = READ_YOUR_WRITES_COOKIE):
+        self.app = app
+        self.window_seconds = window_seconds
+        self.cookie = cookie
+    
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["method"] in SAFE_METHODS:
+            return await self.app(scope, receive, send)
+        
+        async def send_with_cookie(message):
+            if message["type"] == "http.response.start" and message["status"] < 400:
+                until = time.time() + self.window_seconds
+                value = f"{self.cookie}={until:.3f}; Max-Age={int(self.window_seconds) + 1}; Path=/; HttpOnly; SameSite=Lax"
+                message = {**message, "headers": [*message.get("headers", []), (b"set-cookie", value.encode("latin-1"))]}
+            await send(message)
+        
+        return await self.app(scope, receive, send_with_cookie)
@@ -0,0 +1,470 @@
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy import select, insert, update, func, and_, or_
+from database import (
+    DATABASE_URL, ExportJobTable, UserTable, LinkTable, AnalyticsTable, ContactTable,
+    CountryTable, ReferrerDomainTable, UserAgentTable
+)
+from sharding import link_shards
+from models import (
+    ExportRequest, ExportResponse, ExportJobStatus, ExportType, ExportFormat, ExportStatus
+)
+from typing import List, Dict, Any, Optional, AsyncIterator, Tuple
+from pathlib import Path
+from datetime import datetime, timedelta
+import aiofiles
+import aiofiles.os
+import asyncio
+import csv
+import hashlib
+import hmac
+import io
+import json
+import logging
+import os
+import secrets
+import time
+
+logger = logging.getLogger(__name__)
+
+# Rows fetched per round-trip from the server-side cursor
+EXPORT_FETCH_SIZE = int(os.getenv("EXPORT_FETCH_SIZE", "2000"))
+
+# How long exported files are kept, and how long a signed download URL stays valid
+EXPORT_RETENTION_HOURS = int(os.getenv("EXPORT_RETENTION_HOURS", "24"))
+EXPORT_URL_TTL_SECONDS = int(os.getenv("EXPORT_URL_TTL_SECONDS", "3600"))
+
+EXPORT_SIGNING_KEY = os.getenv("EXPORT_SIGNING_KEY")
+if not EXPORT_SIGNING_KEY:
+    # Every worker (and every restart) must verify every other's URLs, so the fallback is derived
+    # from the database credentials they share; a dedicated key can be rotated on its own
+    logger.warning("EXPORT_SIGNING_KEY is not set; deriving the export download URL key from DATABASE_URL")
+    EXPORT_SIGNING_KEY = hmac.new(DATABASE_URL.encode(), b"linkly-export-download-urls", hashlib.sha256).hexdigest()
+
+# Exportable sources: table plus the column used for date range filtering
+EXPORT_SOURCES = {
+    ExportType.LINKS: (LinkTable, LinkTable.created_at),
+    ExportType.USERS: (UserTable, UserTable.created_at),
+    ExportType.ANALYTICS: (AnalyticsTable, AnalyticsTable.click_date),
+    ExportType.CONTACTS: (ContactTable, ContactTable.created_at),
+}
+
+# Surrogate keys that analytics exports replace with their values
+ANALYTICS_DIMENSION_ID_COLUMNS = {"country_id", "referrer_domain_id", "user_agent_id"}
+
+# Exported column, its surrogate key and the dimension column holding the value
+ANALYTICS_DIMENSIONS = [
+    ("country", "country_id", CountryTable.code),
+    ("referrer", "referrer_domain_id", ReferrerDomainTable.domain),
+    ("user_agent", "user_agent_id", UserAgentTable.user_agent),
+]
+
+# Export types whose tables live on the link shards
+SHARDED_EXPORT_TYPES = (ExportType.LINKS, ExportType.ANALYTICS)
+
+EXPORT_FILE_EXTENSIONS = {
+    ExportFormat.CSV: "csv",
+    ExportFormat.JSON: "json",
+    ExportFormat.NDJSON: "ndjson",
+    ExportFormat.EXCEL: "xlsx",
+}
+
+EXPORT_MEDIA_TYPES = {
+    ExportFormat.CSV: "text/csv",
+    ExportFormat.JSON: "application/json",
+    ExportFormat.NDJSON: "application/x-ndjson",
+    ExportFormat.EXCEL: "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
+}
+
+def sign_download(export_id: str, expires: int) -> str:
+    """HMAC signature for a time-limited export download URL"""
+    message = f"{export_id}:{expires}".encode()
+    return hmac.new(EXPORT_SIGNING_KEY.encode(), message, hashlib.sha256).hexdigest()
+
+def verify_download(export_id: str, expires: int, signature: str) -> bool:
+    """Check a download signature and that it has not expired"""
+    if expires < time.time():
+        return False
+    return hmac.compare_digest(sign_download(export_id, expires), signature)
+
+def _plain_value(value: Any) -> Any:
+    """Convert a column value to something JSON/CSV/Excel can hold"""
+    if isinstance(value, datetime):
+        return value.isoformat()
+    return value
+
+class ExportEncoder:
+    """Incremental encoders for text export formats
+    
+    Each call returns the bytes for one partition of rows, so nothing larger
+    than a partition is ever buffered.
+    """
+    
+    def __init__(self, export_format: ExportFormat, columns: List[str]):
+        self.format = export_format
+        self.columns = columns
+        self.rows_written = 0
+    
+    def header(self) -> bytes:
+        if self.format == ExportFormat.CSV:
+            return self._csv_lines([self.columns])
+        if self.format == ExportFormat.JSON:
+            return b"["
+        return b""
+    
+    def encode(self, rows: List[Tuple]) -> bytes:
+        if self.format == ExportFormat.CSV:
+            data = self._csv_lines([
+                [json.dumps(value) if isinstance(value, (dict, list)) else _plain_value(value) for value in row]
+                for row in rows
+            ])
+        else:
+            lines = [
+                json.dumps(dict(zip(self.columns, row)), default=_plain_value)
+                for row in rows
+            ]
+            if self.format == ExportFormat.JSON:
+                prefix = ",\n" if self.rows_written else "\n"
+                data = (prefix + ",\n".join(lines)).encode() if lines else b""
+            else:
+                data = "".join(line + "\n" for line in lines).encode()
+        
+        self.rows_written += len(rows)
+        return data
+    
+    def footer(self) -> bytes:
+        if self.format == ExportFormat.JSON:
+            return b"\n]\n"
+        return b""
+    
+    @staticmethod
+    def _csv_lines(rows: List[List[Any]]) -> bytes:
+        buffer = io.StringIO()
+        csv.writer(buffer).writerows(rows)
+        return buffer.getvalue().encode()
+
+def _matches(column, value):
+    """Filter condition: a list matches any of its values, None matches NULL"""
+    if isinstance(value, list):
+        return column.in_(value)
+    if value is None:
+        return column.is_(None)
+    return column == value
+
+class ExportService:
+    """Service for streaming data exports out of PostgreSQL"""
+    
+    def __init__(self, db: AsyncSession):
+        self.db = db
+    
+    def build_query(
+        self,
+        request: ExportRequest,
+        join_dimensions: bool = True,
+        dimension_ids: Optional[Dict[str, List[int]]] = None
+    ):
+        """Build the select for an export request, returning (statement, column names)
+        
+        With join_dimensions=False (shards, where the dimension tables do not
+        exist) analytics rows end with the raw dimension ids instead; see
+        _resolve_dimensions. Filters on a dimension then match the ids in
+        `dimension_ids` (see _dimension_filter_ids) or the row's own text.
+        """
+        table, date_column = EXPORT_SOURCES[request.export_type]
+        columns = list(table.__table__.columns)
+        # Filter field -> expression, where the exported value is not the column itself
+        filter_expressions = {}
+        
+        if request.export_type == ExportType.LINKS and request.include_analytics:
+            # Aggregate the analytics per link once, in the database
+            analytics = select(
+                AnalyticsTable.link_id,
+                func.count(AnalyticsTable.id).label("analytics_events"),
+                func.coalesce(func.sum(AnalyticsTable.unique_clicks), 0).label("unique_clicks"),
+                func.max(AnalyticsTable.click_date).label("last_click_at")
+            ).group_by(AnalyticsTable.link_id).subquery()
+            stmt = select(
+                *columns,
+                analytics.c.analytics_events,
+                analytics.c.unique_clicks,
+                analytics.c.last_click_at
+            ).outerjoin(analytics, analytics.c.link_id == LinkTable.id)
+            names = [column.name for column in columns] + ["analytics_events", "unique_clicks", "last_click_at"]
+        elif request.export_type == ExportType.ANALYTICS and not join_dimensions:
+            columns = [column for column in columns if column.name not in ANALYTICS_DIMENSION_ID_COLUMNS]
+            names = [column.name for column in columns]
+            stmt = select(*columns, *[AnalyticsTable.__table__.c[id_column] for _, id_column, _ in ANALYTICS_DIMENSIONS])
+        elif request.export_type == ExportType.ANALYTICS:
+            # Tracked clicks store dimension ids; older and imported rows carry the text itself
+            resolved = {
+                "country": func.coalesce(CountryTable.code, AnalyticsTable.country),
+                "referrer": func.coalesce(ReferrerDomainTable.domain, AnalyticsTable.referrer),
+                "user_agent": func.coalesce(UserAgentTable.user_agent, AnalyticsTable.user_agent),
+            }
+            filter_expressions = resolved
+            columns = [column for column in columns if column.name not in ANALYTICS_DIMENSION_ID_COLUMNS]
+            stmt = select(
+                *[resolved[column.name].label(column.name) if column.name in resolved else column for column in columns]
+            ).select_from(AnalyticsTable).outerjoin(
+                CountryTable, CountryTable.id == AnalyticsTable.country_id
+            ).outerjoin(
+                ReferrerDomainTable, ReferrerDomainTable.id == AnalyticsTable.referrer_domain_id
+            ).outerjoin(
+                UserAgentTable, UserAgentTable.id == AnalyticsTable.user_agent_id
+            )
+            names = [column.name for column in columns]
+        else:
+            stmt = select(*columns)
+            names = [column.name for column in columns]
+        
+        dimension_id_columns = {name: id_column for name, id_column, _ in ANALYTICS_DIMENSIONS}
+        for field, value in request.filters.items():
+            if field not in table.__table__.columns:
+                raise ValueError(f"Unknown filter field for {request.export_type.value}: {field}")
+            column = filter_expressions.get(field, table.__table__.columns[field])
+            if request.export_type == ExportType.ANALYTICS and not join_dimensions and field in dimension_id_columns:
+                # Tracked clicks only have the id; older and imported rows only the text
+                id_column = table.__table__.columns[dimension_id_columns[field]]
+                stmt = stmt.where(or_(
+                    id_column.in_((dimension_ids or {}).get(field, [])),
+                    and_(id_column.is_(None), _matches(column, value))
+                ))
+            else:
+                stmt = stmt.where(_matches(column, value))
+        
+        if request.date_range_start:
+            stmt = stmt.where(date_column >= request.date_range_start)
+        if request.date_range_end:
+            stmt = stmt.where(date_column <= request.date_range_end)
+        
+        return stmt.order_by(date_column), names
+    
+    async def stream_rows(self, request: ExportRequest) -> AsyncIterator[List[Tuple]]:
+        """Yield partitions of rows from a server-side cursor
+        
+        Links and analytics on a sharded setup are read one shard after
+        another, so rows are ordered within each shard only.
+        """
+        if request.export_type not in SHARDED_EXPORT_TYPES or not link_shards.sharded:
+            stmt, _ = self.build_query(request)
+            async for rows in self._stream(self.db, stmt):
+                yield rows
+            return
+        
+        dimension_ids = await self._dimension_filter_ids(request) if request.export_type == ExportType.ANALYTICS else None
+        stmt, names = self.build_query(request, join_dimensions=False, dimension_ids=dimension_ids)
+        for shard in link_shards.shards:
+            async with link_shards.session(shard.index, self.db) as shard_db:
+                async for rows in self._stream(shard_db, stmt):
+                    if request.export_type == ExportType.ANALYTICS:
+                        rows = await self._resolve_dimensions(rows, names)
+                    yield rows
+    
+    @staticmethod
+    async def _stream(db: AsyncSession, stmt) -> AsyncIterator[List[Tuple]]:
+        result = await db.stream(stmt.execution_options(yield_per=EXPORT_FETCH_SIZE))
+        async for partition in result.partitions():
+            yield [tuple(row) for row in partition]
+    
+    async def _dimension_filter_ids(self, request: ExportRequest) -> Dict[str, List[int]]:
+        """Ids of the dimension values an analytics export filters on, from the primary"""
+        ids = {}
+        for name, _, value_column in ANALYTICS_DIMENSIONS:
+            if name not in request.filters:
+                continue
+            value = request.filters[name]
+            values = [item for item in (value if isinstance(value, list) else [value]) if item is not None]
+            id_column = value_column.table.c.id
+            ids[name] = list((await self.db.execute(select(id_column).where(value_column.in_(values)))).scalars()) if values else []
+        return ids
+    
+    async def _resolve_dimensions(self, rows: List[Tuple], names: List[str]) -> List[Tuple]:
+        """Swap the trailing dimension ids of shard analytics rows for their values"""
+        width = len(names)
+        resolved = [list(row[:width]) for row in rows]
+        for offset, (name, _, value_column) in enumerate(ANALYTICS_DIMENSIONS):
+            ids = {row[width + offset] for row in rows if row[width + offset] is not None}
+            if not ids:
+                continue
+            id_column = value_column.table.c.id
+            values = dict((await self.db.execute(select(id_column, value_column).where(id_column.in_(ids)))).fetchall())
+            position = names.index(name)
+            for row, values_row in zip(rows, resolved):
+                value = values.get(row[width + offset])
+                if value is not None:
+                    values_row[position] = value
+        return [tuple(row) for row in resolved]
+    
+    async def stream_export(self, request: ExportRequest) -> AsyncIterator[bytes]:
+        """Yield an encoded export body chunk by chunk (text formats only)"""
+        if request.format == ExportFormat.EXCEL:
+            raise ValueError("Excel exports cannot be streamed; create an export job instead")
+        
+        _, columns = self.build_query(request)
+        encoder = ExportEncoder(request.format, columns)
+        
+        yield encoder.header()
+        async for rows in self.stream_rows(request):
+            yield encoder.encode(rows)
+        yield encoder.footer()
+    
+    async def write_export_file(self, request: ExportRequest, file_path: Path) -> int:
+        """Write an export to disk with constant memory, returning the record count"""
+        _, columns = self.build_query(request)
+        
+        if request.format == ExportFormat.EXCEL:
+            from openpyxl import Workbook
+            
+            # Write-only workbooks stream rows to a temp file instead of keeping cells in memory
+            workbook = Workbook(write_only=True)
+            sheet = workbook.create_sheet(request.export_type.value)
+            sheet.append(columns)
+            record_count = 0
+            async for rows in self.stream_rows(request):
+                for row in rows:
+                    sheet.append([
+                        json.dumps(value) if isinstance(value, (dict, list)) else value
+                        for value in row
+                    ])
+                record_count += len(rows)
+            await asyncio.to_thread(workbook.save, file_path)
+            return record_count
+        
+        encoder = ExportEncoder(request.format, columns)
+        async with aiofiles.open(file_path, 'wb') as f:
+            await f.write(encoder.header())
+            async for rows in self.stream_rows(request):
+                await f.write(encoder.encode(rows))
+            await f.write(encoder.footer())
+        return encoder.rows_written
+    
+    async def create_export_job(self, request: ExportRequest) -> ExportJobStatus:
+        """Create a pending export job"""
+        # Fail fast on bad filters before queueing anything
+        self.build_query(request)
+        
+        job = ExportJobStatus(
+            export_id=secrets.token_hex(16),
+            export_type=request.export_type,
+            format=request.format,
+            status=ExportStatus.PENDING,
+            created_at=datetime.utcnow()
+        )
+        
+        stmt = insert(ExportJobTable).values(
+            id=job.export_id,
+            export_type=job.export_type,
+            format=job.format,
+            status=job.status,
+            filters=request.filters,
+            date_range_start=request.date_range_start,
+            date_range_end=request.date_range_end,
+            created_at=job.created_at
+        )
+        await self.db.execute(stmt)
+        await self.db.commit()
+        
+        return job
+    
+    async def get_export_job(self, export_id: str) -> Optional[ExportJobStatus]:
+        """Get export job by ID"""
+        stmt = select(ExportJobTable).where(ExportJobTable.id == export_id)
+        result = await self.db.execute(stmt)
+        job = result.scalar_one_or_none()
+        
+        if job:
+            return ExportJobStatus(
+                export_id=job.id,
+                export_type=job.export_type,
+                format=job.format,
+                status=job.status,
+                record_count=job.record_count or 0,
+                file_size=job.file_size or 0,
+                error=job.error,
+                created_at=job.created_at,
+                completed_at=job.completed_at,
+                expires_at=job.expires_at
+            )
+        return None
+    
+    async def get_export_filename(self, export_id: str) -> Optional[str]:
+        """Get the file of a completed, unexpired export"""
+        stmt = select(ExportJobTable.filename).where(
+            ExportJobTable.id == export_id,
+            ExportJobTable.status == ExportStatus.COMPLETED,
+            ExportJobTable.expires_at > datetime.utcnow()
+        )
+        result = await self.db.execute(stmt)
+        return result.scalar_one_or_none()
+    
+    async def update_export_job(self, export_id: str, update_data: Dict[str, Any]):
+        """Update export job"""
+        stmt = update(ExportJobTable).where(ExportJobTable.id == export_id).values(**update_data)
+        await self.db.execute(stmt)
+        await self.db.commit()
+    
+    async def run_export_job(self, export_id: str, request: ExportRequest, export_dir: Path):
+        """Write an export job's file and record the result"""
+        filename = f"{export_id}.{EXPORT_FILE_EXTENSIONS[request.format]}"
+        file_path = export_dir / filename
+        
+        try:
+            await self.update_export_job(export_id, {"status": ExportStatus.PROCESSING})
+            
+            record_count = await self.write_export_file(request, file_path)
+            file_size = (await aiofiles.os.stat(file_path)).st_size
+            
+            await self.update_export_job(export_id, {
+                "status": ExportStatus.COMPLETED,
+                "filename": filename,
+                "file_size": file_size,
+                "record_count": record_count,
+                "completed_at": datetime.utcnow(),
+                "expires_at": datetime.utcnow() + timedelta(hours=EXPORT_RETENTION_HOURS)
+            })
+        
+        except Exception as e:
+            logger.error(f"Error running export job: {e}")
+            await self.db.rollback()
+            await self.update_export_job(export_id, {"status": ExportStatus.FAILED, "error": str(e)})
+            if file_path.exists():
+                file_path.unlink()
+    
+    async def cleanup_expired_exports(self, export_dir: Path):
+        """Remove files of exports past their retention period"""
+        stmt = select(ExportJobTable.id, ExportJobTable.filename).where(
+            ExportJobTable.status == ExportStatus.COMPLETED,
+            ExportJobTable.expires_at <= datetime.utcnow()
+        )
+        result = await self.db.execute(stmt)
+        expired = result.fetchall()
+        
+        for job in expired:
+            file_path = export_dir / job.filename
+            if await aiofiles.os.path.exists(file_path):
+                await aiofiles.os.remove(file_path)
+        
+        if expired:
+            await self.update_export_job_status([job.id for job in expired], ExportStatus.EXPIRED)
+    
+    async def update_export_job_status(self, export_ids: List[str], status: ExportStatus):
+        """Set the status of several export jobs at once"""
+        stmt = update(ExportJobTable).where(ExportJobTable.id.in_(export_ids)).values(status=status)
+        await self.db.execute(stmt)
+        await self.db.commit()
+    
+    def build_export_response(self, job: ExportJobStatus, base_url: str) -> ExportResponse:
+        """Build a time-limited signed download URL for a completed export"""
+        expires = int(time.time()) + EXPORT_URL_TTL_SECONDS
+        if job.expires_at:
+            # Never hand out a URL that outlives the file
+            file_expiry = int((job.expires_at - datetime.utcnow()).total_seconds() + time.time())
+            expires = min(expires, file_expiry)
+        
+        signature = sign_download(job.export_id, expires)
+        return ExportResponse(
+            export_id=job.export_id,
+            download_url=f"{base_url}/api/export/download/{job.export_id}?expires={expires}&signature={signature}",
+            expires_at=datetime.utcfromtimestamp(expires),
+            file_size=job.file_size,
+            record_count=job.record_count
+        )
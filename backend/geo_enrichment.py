@@ -0,0 +1,313 @@
+from typing import Iterable, List, NamedTuple, Optional, Sequence
+from array import array
+from bisect import bisect_right
+import argparse
+import csv
+import ipaddress
+import json
+import logging
+import mmap
+import numpy as np
+import os
+import socket
+import struct
+import sys
+import time
+
+logger = logging.getLogger(__name__)
+
+# Local IP range database: a CSV (e.g. DB-IP / IP2Location lite) or an index compiled by `build`
+GEOIP_DATABASE = os.getenv("GEOIP_DATABASE")
+
+# Column layout of the CSV; must contain start, end and country, city is optional
+GEOIP_CSV_COLUMNS = os.getenv("GEOIP_CSV_COLUMNS", "start,end,country,city")
+
+INDEX_MAGIC = b"LKGEOIX1"
+# magic, IPv4 range count, IPv6 range count, location JSON length
+INDEX_HEADER = struct.Struct("<8sIIQ")
+
+class GeoLocation(NamedTuple):
+    country: Optional[str]
+    city: Optional[str]
+
+UNKNOWN_LOCATION = GeoLocation(None, None)
+
+def _parse_ip(value: str) -> ipaddress._BaseAddress:
+    value = value.strip()
+    if value.isdigit():
+        number = int(value)
+        return ipaddress.IPv4Address(number) if number <= 0xFFFFFFFF else ipaddress.IPv6Address(number)
+    return ipaddress.ip_address(value)
+
+class GeoIPIndex:
+    """IP range -> location lookups over sorted, array-backed ranges
+    
+    IPv4 ranges are three parallel uint32 arrays (start, end, location id).
+    IPv6 ranges are keyed on the upper 64 bits of the address, which is the
+    finest granularity geo databases allocate at, so they fit uint64 arrays.
+    A lookup is one bisect plus a bounds check. The arrays can be plain
+    in-memory arrays or views over a memory-mapped compiled index file.
+    """
+    
+    def __init__(
+        self,
+        v4_starts: Sequence[int],
+        v4_ends: Sequence[int],
+        v4_locations: Sequence[int],
+        v6_starts: Sequence[int],
+        v6_ends: Sequence[int],
+        v6_locations: Sequence[int],
+        locations: List[GeoLocation],
+        mapped: Optional[mmap.mmap] = None
+    ):
+        self.v4_starts = v4_starts
+        self.v4_ends = v4_ends
+        self.v4_locations = v4_locations
+        self.v6_starts = v6_starts
+        self.v6_ends = v6_ends
+        self.v6_locations = v6_locations
+        self.locations = locations
+        self._mapped = mapped
+        # Zero-copy numpy views for vectorised batch lookups
+        self._v4_starts = np.frombuffer(v4_starts, dtype=np.uint32)
+        self._v4_ends = np.frombuffer(v4_ends, dtype=np.uint32)
+        self._v4_locations = np.frombuffer(v4_locations, dtype=np.uint32)
+    
+    def __len__(self) -> int:
+        return len(self.v4_starts) + len(self.v6_starts)
+    
+    def lookup_v4(self, value: int) -> GeoLocation:
+        index = bisect_right(self.v4_starts, value) - 1
+        if index >= 0 and value <= self.v4_ends[index]:
+            return self.locations[self.v4_locations[index]]
+        return UNKNOWN_LOCATION
+    
+    def lookup_v6(self, value: int) -> GeoLocation:
+        value >>= 64
+        index = bisect_right(self.v6_starts, value) - 1
+        if index >= 0 and value <= self.v6_ends[index]:
+            return self.locations[self.v6_locations[index]]
+        return UNKNOWN_LOCATION
+    
+    def lookup(self, ip: str) -> GeoLocation:
+        try:
+            if ":" in ip:
+                return self.lookup_v6(int(ipaddress.IPv6Address(ip)))
+            return self.lookup_v4(int.from_bytes(socket.inet_aton(ip), "big"))
+        except (OSError, ValueError):
+            return UNKNOWN_LOCATION
+    
+    def lookup_many(self, ips: Iterable[Optional[str]]) -> List[GeoLocation]:
+        """Locate a batch of addresses; IPv4 is resolved with one vectorised searchsorted"""
+        results = []
+        v4_positions = []
+        v4_packed = []
+        aton = socket.inet_aton
+        
+        for position, ip in enumerate(ips):
+            results.append(UNKNOWN_LOCATION)
+            if not ip:
+                continue
+            if ":" in ip:
+                results[position] = self.lookup(ip)
+                continue
+            try:
+                v4_packed.append(aton(ip))
+            except OSError:
+                continue
+            v4_positions.append(position)
+        
+        if v4_packed:
+            values = np.frombuffer(b"".join(v4_packed), dtype=">u4").astype(np.uint32)
+            locations = self.locations
+            for position, location_id in zip(v4_positions, self.locate_v4(values).tolist()):
+                if location_id >= 0:
+                    results[position] = locations[location_id]
+        
+        return results
+    
+    def locate_v4(self, values: np.ndarray) -> np.ndarray:
+        """Location ids (-1 when unknown) for an array of IPv4 addresses as uint32"""
+        if not len(self._v4_starts):
+            return np.full(len(values), -1, dtype=np.int64)
+        indexes = np.searchsorted(self._v4_starts, values, side="right") - 1
+        clipped = np.maximum(indexes, 0)
+        hits = (indexes >= 0) & (values <= self._v4_ends[clipped])
+        return np.where(hits, self._v4_locations[clipped].astype(np.int64), -1)
+    
+    @classmethod
+    def from_ranges(cls, ranges: Iterable[tuple]) -> "GeoIPIndex":
+        """Build from (start_ip, end_ip, country, city) tuples"""
+        location_ids = {}
+        locations: List[GeoLocation] = []
+        v4, v6 = [], []
+        
+        for start, end, country, city in ranges:
+            start, end = _parse_ip(start), _parse_ip(end)
+            location = GeoLocation(country or None, city or None)
+            location_id = location_ids.get(location)
+            if location_id is None:
+                location_id = location_ids[location] = len(locations)
+                locations.append(location)
+            
+            if start.version == 4:
+                v4.append((int(start), int(end), location_id))
+            else:
+                v6.append((int(start) >> 64, int(end) >> 64, location_id))
+        
+        v4.sort()
+        v6.sort()
+        return cls(
+            array("I", (r[0] for r in v4)), array("I", (r[1] for r in v4)), array("I", (r[2] for r in v4)),
+            array("Q", (r[0] for r in v6)), array("Q", (r[1] for r in v6)), array("I", (r[2] for r in v6)),
+            locations
+        )
+    
+    @classmethod
+    def from_csv(cls, path: str, columns: str = GEOIP_CSV_COLUMNS) -> "GeoIPIndex":
+        """Build from a CSV range database, skipping a header row if present"""
+        names = [name.strip() for name in columns.split(",")]
+        start_col, end_col, country_col = names.index("start"), names.index("end"), names.index("country")
+        city_col = names.index("city") if "city" in names else None
+        
+        def rows():
+            with open(path, newline="", encoding="utf-8") as f:
+                for row in csv.reader(f):
+                    try:
+                        _parse_ip(row[start_col])
+                    except (ValueError, IndexError):
+                        continue
+                    city = row[city_col] if city_col is not None and city_col < len(row) else None
+                    yield row[start_col], row[end_col], row[country_col], city
+        
+        return cls.from_ranges(rows())
+    
+    def save(self, path: str):
+        """Write a compiled index that open() can memory-map"""
+        locations = json.dumps([list(location) for location in self.locations]).encode()
+        with open(path, "wb") as f:
+            f.write(INDEX_HEADER.pack(INDEX_MAGIC, len(self.v4_starts), len(self.v6_starts), len(locations)))
+            for values, typecode in (
+                (self.v4_starts, "I"), (self.v4_ends, "I"), (self.v4_locations, "I"),
+                (self.v6_starts, "Q"), (self.v6_ends, "Q"), (self.v6_locations, "I"),
+            ):
+                data = array(typecode, values).tobytes()
+                f.write(data)
+                # Keep every array 8-byte aligned
+                f.write(b"\0" * (-len(data) % 8))
+            f.write(locations)
+    
+    @classmethod
+    def open(cls, path: str) -> "GeoIPIndex":
+        """Memory-map a compiled index; nothing is copied except the location table"""
+        with open(path, "rb") as f:
+            mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        
+        magic, v4_count, v6_count, locations_length = INDEX_HEADER.unpack_from(mapped, 0)
+        if magic != INDEX_MAGIC:
+            mapped.close()
+            raise ValueError(f"{path} is not a compiled GeoIP index")
+        
+        view = memoryview(mapped)
+        offset = INDEX_HEADER.size
+        arrays = []
+        for count, typecode, itemsize in (
+            (v4_count, "I", 4), (v4_count, "I", 4), (v4_count, "I", 4),
+            (v6_count, "Q", 8), (v6_count, "Q", 8), (v6_count, "I", 4),
+        ):
+            size = count * itemsize
+            arrays.append(view[offset:offset + size].cast(typecode))
+            offset += size + (-size % 8)
+        
+        locations = [GeoLocation(*location) for location in json.loads(bytes(view[offset:offset + locations_length]))]
+        return cls(*arrays, locations, mapped=mapped)
+    
+    @classmethod
+    def load(cls, path: str) -> "GeoIPIndex":
+        """Open a compiled index, or build one from a CSV"""
+        with open(path, "rb") as f:
+            is_compiled = f.read(len(INDEX_MAGIC)) == INDEX_MAGIC
+        return cls.open(path) if is_compiled else cls.from_csv(path)
+
+# =====================================================
+# PIPELINE STAGE
+# =====================================================
+
+class GeoEnricher:
+    """Analytics pipeline stage filling country and city from the client IP"""
+    
+    def __init__(self):
+        self.index: Optional[GeoIPIndex] = None
+    
+    def load(self, path: Optional[str] = GEOIP_DATABASE):
+        """Load the local database; without one the stage does nothing"""
+        if not path:
+            logger.info("GEOIP_DATABASE not set, geo enrichment disabled")
+            return
+        started = time.perf_counter()
+        try:
+            self.index = GeoIPIndex.load(path)
+        except (OSError, ValueError) as e:
+            logger.error(f"Could not load GeoIP database {path}: {e}")
+            return
+        logger.info(f"Loaded {len(self.index)} GeoIP ranges in {time.perf_counter() - started:.2f}s")
+    
+    def __call__(self, events: List):
+        if self.index is None:
+            return
+        locations = self.index.lookup_many(event.ip_address for event in events)
+        for event, location in zip(events, locations):
+            event.country, event.city = location
+
+geo_enricher = GeoEnricher()
+
+# =====================================================
+# COMMAND LINE: compile and benchmark an index
+# =====================================================
+
+def benchmark(index: GeoIPIndex, count: int = 1000000) -> dict:
+    """Lookups per second on random IPv4 addresses
+    
+    - batch_int: vectorised locate_v4 over uint32 addresses
+    - batch_str: lookup_many over dotted strings, as the pipeline stage calls it
+    - single: one lookup_v4 call per address
+    """
+    values = np.random.randint(0, 2 ** 32, size=count, dtype=np.uint64).astype(np.uint32)
+    strings = [socket.inet_ntoa(value.to_bytes(4, "big")) for value in values.tolist()]
+    
+    def rate(run, n=count) -> int:
+        started = time.perf_counter()
+        run()
+        return int(n / (time.perf_counter() - started))
+    
+    singles = values[:min(count, 200000)].tolist()
+    return {
+        "ranges": len(index),
+        "batch_int_lookups_per_second": rate(lambda: index.locate_v4(values)),
+        "batch_str_lookups_per_second": rate(lambda: index.lookup_many(strings)),
+        "single_lookups_per_second": rate(lambda: [index.lookup_v4(value) for value in singles], len(singles)),
+    }
+
+def main(argv: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(description="Compile or benchmark the local GeoIP index")
+    commands = parser.add_subparsers(dest="command", required=True)
+    
+    build = commands.add_parser("build", help="Compile a CSV range database into a memory-mappable index")
+    build.add_argument("csv_path")
+    build.add_argument("index_path")
+    build.add_argument("--columns", default=GEOIP_CSV_COLUMNS)
+    
+    bench = commands.add_parser("bench", help="Measure lookup throughput")
+    bench.add_argument("path")
+    bench.add_argument("--count", type=int, default=1000000)
+    
+    args = parser.parse_args(argv)
+    if args.command == "build":
+        index = GeoIPIndex.from_csv(args.csv_path, args.columns)
+        index.save(args.index_path)
+        print(f"Wrote {len(index)} ranges, {len(index.locations)} locations to {args.index_path}")
+    else:
+        print(json.dumps(benchmark(GeoIPIndex.load(args.path), args.count)))
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,9 +1,14 @@
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy import select, insert, update, delete
-from database import ImportJobTable, UserTable, LinkTable, AnalyticsTable
+from database import ImportJobTable, ImportJobErrorTable, UserTable, LinkTable, AnalyticsTable
 from models import ImportJob, ImportType, ImportStatus
-from typing import List, Dict, Any, Optional
+from sharding import link_shards
+from user_stats_services import UserStatsService
+from metrics_services import record_imported_daily_clicks
+from typing import List, Dict, Any, Optional, Iterator, AsyncIterator
+import os
 import uuid
+import asyncio
 from datetime import datetime
 import logging
 import pandas as pd
@@ -13,6 +18,53 @@ import io
 
 logger = logging.getLogger(__name__)
 
+# Maximum number of row-level errors kept per import job. Errors past the cap
+# are still counted by type in the job summary, just not stored individually.
+MAX_STORED_ERRORS_PER_JOB = int(os.getenv("IMPORT_MAX_STORED_ERRORS", "1000"))
+
+# Length limit for a single stored error message
+MAX_ERROR_MESSAGE_LENGTH = 500
+
+# Default number of records handed to the validators/processors at a time
+DEFAULT_IMPORT_BATCH_SIZE = int(os.getenv("IMPORT_BATCH_SIZE", "1000"))
+
+# File formats read column-wise through pyarrow record batches
+COLUMNAR_FORMATS = ('parquet', 'arrow')
+
+# Characters read per step by the incremental JSON parser
+JSON_READ_SIZE = 64 * 1024
+# Characters that can continue a JSON number
+JSON_NUMBER_CHARS = frozenset('0123456789.eE+-')
+
+# Largest single JSON value (one array element) the parser buffers, in characters;
+# a malformed file (e.g. an unterminated string) fails here instead of filling memory
+JSON_MAX_ELEMENT_SIZE = int(os.getenv("IMPORT_JSON_MAX_ELEMENT_SIZE", str(1024 * 1024)))
+
+def short_code_from_url(short_url: Optional[str]) -> Optional[str]:
+    """The short code of a short URL: its last path segment"""
+    if not short_url:
+        return None
+    return short_url.rstrip('/').rsplit('/', 1)[-1] or None
+
+def daily_click(click_date: Any, clicks: Any) -> Optional[tuple]:
+    """(timestamp, clicks) of an imported analytics row for the per-day counters, if it has both"""
+    if isinstance(click_date, str):
+        try:
+            click_date = datetime.fromisoformat(click_date)
+        except ValueError:
+            return None
+    if not isinstance(click_date, datetime):
+        return None
+    try:
+        return click_date, int(clicks or 0)
+    except (TypeError, ValueError):
+        return None
+
+def shard_for_short_url(short_url: Optional[str]) -> int:
+    """Link shard owning a short URL; links without a code go to the first shard"""
+    short_code = short_code_from_url(short_url)
+    return link_shards.shard_for_code(short_code) if short_code else 0
+
 class ImportService:
     """Service for managing import operations with PostgreSQL"""
     
@@ -123,6 +175,59 @@ class ImportService:
         stmt = update(ImportJobTable).where(ImportJobTable.id == job_id).values(**update_data)
         await self.db.execute(stmt)
         await self.db.commit()
+    
+    async def record_errors(self, job_id: str, errors: List[Dict[str, Any]]):
+        """Store row errors for a job, capped per job, and fold them into the summary.
+        
+        Each error is a dict with "error" and optional "row", "field" and
+        "error_type" keys (the shape produced by DataValidator/DataProcessor).
+        """
+        if not errors:
+            return
+        
+        stmt = select(
+            ImportJobTable.errors, ImportJobTable.job_metadata
+        ).where(ImportJobTable.id == job_id)
+        result = await self.db.execute(stmt)
+        job_row = result.fetchone()
+        if not job_row:
+            return
+        
+        metadata = dict(job_row.job_metadata or {})
+        stored = metadata.get("errors_stored", 0)
+        summary = {item["error_type"]: item for item in (job_row.errors or [])}
+        
+        rows = []
+        for error in errors:
+            error_type = error.get("error_type") or "error"
+            message = str(error.get("error", ""))[:MAX_ERROR_MESSAGE_LENGTH]
+            
+            entry = summary.setdefault(error_type, {"error_type": error_type, "count": 0, "sample": message})
+            entry["count"] += 1
+            
+            if stored + len(rows) < MAX_STORED_ERRORS_PER_JOB:
+                rows.append({
+                    "job_id": job_id,
+                    "row_number": error.get("row"),
+                    "field": error.get("field"),
+                    "error_type": error_type,
+                    "message": message,
+                    "created_at": datetime.utcnow()
+                })
+        
+        if rows:
+            await self.db.execute(insert(ImportJobErrorTable), rows)
+        
+        metadata["errors_stored"] = stored + len(rows)
+        metadata["errors_truncated"] = metadata.get("errors_truncated", False) or len(rows) < len(errors)
+        
+        stmt = update(ImportJobTable).where(ImportJobTable.id == job_id).values(
+            errors=sorted(summary.values(), key=lambda item: item["count"], reverse=True),
+            job_metadata=metadata,
+            updated_at=datetime.utcnow()
+        )
+        await self.db.execute(stmt)
+        await self.db.commit()
 
 class FileProcessor:
     """Service for processing uploaded files"""
@@ -135,6 +240,12 @@ class FileProcessor:
             return 'excel'
         elif filename.endswith('.json'):
             return 'json'
+        elif filename.endswith(('.ndjson', '.jsonl')):
+            return 'ndjson'
+        elif filename.endswith(('.parquet', '.pq')):
+            return 'parquet'
+        elif filename.endswith(('.arrow', '.feather', '.ipc', '.arrows')):
+            return 'arrow'
         else:
             return 'unknown'
     
@@ -178,6 +289,203 @@ class FileProcessor:
         except Exception as e:
             logger.error(f"Error parsing JSON file: {e}")
             return []
+    
+    def iter_json_stream(
+        self,
+        f,
+        read_size: int = JSON_READ_SIZE,
+        max_element_size: int = JSON_MAX_ELEMENT_SIZE
+    ) -> Iterator[Any]:
+        """Incrementally parse JSON from a text file object
+        
+        A top-level array yields its elements one at a time; one or more
+        top-level values (a single object, or concatenated objects) yield each
+        value. Only the element being decoded is held in memory, and an
+        element longer than max_element_size characters raises ValueError.
+        """
+        decoder = json.JSONDecoder()
+        buffer = ''
+        position = 0
+        eof = False
+        
+        def fill(size: int = read_size):
+            nonlocal buffer, position, eof
+            chunk = f.read(size)
+            if not chunk:
+                eof = True
+            # Drop what has been consumed so the buffer never grows past one element
+            buffer = buffer[position:] + chunk
+            position = 0
+        
+        def peek() -> str:
+            nonlocal position
+            while True:
+                while position < len(buffer) and buffer[position] in ' \t\r\n':
+                    position += 1
+                if position < len(buffer):
+                    return buffer[position]
+                if eof:
+                    return ''
+                fill()
+        
+        def decode() -> Any:
+            nonlocal position
+            size = read_size
+            while True:
+                try:
+                    value, end = decoder.raw_decode(buffer, position)
+                    # A value ending at the buffer edge may be truncated, and a number followed by
+                    # a partial fraction or exponent ("1." of "1.5e3") decodes short of its end
+                    truncated = end == len(buffer) or (
+                        type(value) in (int, float) and buffer[end] in JSON_NUMBER_CHARS
+                    )
+                    if not truncated or eof:
+                        position = end
+                        return value
+                except json.JSONDecodeError:
+                    if eof:
+                        raise
+                if len(buffer) - position > max_element_size:
+                    raise ValueError(f"JSON value longer than {max_element_size} characters")
+                fill(size)
+                # Doubling the read means a long value is rescanned a logarithmic number of times
+                size *= 2
+        
+        if peek() == '[':
+            position += 1
+            if peek() == ']':
+                return
+            while True:
+                peek()
+                yield decode()
+                separator = peek()
+                position += 1
+                if separator == ']':
+                    return
+                if separator != ',':
+                    raise ValueError(f"Expected ',' or ']' in JSON array, found {separator!r}")
+        
+        while peek():
+            yield decode()
+    
+    def iter_file_records(self, file_path: str, file_format: str) -> Iterator[Dict[str, Any]]:
+        """Yield records from a file on disk without loading it all into memory"""
+        if file_format == 'csv':
+            with open(file_path, 'r', encoding='utf-8', newline='') as f:
+                yield from csv.DictReader(f)
+        elif file_format == 'excel':
+            if str(file_path).endswith('.xls'):
+                # Legacy .xls has no streaming reader
+                yield from pd.read_excel(file_path).to_dict('records')
+                return
+            
+            from openpyxl import load_workbook
+            workbook = load_workbook(file_path, read_only=True, data_only=True)
+            try:
+                rows = workbook.active.iter_rows(values_only=True)
+                header = next(rows, None)
+                if header is None:
+                    return
+                columns = [str(column) if column is not None else '' for column in header]
+                for row in rows:
+                    yield dict(zip(columns, row))
+            finally:
+                workbook.close()
+        elif file_format == 'json':
+            with open(file_path, 'r', encoding='utf-8') as f:
+                yield from self.iter_json_stream(f)
+        elif file_format == 'ndjson':
+            with open(file_path, 'r', encoding='utf-8') as f:
+                for line_number, line in enumerate(f, 1):
+                    line = line.strip()
+                    if not line:
+                        continue
+                    try:
+                        yield json.loads(line)
+                    except json.JSONDecodeError as e:
+                        raise ValueError(f"Invalid JSON on line {line_number}: {e}")
+        elif file_format in COLUMNAR_FORMATS:
+            for batch in self.iter_record_batches(file_path, file_format):
+                yield from batch.to_pylist()
+        else:
+            raise ValueError(f"Unsupported file format: {file_format}")
+    
+    def iter_record_batches(
+        self,
+        file_path: str,
+        file_format: str,
+        batch_size: int = DEFAULT_IMPORT_BATCH_SIZE
+    ) -> Iterator["pa.RecordBatch"]:
+        """Yield pyarrow record batches from a Parquet or Arrow IPC file
+        
+        Parquet is read row group by row group; Arrow IPC files are memory-mapped,
+        so only the batches being processed are paged in.
+        """
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+        
+        if file_format == 'parquet':
+            parquet_file = pq.ParquetFile(file_path)
+            try:
+                yield from parquet_file.iter_batches(batch_size=batch_size)
+            finally:
+                parquet_file.close()
+            return
+        
+        if file_format != 'arrow':
+            raise ValueError(f"Unsupported columnar format: {file_format}")
+        
+        with pa.memory_map(str(file_path), 'r') as source:
+            try:
+                reader = pa.ipc.open_file(source)
+                batches = (reader.get_batch(i) for i in range(reader.num_record_batches))
+            except pa.ArrowInvalid:
+                # Not the random-access file format; fall back to the streaming format
+                source.seek(0)
+                batches = pa.ipc.open_stream(source)
+            
+            for batch in batches:
+                # IPC batches are sized by the writer; re-slice to our batch size
+                for offset in range(0, batch.num_rows, batch_size):
+                    yield batch.slice(offset, batch_size)
+    
+    async def iter_file_batches(
+        self,
+        file_path: str,
+        file_format: str,
+        batch_size: int = DEFAULT_IMPORT_BATCH_SIZE
+    ) -> AsyncIterator[List[Dict[str, Any]]]:
+        """Yield lists of at most batch_size records, parsing in a worker thread"""
+        records = self.iter_file_records(file_path, file_format)
+        
+        def next_batch() -> List[Dict[str, Any]]:
+            batch = []
+            for record in records:
+                batch.append(record)
+                if len(batch) >= batch_size:
+                    break
+            return batch
+        
+        while True:
+            batch = await asyncio.to_thread(next_batch)
+            if not batch:
+                break
+            yield batch
+    
+    async def iter_columnar_batches(
+        self,
+        file_path: str,
+        file_format: str,
+        batch_size: int = DEFAULT_IMPORT_BATCH_SIZE
+    ) -> AsyncIterator["pa.RecordBatch"]:
+        """Async wrapper around iter_record_batches, decoding in a worker thread"""
+        batches = self.iter_record_batches(file_path, file_format, batch_size)
+        
+        while True:
+            batch = await asyncio.to_thread(next, batches, None)
+            if batch is None:
+                break
+            yield batch
 
 class DataValidator:
     """Service for validating import data"""
@@ -194,6 +502,7 @@ class DataValidator:
                 errors.append({
                     "row": i + 1,
                     "field": "original_url",
+                    "error_type": "missing_original_url",
                     "error": "Original URL is required"
                 })
             else:
@@ -204,6 +513,7 @@ class DataValidator:
                 warnings.append({
                     "row": i + 1,
                     "field": "original_url",
+                    "error_type": "invalid_url_scheme",
                     "error": "URL should start with http:// or https://"
                 })
         
@@ -227,12 +537,14 @@ class DataValidator:
                 errors.append({
                     "row": i + 1,
                     "field": "email",
+                    "error_type": "missing_email",
                     "error": "Email is required"
                 })
             elif '@' not in record['email']:
                 errors.append({
                     "row": i + 1,
                     "field": "email",
+                    "error_type": "invalid_email",
                     "error": "Invalid email format"
                 })
             else:
@@ -242,6 +554,7 @@ class DataValidator:
                 errors.append({
                     "row": i + 1,
                     "field": "name",
+                    "error_type": "missing_name",
                     "error": "Name is required"
                 })
         
@@ -265,6 +578,7 @@ class DataValidator:
                 errors.append({
                     "row": i + 1,
                     "field": "click_date",
+                    "error_type": "missing_click_date",
                     "error": "Click date is required"
                 })
             else:
@@ -284,6 +598,13 @@ class DataProcessor:
     def __init__(self, db: AsyncSession):
         self.db = db
     
+    async def _execute_on_shard(self, shard: int, stmt):
+        """Run a write on a link shard; separate shard databases commit it straight away"""
+        async with link_shards.session(shard, self.db) as shard_db:
+            await shard_db.execute(stmt)
+            if link_shards.is_separate(shard_db, self.db):
+                await shard_db.commit()
+    
     async def process_links_import(
         self,
         data: List[Dict[str, Any]],
@@ -293,14 +614,21 @@ class DataProcessor:
         """Process links import data"""
         success_count = 0
         error_count = 0
+        errors = []
+        imported = []
+        
+        # Owners' summary locks are held until the commit below, as for single link creation
+        user_stats = UserStatsService(self.db)
+        await user_stats.lock(record.get('user_id') for record in data if record.get('user_id'))
         
-        for record in data:
+        for i, record in enumerate(data):
             try:
                 # Create link record
                 link_data = {
                     "id": str(uuid.uuid4()),
                     "original_url": record.get('original_url'),
                     "short_url": record.get('short_url'),
+                    "short_code": short_code_from_url(record.get('short_url')),
                     "title": record.get('title'),
                     "description": record.get('description'),
                     "category": record.get('category', 'General'),
@@ -313,21 +641,29 @@ class DataProcessor:
                     "updated_at": datetime.utcnow()
                 }
                 
-                # Insert link
+                # Insert link on its shard
                 stmt = insert(LinkTable).values(**link_data)
-                await self.db.execute(stmt)
+                await self._execute_on_shard(shard_for_short_url(link_data["short_url"]), stmt)
+                imported.append(link_data)
                 success_count += 1
                 
             except Exception as e:
                 logger.error(f"Error processing link record: {e}")
                 error_count += 1
+                errors.append({
+                    "row": i + 1,
+                    "error_type": type(e).__name__,
+                    "error": str(e)
+                })
         
+        await user_stats.record_links_imported(imported)
         await self.db.commit()
         
         return {
             "processed_count": len(data),
             "success_count": success_count,
-            "error_count": error_count
+            "error_count": error_count,
+            "errors": errors
         }
     
     async def process_users_import(
@@ -339,8 +675,9 @@ class DataProcessor:
         """Process users import data"""
         success_count = 0
         error_count = 0
+        errors = []
         
-        for record in data:
+        for i, record in enumerate(data):
             try:
                 # Create user record
                 user_data = {
@@ -362,13 +699,19 @@ class DataProcessor:
             except Exception as e:
                 logger.error(f"Error processing user record: {e}")
                 error_count += 1
+                errors.append({
+                    "row": i + 1,
+                    "error_type": type(e).__name__,
+                    "error": str(e)
+                })
         
         await self.db.commit()
         
         return {
             "processed_count": len(data),
             "success_count": success_count,
-            "error_count": error_count
+            "error_count": error_count,
+            "errors": errors
         }
     
     async def process_analytics_import(
@@ -379,8 +722,10 @@ class DataProcessor:
         """Process analytics import data"""
         success_count = 0
         error_count = 0
+        errors = []
+        daily_clicks = []
         
-        for record in data:
+        for i, record in enumerate(data):
             try:
                 # Create analytics record
                 analytics_data = {
@@ -402,21 +747,190 @@ class DataProcessor:
                     "created_at": datetime.utcnow()
                 }
                 
-                # Insert analytics
+                # Insert analytics on the shard of its link
                 stmt = insert(AnalyticsTable).values(**analytics_data)
-                await self.db.execute(stmt)
+                await self._execute_on_shard(shard_for_short_url(analytics_data["short_url"]), stmt)
                 success_count += 1
+                day_clicks = daily_click(analytics_data["click_date"], analytics_data["clicks"])
+                if day_clicks:
+                    daily_clicks.append(day_clicks)
                 
             except Exception as e:
                 logger.error(f"Error processing analytics record: {e}")
                 error_count += 1
+                errors.append({
+                    "row": i + 1,
+                    "error_type": type(e).__name__,
+                    "error": str(e)
+                })
         
+        if daily_clicks:
+            # Keep the admin clicks-per-day totals in step with the imported rows
+            await record_imported_daily_clicks(self.db, *zip(*daily_clicks))
         await self.db.commit()
         
         return {
             "processed_count": len(data),
             "success_count": success_count,
-            "error_count": error_count
+            "error_count": error_count,
+            "errors": errors
+        }
+
+    async def process_analytics_batch(
+        self,
+        batch: "pa.RecordBatch",
+        job_id: str
+    ) -> Dict[str, Any]:
+        """Process one Arrow record batch of analytics data column-wise
+        
+        Columns are normalized with pyarrow compute kernels and the rows are
+        written with a single COPY, so no per-row dict is ever built. A column
+        whose cast fails is converted value by value instead, and the rows
+        holding values that do not convert are reported as errors.
+        """
+        import pyarrow as pa
+        import pyarrow.compute as pc
+        
+        num_rows = batch.num_rows
+        errors = []
+        
+        if 'click_date' not in batch.schema.names:
+            return {
+                "processed_count": num_rows,
+                "success_count": 0,
+                "error_count": num_rows,
+                "errors": [{"error_type": "missing_click_date", "field": "click_date", "error": "Click date column is missing"}]
+            }
+        
+        # Rows without a click date are rejected, mirroring DataValidator.validate_analytics_data
+        click_date = batch.column('click_date')
+        missing = pc.is_null(click_date)
+        # Batch row number (1-based) of each row that is kept
+        row_numbers = list(range(1, num_rows + 1))
+        if pc.any(missing).as_py():
+            for row in pc.indices_nonzero(missing).to_pylist():
+                errors.append({
+                    "row": row + 1,
+                    "field": "click_date",
+                    "error_type": "missing_click_date",
+                    "error": "Click date is required"
+                })
+            row_numbers = [row + 1 for row in pc.indices_nonzero(pc.invert(missing)).to_pylist()]
+            batch = batch.filter(pc.invert(missing))
+        
+        valid_rows = batch.num_rows
+        if valid_rows == 0:
+            return {"processed_count": num_rows, "success_count": 0, "error_count": len(errors), "errors": errors}
+        
+        # Positions (in the filtered batch) of rows with a value that does not convert
+        rejected = set()
+        
+        def cast_rows(name: str, values: "pa.ChunkedArray", arrow_type: "pa.DataType") -> "pa.Array":
+            # Slow path for a column whose cast failed: find the offending rows one value at a time
+            cast = []
+            for position, value in enumerate(values):
+                try:
+                    cast.append(value.cast(arrow_type).as_py())
+                except (pa.ArrowInvalid, pa.ArrowNotImplementedError) as e:
+                    rejected.add(position)
+                    errors.append({
+                        "row": row_numbers[position],
+                        "field": name,
+                        "error_type": "invalid_value",
+                        "error": f"Cannot convert {value.as_py()!r} to {arrow_type}: {e}"
+                    })
+                    cast.append(None)
+            return pa.array(cast, type=arrow_type)
+        
+        def column(name: str, arrow_type: "pa.DataType", default: Any = None) -> List[Any]:
+            if name not in batch.schema.names:
+                return [default] * valid_rows
+            values = batch.column(name)
+            if pa.types.is_timestamp(values.type) and values.type.tz is not None:
+                # Stored as naive UTC, like the rest of the schema
+                values = values.cast(pa.timestamp(values.type.unit))
+            try:
+                values = values.cast(arrow_type)
+            except (pa.ArrowInvalid, pa.ArrowNotImplementedError):
+                values = cast_rows(name, values, arrow_type)
+            if default is not None:
+                values = pc.fill_null(values, default)
+            return values.to_pylist()
+        
+        now = datetime.utcnow()
+        columns = {
+            "id": [str(uuid.uuid4()) for _ in range(valid_rows)],
+            "link_id": column('link_id', pa.string()),
+            "short_url": column('short_url', pa.string()),
+            "original_url": column('original_url', pa.string()),
+            "clicks": column('clicks', pa.int64(), 0),
+            "unique_clicks": column('unique_clicks', pa.int64(), 0),
+            "click_date": column('click_date', pa.timestamp('us')),
+            "country": column('country', pa.string()),
+            "city": column('city', pa.string()),
+            "device_type": column('device_type', pa.string()),
+            "browser": column('browser', pa.string()),
+            "os": column('os', pa.string()),
+            "referrer": column('referrer', pa.string()),
+            "user_agent": column('user_agent', pa.string()),
+            "ip_address": column('ip_address', pa.string()),
+            "created_at": [now] * valid_rows
+        }
+        
+        records = zip(*columns.values())
+        if rejected:
+            records = (record for position, record in enumerate(records) if position not in rejected)
+        
+        records_by_shard: Dict[int, List[tuple]] = {}
+        if link_shards.sharded:
+            short_url_position = list(columns).index("short_url")
+            for record in records:
+                records_by_shard.setdefault(shard_for_short_url(record[short_url_position]), []).append(record)
+        else:
+            records_by_shard[0] = list(records)
+        
+        click_date_position = list(columns).index("click_date")
+        clicks_position = list(columns).index("clicks")
+        success_count = 0
+        for shard, records in records_by_shard.items():
+            async with link_shards.session(shard, self.db) as shard_db:
+                try:
+                    connection = await shard_db.connection()
+                    raw_connection = await connection.get_raw_connection()
+                    await raw_connection.driver_connection.copy_records_to_table(
+                        AnalyticsTable.__tablename__,
+                        records=records,
+                        columns=list(columns.keys())
+                    )
+                    # Keep the admin clicks-per-day totals in step; on the primary this commits with the rows
+                    await record_imported_daily_clicks(
+                        self.db,
+                        (record[click_date_position] for record in records),
+                        (record[clicks_position] for record in records)
+                    )
+                    await shard_db.commit()
+                    success_count += len(records)
+                except Exception as e:
+                    logger.error(f"Error processing analytics batch: {e}")
+                    await shard_db.rollback()
+                    if link_shards.is_separate(shard_db, self.db):
+                        await self.db.rollback()
+                    errors.append({"error_type": type(e).__name__, "error": str(e)})
+                    continue
+            
+            if link_shards.is_separate(shard_db, self.db):
+                # The rows are committed on their shard; a failure here only costs the per-day totals
+                try:
+                    await self.db.commit()
+                except Exception as e:
+                    logger.error(f"Error recording daily clicks of an analytics batch: {e}")
+                    await self.db.rollback()
+        
+        return {
+            "processed_count": num_rows,
+            "success_count": success_count,
+            "error_count": num_rows - success_count,
+            "errors": errors
         }
 
 class PlatformMigrationService:
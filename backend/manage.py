@@ -0,0 +1,170 @@
+"""Operational commands, run once per deploy rather than on every worker boot
+
+    python manage.py migrate                 # alembic upgrade head, then the shard chain on each link shard
+    python manage.py seed                    # sample users for development / demos
+    python manage.py export-redirects DIR    # edge redirect snapshot, plus a delta from the previous one
+"""
+from sqlalchemy import select
+from database import AsyncSessionLocal, ReplicaSessionLocal, UserTable, LinkTable, engine, dispose_engines
+from models import PlanType
+from subscription_services import get_plan_limits
+from sharding import link_shards
+from redirect_snapshot import (
+    RedirectSnapshot, PerfectHashIndex, SNAPSHOT_NAME, snapshot_name, delta_name, index_name, prune_snapshots
+)
+from pathlib import Path
+from datetime import datetime
+import asyncio
+import logging
+import time
+import typer
+import uuid
+
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+)
+logger = logging.getLogger(__name__)
+
+ALEMBIC_INI = Path(__file__).parent / "alembic.ini"
+
+cli = typer.Typer(help="Linkly backend management commands")
+
+@cli.command()
+def migrate(revision: str = typer.Argument("head", help="Target revision")):
+    """Upgrade the database schema"""
+    from alembic import command
+    from alembic.config import Config
+    
+    command.upgrade(Config(str(ALEMBIC_INI)), revision)
+    if link_shards.sharded:
+        # Shards hold only links and analytics, so they have their own chain (migrations/shard_versions)
+        link_shards.upgrade_schemas()
+
+@cli.command("export-redirects")
+def export_redirects(
+    directory: Path = typer.Argument(..., help="Snapshot directory the edge servers read"),
+    keep: int = typer.Option(2, min=1, help="Full snapshots to keep; older snapshots, indexes and deltas are deleted")
+):
+    """Write a snapshot of all active links with its hash index, and a delta from the newest snapshot already there"""
+    directory.mkdir(parents=True, exist_ok=True)
+    entries = asyncio.run(_active_redirects())
+    current = RedirectSnapshot.build(entries, version=int(time.time() * 1000))
+    
+    previous = [int(match.group(1)) for match in map(SNAPSHOT_NAME.match, (p.name for p in directory.iterdir())) if match]
+    if previous:
+        base = RedirectSnapshot.open(str(directory / snapshot_name(max(previous))))
+        delta = RedirectSnapshot.diff(base, current)
+        delta.save(str(directory / delta_name(base.version, current.version)))
+        logger.info(f"Wrote delta {base.version} -> {current.version} with {len(delta)} changes")
+    
+    # The index and then the full snapshot go last, so edges that poll in between find the delta first
+    # and never map a snapshot without its index
+    PerfectHashIndex.build(current).save(str(directory / index_name(current.version)))
+    current.save(str(directory / snapshot_name(current.version)))
+    logger.info(f"Wrote snapshot {current.version} with {len(current)} links and its hash index")
+    
+    removed = prune_snapshots(str(directory), keep)
+    if removed:
+        logger.info(f"Removed {len(removed)} old snapshot files")
+
+async def _active_redirects():
+    stmt = select(LinkTable.short_code, LinkTable.original_url).where(
+        LinkTable.is_active == True,
+        LinkTable.short_code.isnot(None)
+    )
+    
+    async def on_shard(db):
+        return (await db.execute(stmt)).fetchall()
+    
+    try:
+        async with ReplicaSessionLocal() as db:
+            per_shard = await link_shards.fan_out(on_shard, db)
+        return [(row.short_code, row.original_url) for rows in per_shard for row in rows]
+    finally:
+        await link_shards.dispose()
+        await dispose_engines()
+
+@cli.command()
+def seed():
+    """Create the sample users if the database has no users yet"""
+    asyncio.run(_seed())
+
+async def _seed():
+    try:
+        created = await seed_sample_data()
+        logger.info("Sample users created" if created else "Users already exist, nothing seeded")
+    finally:
+        await engine.dispose()
+
+async def seed_sample_data() -> bool:
+    """Seed sample users for testing"""
+    async with AsyncSessionLocal() as db:
+        # Check if users already exist
+        stmt = select(UserTable).limit(1)
+        result = await db.execute(stmt)
+        existing_user = result.scalar_one_or_none()
+        
+        if existing_user:
+            return False
+        
+        # Create sample users
+        sample_users = [
+            UserTable(
+                id=str(uuid.uuid4()),
+                email='john@example.com',
+                name='John Doe',
+                user_type='customer',
+                plan_type='basic',
+                max_links=get_plan_limits(PlanType.BASIC).max_links,
+                links_created=0,
+                is_active=True,
+                created_at=datetime.utcnow(),
+                updated_at=datetime.utcnow()
+            ),
+            UserTable(
+                id=str(uuid.uuid4()),
+                email='sarah@example.com',
+                name='Sarah Wilson',
+                user_type='customer',
+                plan_type='pro',
+                max_links=get_plan_limits(PlanType.PRO).max_links,
+                links_created=0,
+                is_active=True,
+                created_at=datetime.utcnow(),
+                updated_at=datetime.utcnow()
+            ),
+            UserTable(
+                id=str(uuid.uuid4()),
+                email='admin@linkly.com',
+                name='Admin User',
+                user_type='admin',
+                plan_type='pro',
+                max_links=1000,
+                links_created=0,
+                is_active=True,
+                created_at=datetime.utcnow(),
+                updated_at=datetime.utcnow()
+            ),
+            UserTable(
+                id=str(uuid.uuid4()),
+                email='mike@example.com',
+                name='Mike Johnson',
+                user_type='customer',
+                plan_type='basic',
+                max_links=get_plan_limits(PlanType.BASIC).max_links,
+                links_created=0,
+                is_active=False,
+                created_at=datetime.utcnow(),
+                updated_at=datetime.utcnow()
+            )
+        ]
+        
+        for user in sample_users:
+            db.add(user)
+        
+        await db.commit()
+        return True
+
+if __name__ == "__main__":
+    cli()
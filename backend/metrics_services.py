@@ -0,0 +1,272 @@
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy import select, func, case, cast, Date
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from database import (
+    AsyncSessionLocal, ReplicaSessionLocal, UserTable, LinkTable, AnalyticsTable, ImportJobTable,
+    DailyClickCountTable, PlatformMetricsTable
+)
+from models import PlatformMetrics
+from sharding import link_shards
+from typing import Any, Dict, Iterable, Optional
+from collections import Counter
+from itertools import repeat
+from datetime import datetime, timedelta
+import asyncio
+import logging
+import os
+import time
+
+logger = logging.getLogger(__name__)
+
+METRICS_REFRESH_SECONDS = float(os.getenv("METRICS_REFRESH_SECONDS", "300"))
+METRICS_HISTORY_DAYS = int(os.getenv("METRICS_HISTORY_DAYS", "30"))
+
+PLATFORM_SNAPSHOT = "platform"
+# platform_metrics row recording that daily_click_counts has been seeded from analytics
+DAILY_CLICKS_BACKFILL = "daily_clicks_backfill"
+# pg advisory lock key so only one worker refreshes a given snapshot at a time
+METRICS_REFRESH_LOCK_KEY = 7320401
+
+async def record_daily_clicks(db: AsyncSession, click_dates, clicks: Optional[Iterable[int]] = None):
+    """Add a batch of click timestamps to the per-day counters (caller commits)
+    
+    Each timestamp is one click, or as many as its entry in `clicks`.
+    """
+    counts = Counter()
+    for click_date, count in zip(click_dates, repeat(1) if clicks is None else clicks):
+        if count:
+            counts[click_date.date()] += count
+    if not counts:
+        return
+    stmt = pg_insert(DailyClickCountTable).values([
+        {"day": day, "clicks": clicks} for day, clicks in sorted(counts.items())
+    ])
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[DailyClickCountTable.day],
+        set_={"clicks": DailyClickCountTable.clicks + stmt.excluded.clicks}
+    )
+    await db.execute(stmt)
+
+async def record_imported_daily_clicks(db: AsyncSession, click_dates, clicks: Iterable[int]):
+    """Add imported analytics rows to the per-day counters (caller commits)
+    
+    Until the one-off backfill has run the rows are left to it: an imported
+    old day would otherwise become the first counted day and hide every
+    earlier day from the backfill.
+    """
+    backfilled = (await db.execute(
+        select(PlatformMetricsTable.name).where(PlatformMetricsTable.name == DAILY_CLICKS_BACKFILL)
+    )).first()
+    if backfilled:
+        await record_daily_clicks(db, click_dates, clicks)
+
+class PlatformMetricsService:
+    """Admin-wide totals served from a materialized snapshot
+    
+    refresh() runs the aggregate queries once and stores the result as a
+    JSON row in platform_metrics; readers only ever fetch that row. Clicks
+    per day come from daily_click_counts, which the analytics flusher and
+    analytics imports keep up to date incrementally, so no refresh scans the
+    analytics table.
+    The aggregates can be read from a replica by passing read_db.
+    """
+    
+    def __init__(self, db: AsyncSession, read_db: Optional[AsyncSession] = None):
+        self.db = db
+        self.read_db = read_db or db
+    
+    async def get(self) -> Optional[PlatformMetrics]:
+        """The latest snapshot, refreshed first if none exists yet
+        
+        Returns None when there is no snapshot and another worker is busy
+        building the first one.
+        """
+        snapshot = await self._load()
+        if snapshot is None:
+            await self.refresh()
+            snapshot = await self._load()
+            if snapshot is None:
+                return None
+        return self._to_response(snapshot)
+    
+    async def _load(self) -> Optional[PlatformMetricsTable]:
+        stmt = select(PlatformMetricsTable).where(PlatformMetricsTable.name == PLATFORM_SNAPSHOT)
+        return (await self.db.execute(stmt)).scalar_one_or_none()
+    
+    @staticmethod
+    def _to_response(snapshot: PlatformMetricsTable) -> PlatformMetrics:
+        return PlatformMetrics(
+            **snapshot.data,
+            refreshed_at=snapshot.refreshed_at,
+            stale_seconds=max((datetime.utcnow() - snapshot.refreshed_at).total_seconds(), 0)
+        )
+    
+    async def refresh(self, max_age_seconds: float = 0) -> bool:
+        """Recompute the snapshot unless another worker is doing it or it is fresh enough"""
+        locked = (await self.db.execute(
+            select(func.pg_try_advisory_xact_lock(METRICS_REFRESH_LOCK_KEY))
+        )).scalar()
+        if not locked:
+            await self.db.rollback()
+            return False
+        
+        snapshot = await self._load()
+        if snapshot is not None and max_age_seconds and (datetime.utcnow() - snapshot.refreshed_at).total_seconds() < max_age_seconds:
+            await self.db.rollback()
+            return False
+        
+        started = time.perf_counter()
+        await self._backfill_daily_clicks()
+        data = await self._compute()
+        now = datetime.utcnow()
+        
+        stmt = pg_insert(PlatformMetricsTable).values(
+            name=PLATFORM_SNAPSHOT,
+            data=data,
+            refreshed_at=now,
+            refresh_duration_ms=int((time.perf_counter() - started) * 1000)
+        )
+        stmt = stmt.on_conflict_do_update(
+            index_elements=[PlatformMetricsTable.name],
+            set_={
+                "data": stmt.excluded.data,
+                "refreshed_at": stmt.excluded.refreshed_at,
+                "refresh_duration_ms": stmt.excluded.refresh_duration_ms
+            }
+        )
+        await self.db.execute(stmt)
+        # Committing also releases the advisory lock
+        await self.db.commit()
+        return True
+    
+    async def _backfill_daily_clicks(self):
+        """Seed daily_click_counts from analytics once, for the days before the flusher's first"""
+        done = (await self.db.execute(
+            select(PlatformMetricsTable.name).where(PlatformMetricsTable.name == DAILY_CLICKS_BACKFILL)
+        )).first()
+        if done:
+            return
+        
+        # The flusher may have started counting before the first refresh; its days are left to it
+        first_counted = (await self.db.execute(select(func.min(DailyClickCountTable.day)))).scalar()
+        day = cast(AnalyticsTable.click_date, Date)
+        clicks_by_day = select(day, func.coalesce(func.sum(AnalyticsTable.clicks), 0)).group_by(day)
+        if first_counted is not None:
+            clicks_by_day = clicks_by_day.where(AnalyticsTable.click_date < first_counted)
+        
+        async def on_shard(db: AsyncSession):
+            return (await db.execute(clicks_by_day)).fetchall()
+        
+        totals = Counter()
+        for rows in await link_shards.fan_out(on_shard, self.db):
+            for row_day, clicks in rows:
+                totals[row_day] += int(clicks)
+        if totals:
+            await self.db.execute(
+                pg_insert(DailyClickCountTable).values([
+                    {"day": row_day, "clicks": clicks} for row_day, clicks in sorted(totals.items())
+                ]).on_conflict_do_nothing()
+            )
+        
+        # Committed with the snapshot, so a failed refresh backfills again next time
+        await self.db.execute(pg_insert(PlatformMetricsTable).values(
+            name=DAILY_CLICKS_BACKFILL,
+            data={"before": first_counted.isoformat() if first_counted else None, "days": len(totals)},
+            refreshed_at=datetime.utcnow()
+        ).on_conflict_do_nothing())
+        logger.info(f"Backfilled daily click counts for {len(totals)} day(s) from analytics")
+    
+    async def _compute(self) -> Dict[str, Any]:
+        since = (datetime.utcnow() - timedelta(days=METRICS_HISTORY_DAYS - 1)).date()
+        
+        users_by_plan = {
+            row.plan_type or "basic": row.users
+            for row in (await self.read_db.execute(
+                select(UserTable.plan_type, func.count().label("users")).group_by(UserTable.plan_type)
+            )).fetchall()
+        }
+        users_active = (await self.read_db.execute(
+            select(func.count()).select_from(UserTable).where(UserTable.is_active.is_(True))
+        )).scalar()
+        
+        links_stmt = select(
+            func.count(),
+            func.count(case((LinkTable.is_active.is_(True), 1))),
+            func.coalesce(func.sum(LinkTable.clicks), 0)
+        ).select_from(LinkTable)
+        
+        async def links_on_shard(db: AsyncSession):
+            return (await db.execute(links_stmt)).one()
+        
+        links = [sum(values) for values in zip(*await link_shards.fan_out(links_on_shard, self.read_db))]
+        
+        # From the primary: the backfill above may have just written these rows
+        clicks_per_day = [
+            {"day": row.day.isoformat(), "clicks": row.clicks}
+            for row in (await self.db.execute(
+                select(DailyClickCountTable.day, DailyClickCountTable.clicks).where(
+                    DailyClickCountTable.day >= since
+                ).order_by(DailyClickCountTable.day)
+            )).fetchall()
+        ]
+        
+        import_day = cast(ImportJobTable.created_at, Date)
+        imports_per_day = [
+            {
+                "day": row.day.isoformat(),
+                "jobs": row.jobs,
+                "records": row.records,
+                "successful": row.successful,
+                "failed": row.failed
+            }
+            for row in (await self.read_db.execute(
+                select(
+                    import_day.label("day"),
+                    func.count().label("jobs"),
+                    func.coalesce(func.sum(ImportJobTable.total_records), 0).label("records"),
+                    func.coalesce(func.sum(ImportJobTable.success_count), 0).label("successful"),
+                    func.coalesce(func.sum(ImportJobTable.error_count), 0).label("failed")
+                ).where(ImportJobTable.created_at >= since).group_by(import_day).order_by(import_day)
+            )).fetchall()
+        ]
+        
+        return {
+            "users_total": sum(users_by_plan.values()),
+            "users_active": users_active,
+            "users_by_plan": users_by_plan,
+            "links_total": links[0],
+            "links_active": links[1],
+            "clicks_total": int(links[2]),
+            "clicks_per_day": clicks_per_day,
+            "imports_per_day": imports_per_day,
+        }
+
+class PlatformMetricsRefresher:
+    """Background task refreshing the platform snapshot every METRICS_REFRESH_SECONDS"""
+    
+    def __init__(self, interval: float = METRICS_REFRESH_SECONDS):
+        self.interval = interval
+        self._task: Optional[asyncio.Task] = None
+    
+    async def refresh(self):
+        try:
+            async with AsyncSessionLocal() as db, ReplicaSessionLocal() as read_db:
+                # Every worker runs this loop; the age check and advisory lock keep it to one refresh per interval
+                await PlatformMetricsService(db, read_db).refresh(max_age_seconds=self.interval * 0.9)
+        except Exception as e:
+            logger.error(f"Error refreshing platform metrics: {e}")
+    
+    async def _run(self):
+        while True:
+            await self.refresh()
+            await asyncio.sleep(self.interval)
+    
+    def start(self):
+        self._task = asyncio.create_task(self._run())
+    
+    async def stop(self):
+        if self._task:
+            self._task.cancel()
+            self._task = None
+
+platform_metrics_refresher = PlatformMetricsRefresher()
@@ -0,0 +1,93 @@
+"""Shard baseline: links and analytics, without foreign keys to tables on the primary
+
+Link shards run this chain instead of the main one (see ShardMap.upgrade_schemas).
+A change to links or analytics needs a revision here as well as in versions/.
+
+Revision ID: s0001
+Revises:
+Create Date: 2026-10-19
+"""
+from alembic import op
+import sqlalchemy as sa
+
+revision = "s0001"
+down_revision = None
+branch_labels = ("shards",)
+depends_on = None
+
+# (name, table, columns, unique, partial WHERE clause), as in the main chain
+INDEXES = [
+    ("ix_links_short_code", "links", ["short_code"], True, None),
+    ("ix_links_user_id_created_at", "links", ["user_id", "created_at"], False, None),
+    ("ix_links_user_id_clicks", "links", ["user_id", "clicks"], False, None),
+    ("ix_links_user_email", "links", ["user_email"], False, None),
+    ("ix_links_created_at", "links", ["created_at"], False, None),
+    ("ix_links_active_clicks", "links", [sa.text("clicks DESC")], False, "is_active"),
+    ("ix_analytics_link_id_click_date", "analytics", ["link_id", "click_date"], False, None),
+    ("ix_analytics_click_date", "analytics", ["click_date"], False, None),
+]
+
+def upgrade():
+    # Shards set up before this chain existed already have the tables
+    existing = set(sa.inspect(op.get_bind()).get_table_names())
+    
+    if "links" not in existing:
+        op.create_table(
+            "links",
+            sa.Column("id", sa.String(), primary_key=True),
+            sa.Column("original_url", sa.Text(), nullable=False),
+            sa.Column("short_url", sa.String(), nullable=True, unique=True),
+            sa.Column("short_code", sa.String(), nullable=True),
+            sa.Column("title", sa.String(), nullable=True),
+            sa.Column("description", sa.Text(), nullable=True),
+            sa.Column("category", sa.String(), nullable=True),
+            sa.Column("tags", sa.JSON(), nullable=True),
+            sa.Column("custom_domain", sa.String(), nullable=True),
+            sa.Column("is_active", sa.Boolean(), nullable=True),
+            sa.Column("clicks", sa.Integer(), nullable=True),
+            sa.Column("bot_clicks", sa.Integer(), nullable=True),
+            # users live on the primary, so no foreign key here
+            sa.Column("user_id", sa.String(), nullable=True),
+            sa.Column("user_email", sa.String(), nullable=True),
+            sa.Column("created_at", sa.DateTime(), nullable=True),
+            sa.Column("updated_at", sa.DateTime(), nullable=True),
+        )
+    
+    if "analytics" not in existing:
+        op.create_table(
+            "analytics",
+            sa.Column("id", sa.String(), primary_key=True),
+            sa.Column("link_id", sa.String(), sa.ForeignKey("links.id"), nullable=True),
+            sa.Column("short_url", sa.String(), nullable=True),
+            sa.Column("original_url", sa.Text(), nullable=True),
+            sa.Column("clicks", sa.Integer(), nullable=True),
+            sa.Column("unique_clicks", sa.Integer(), nullable=True),
+            sa.Column("click_date", sa.DateTime(), nullable=False),
+            sa.Column("country", sa.String(), nullable=True),
+            # Dimension ids refer to tables on the primary
+            sa.Column("country_id", sa.SmallInteger(), nullable=True),
+            sa.Column("city", sa.String(), nullable=True),
+            sa.Column("device_type", sa.String(), nullable=True),
+            sa.Column("browser", sa.String(), nullable=True),
+            sa.Column("os", sa.String(), nullable=True),
+            sa.Column("referrer", sa.String(), nullable=True),
+            sa.Column("referrer_domain_id", sa.Integer(), nullable=True),
+            sa.Column("user_agent", sa.Text(), nullable=True),
+            sa.Column("user_agent_id", sa.Integer(), nullable=True),
+            sa.Column("ip_address", sa.String(), nullable=True),
+            sa.Column("created_at", sa.DateTime(), nullable=True),
+        )
+    
+    with op.get_context().autocommit_block():
+        for name, table, index_columns, unique, where in INDEXES:
+            op.create_index(
+                name, table, index_columns,
+                unique=unique,
+                postgresql_where=sa.text(where) if where else None,
+                postgresql_concurrently=True,
+                if_not_exists=True,
+            )
+
+def downgrade():
+    op.drop_table("analytics")
+    op.drop_table("links")
@@ -0,0 +1,152 @@
+"""Initial schema, as previously created by create_all
+
+Revision ID: 0001
+Revises:
+Create Date: 2026-10-19
+"""
+from alembic import op
+import sqlalchemy as sa
+
+revision = "0001"
+down_revision = None
+branch_labels = None
+depends_on = None
+
+def _timestamps():
+    return [
+        sa.Column("created_at", sa.DateTime(), nullable=True),
+        sa.Column("updated_at", sa.DateTime(), nullable=True),
+    ]
+
+def upgrade():
+    # Databases that were set up with create_all already have these tables
+    existing = set(sa.inspect(op.get_bind()).get_table_names())
+    
+    if "status_checks" not in existing:
+        op.create_table(
+            "status_checks",
+            sa.Column("id", sa.String(), primary_key=True),
+            sa.Column("client_name", sa.String(), nullable=False),
+            sa.Column("timestamp", sa.DateTime(), nullable=True),
+        )
+    
+    if "users" not in existing:
+        op.create_table(
+            "users",
+            sa.Column("id", sa.String(), primary_key=True),
+            sa.Column("email", sa.String(), nullable=False, unique=True),
+            sa.Column("name", sa.String(), nullable=False),
+            sa.Column("user_type", sa.String(), nullable=True),
+            sa.Column("plan_type", sa.String(), nullable=True),
+            sa.Column("plan_expires", sa.DateTime(), nullable=True),
+            sa.Column("max_links", sa.Integer(), nullable=True),
+            sa.Column("links_created", sa.Integer(), nullable=True),
+            sa.Column("features_enabled", sa.JSON(), nullable=True),
+            sa.Column("is_active", sa.Boolean(), nullable=True),
+            *_timestamps(),
+        )
+    
+    if "subscriptions" not in existing:
+        op.create_table(
+            "subscriptions",
+            sa.Column("id", sa.String(), primary_key=True),
+            sa.Column("user_id", sa.String(), sa.ForeignKey("users.id"), nullable=False),
+            sa.Column("plan_type", sa.String(), nullable=True),
+            sa.Column("plan_expires", sa.DateTime(), nullable=True),
+            sa.Column("is_active", sa.Boolean(), nullable=True),
+            sa.Column("auto_renew", sa.Boolean(), nullable=True),
+            *_timestamps(),
+        )
+    
+    if "links" not in existing:
+        op.create_table(
+            "links",
+            sa.Column("id", sa.String(), primary_key=True),
+            sa.Column("original_url", sa.Text(), nullable=False),
+            sa.Column("short_url", sa.String(), nullable=True, unique=True),
+            sa.Column("title", sa.String(), nullable=True),
+            sa.Column("description", sa.Text(), nullable=True),
+            sa.Column("category", sa.String(), nullable=True),
+            sa.Column("tags", sa.JSON(), nullable=True),
+            sa.Column("custom_domain", sa.String(), nullable=True),
+            sa.Column("is_active", sa.Boolean(), nullable=True),
+            sa.Column("clicks", sa.Integer(), nullable=True),
+            sa.Column("user_id", sa.String(), sa.ForeignKey("users.id"), nullable=True),
+            sa.Column("user_email", sa.String(), nullable=True),
+            *_timestamps(),
+        )
+    
+    if "import_jobs" not in existing:
+        op.create_table(
+            "import_jobs",
+            sa.Column("id", sa.String(), primary_key=True),
+            sa.Column("import_type", sa.String(), nullable=False),
+            sa.Column("filename", sa.String(), nullable=False),
+            sa.Column("original_filename", sa.String(), nullable=False),
+            sa.Column("status", sa.String(), nullable=True),
+            sa.Column("total_records", sa.Integer(), nullable=True),
+            sa.Column("processed_records", sa.Integer(), nullable=True),
+            sa.Column("success_count", sa.Integer(), nullable=True),
+            sa.Column("error_count", sa.Integer(), nullable=True),
+            *_timestamps(),
+            sa.Column("completed_at", sa.DateTime(), nullable=True),
+            sa.Column("errors", sa.JSON(), nullable=True),
+            sa.Column("job_metadata", sa.JSON(), nullable=True),
+            sa.Column("created_by", sa.String(), nullable=False),
+        )
+    
+    if "analytics" not in existing:
+        op.create_table(
+            "analytics",
+            sa.Column("id", sa.String(), primary_key=True),
+            sa.Column("link_id", sa.String(), sa.ForeignKey("links.id"), nullable=True),
+            sa.Column("short_url", sa.String(), nullable=True),
+            sa.Column("original_url", sa.Text(), nullable=True),
+            sa.Column("clicks", sa.Integer(), nullable=True),
+            sa.Column("unique_clicks", sa.Integer(), nullable=True),
+            sa.Column("click_date", sa.DateTime(), nullable=False),
+            sa.Column("country", sa.String(), nullable=True),
+            sa.Column("city", sa.String(), nullable=True),
+            sa.Column("device_type", sa.String(), nullable=True),
+            sa.Column("browser", sa.String(), nullable=True),
+            sa.Column("os", sa.String(), nullable=True),
+            sa.Column("referrer", sa.String(), nullable=True),
+            sa.Column("user_agent", sa.Text(), nullable=True),
+            sa.Column("ip_address", sa.String(), nullable=True),
+            sa.Column("created_at", sa.DateTime(), nullable=True),
+        )
+    
+    if "domains" not in existing:
+        op.create_table(
+            "domains",
+            sa.Column("id", sa.String(), primary_key=True),
+            sa.Column("domain", sa.String(), nullable=False, unique=True),
+            sa.Column("is_active", sa.Boolean(), nullable=True),
+            sa.Column("ssl_enabled", sa.Boolean(), nullable=True),
+            sa.Column("dns_verified", sa.Boolean(), nullable=True),
+            sa.Column("owner_user_id", sa.String(), sa.ForeignKey("users.id"), nullable=True),
+            sa.Column("owner_email", sa.String(), nullable=True),
+            sa.Column("settings", sa.JSON(), nullable=True),
+            *_timestamps(),
+        )
+    
+    if "contacts" not in existing:
+        op.create_table(
+            "contacts",
+            sa.Column("id", sa.String(), primary_key=True),
+            sa.Column("name", sa.String(), nullable=False),
+            sa.Column("email", sa.String(), nullable=False),
+            sa.Column("phone", sa.String(), nullable=True),
+            sa.Column("company", sa.String(), nullable=True),
+            sa.Column("position", sa.String(), nullable=True),
+            sa.Column("tags", sa.JSON(), nullable=True),
+            sa.Column("notes", sa.Text(), nullable=True),
+            sa.Column("source", sa.String(), nullable=True),
+            sa.Column("status", sa.String(), nullable=True),
+            sa.Column("contact_metadata", sa.JSON(), nullable=True),
+            *_timestamps(),
+        )
+
+def downgrade():
+    for table in ("contacts", "domains", "analytics", "import_jobs", "links", "subscriptions", "users", "status_checks"):
+        op.drop_table(table)
@@ -0,0 +1,134 @@
+"""Tables and columns added since the initial schema
+
+Revision ID: 0002
+Revises: 0001
+Create Date: 2026-10-19
+"""
+from alembic import op
+import sqlalchemy as sa
+
+revision = "0002"
+down_revision = "0001"
+branch_labels = None
+depends_on = None
+
+def upgrade():
+    # Everything here may already exist on databases that ran create_all
+    inspector = sa.inspect(op.get_bind())
+    existing = set(inspector.get_table_names())
+    
+    def add_missing_columns(table, *columns):
+        present = {column["name"] for column in inspector.get_columns(table)}
+        for column in columns:
+            if column.name not in present:
+                op.add_column(table, column)
+    
+    if "import_job_errors" not in existing:
+        op.create_table(
+            "import_job_errors",
+            sa.Column("id", sa.Integer(), primary_key=True, autoincrement=True),
+            sa.Column("job_id", sa.String(), sa.ForeignKey("import_jobs.id", ondelete="CASCADE"), nullable=False),
+            sa.Column("row_number", sa.Integer(), nullable=True),
+            sa.Column("field", sa.String(), nullable=True),
+            sa.Column("error_type", sa.String(), nullable=False),
+            sa.Column("message", sa.Text(), nullable=False),
+            sa.Column("created_at", sa.DateTime(), nullable=True),
+        )
+        op.create_index("ix_import_job_errors_job_id_id", "import_job_errors", ["job_id", "id"])
+    
+    if "export_jobs" not in existing:
+        op.create_table(
+            "export_jobs",
+            sa.Column("id", sa.String(), primary_key=True),
+            sa.Column("export_type", sa.String(), nullable=False),
+            sa.Column("format", sa.String(), nullable=False),
+            sa.Column("status", sa.String(), nullable=True),
+            sa.Column("filters", sa.JSON(), nullable=True),
+            sa.Column("date_range_start", sa.DateTime(), nullable=True),
+            sa.Column("date_range_end", sa.DateTime(), nullable=True),
+            sa.Column("filename", sa.String(), nullable=True),
+            sa.Column("file_size", sa.Integer(), nullable=True),
+            sa.Column("record_count", sa.Integer(), nullable=True),
+            sa.Column("error", sa.Text(), nullable=True),
+            sa.Column("created_at", sa.DateTime(), nullable=True),
+            sa.Column("completed_at", sa.DateTime(), nullable=True),
+            sa.Column("expires_at", sa.DateTime(), nullable=True),
+        )
+    
+    if "user_click_counters" not in existing:
+        op.create_table(
+            "user_click_counters",
+            sa.Column("user_id", sa.String(), sa.ForeignKey("users.id", ondelete="CASCADE"), primary_key=True),
+            sa.Column("month", sa.String(), primary_key=True),
+            sa.Column("clicks", sa.BigInteger(), nullable=False),
+            sa.Column("updated_at", sa.DateTime(), nullable=True),
+        )
+    
+    if "user_stats" not in existing:
+        op.create_table(
+            "user_stats",
+            sa.Column("user_id", sa.String(), sa.ForeignKey("users.id", ondelete="CASCADE"), primary_key=True),
+            sa.Column("total_links", sa.Integer(), nullable=False),
+            sa.Column("active_links", sa.Integer(), nullable=False),
+            sa.Column("total_clicks", sa.BigInteger(), nullable=False),
+            sa.Column("top_links", sa.JSON(), nullable=True),
+            sa.Column("updated_at", sa.DateTime(), nullable=True),
+        )
+    
+    if "daily_click_counts" not in existing:
+        op.create_table(
+            "daily_click_counts",
+            sa.Column("day", sa.Date(), primary_key=True),
+            sa.Column("clicks", sa.BigInteger(), nullable=False),
+        )
+    
+    if "platform_metrics" not in existing:
+        op.create_table(
+            "platform_metrics",
+            sa.Column("name", sa.String(), primary_key=True),
+            sa.Column("data", sa.JSON(), nullable=False),
+            sa.Column("refreshed_at", sa.DateTime(), nullable=False),
+            sa.Column("refresh_duration_ms", sa.Integer(), nullable=True),
+        )
+    
+    if "countries" not in existing:
+        op.create_table(
+            "countries",
+            sa.Column("id", sa.SmallInteger(), primary_key=True, autoincrement=True),
+            sa.Column("code", sa.String(), nullable=False, unique=True),
+        )
+    
+    if "referrer_domains" not in existing:
+        op.create_table(
+            "referrer_domains",
+            sa.Column("id", sa.Integer(), primary_key=True, autoincrement=True),
+            sa.Column("domain", sa.String(), nullable=False, unique=True),
+            sa.Column("created_at", sa.DateTime(), nullable=True),
+        )
+    
+    if "user_agents" not in existing:
+        op.create_table(
+            "user_agents",
+            sa.Column("id", sa.Integer(), primary_key=True, autoincrement=True),
+            sa.Column("user_agent_hash", sa.String(40), nullable=False, unique=True),
+            sa.Column("user_agent", sa.Text(), nullable=False),
+            sa.Column("created_at", sa.DateTime(), nullable=True),
+        )
+    
+    add_missing_columns("links", sa.Column("bot_clicks", sa.Integer(), nullable=True))
+    add_missing_columns(
+        "analytics",
+        sa.Column("country_id", sa.SmallInteger(), sa.ForeignKey("countries.id"), nullable=True),
+        sa.Column("referrer_domain_id", sa.Integer(), sa.ForeignKey("referrer_domains.id"), nullable=True),
+        sa.Column("user_agent_id", sa.Integer(), sa.ForeignKey("user_agents.id"), nullable=True),
+    )
+
+def downgrade():
+    for column in ("user_agent_id", "referrer_domain_id", "country_id"):
+        op.drop_column("analytics", column)
+    op.drop_column("links", "bot_clicks")
+    for table in (
+        "user_agents", "referrer_domains", "countries", "platform_metrics", "daily_click_counts",
+        "user_stats", "user_click_counters", "export_jobs", "import_job_errors",
+    ):
+        op.drop_table(table)
@@ -0,0 +1,123 @@
+"""Index pack: short_code lookups plus an index behind every foreign key and request-path filter
+
+Revision ID: 0003
+Revises: 0002
+Create Date: 2026-10-19
+"""
+from alembic import op
+import sqlalchemy as sa
+import logging
+import random
+import string
+
+revision = "0003"
+down_revision = "0002"
+branch_labels = None
+depends_on = None
+
+logger = logging.getLogger("alembic.runtime.migration")
+
+# Codes handed out to links whose code an older link kept, as generated by POST /api/links
+SHORT_CODE_ALPHABET = string.ascii_lowercase + string.digits
+SHORT_CODE_LENGTH = 6
+
+# (name, table, columns, unique, partial WHERE clause)
+INDEXES = [
+    ("ix_links_short_code", "links", ["short_code"], True, None),
+    ("ix_links_user_id_created_at", "links", ["user_id", "created_at"], False, None),
+    ("ix_links_user_id_clicks", "links", ["user_id", "clicks"], False, None),
+    ("ix_links_user_email", "links", ["user_email"], False, None),
+    ("ix_links_created_at", "links", ["created_at"], False, None),
+    ("ix_analytics_link_id_click_date", "analytics", ["link_id", "click_date"], False, None),
+    ("ix_analytics_click_date", "analytics", ["click_date"], False, None),
+    ("ix_subscriptions_user_id", "subscriptions", ["user_id"], False, None),
+    ("ix_subscriptions_active_user_id", "subscriptions", ["user_id"], False, "is_active"),
+    ("ix_import_jobs_created_at", "import_jobs", ["created_at"], False, None),
+    ("ix_import_jobs_created_by_created_at", "import_jobs", ["created_by", "created_at"], False, None),
+    ("ix_import_jobs_import_type_created_at", "import_jobs", ["import_type", "created_at"], False, None),
+    ("ix_export_jobs_expires_at", "export_jobs", ["expires_at"], False, "status = 'completed'"),
+    ("ix_user_click_counters_month", "user_click_counters", ["month"], False, None),
+    ("ix_users_created_at", "users", ["created_at"], False, None),
+    ("ix_domains_owner_user_id", "domains", ["owner_user_id"], False, None),
+    ("ix_contacts_email", "contacts", ["email"], False, None),
+    ("ix_contacts_created_at", "contacts", ["created_at"], False, None),
+]
+
+def upgrade():
+    columns = {column["name"] for column in sa.inspect(op.get_bind()).get_columns("links")}
+    if "short_code" not in columns:
+        op.add_column("links", sa.Column("short_code", sa.String(), nullable=True))
+    
+    # Backfill from the last path segment of short_url. Should two links share
+    # a code (different custom domains), the oldest keeps it and the rest get
+    # a fresh one below rather than failing the unique index.
+    op.execute("""
+        UPDATE links SET short_code = candidates.code
+        FROM (
+            SELECT id, code, row_number() OVER (PARTITION BY code ORDER BY created_at, id) AS rank
+            FROM (
+                SELECT id, created_at, regexp_replace(rtrim(short_url, '/'), '^.*/', '') AS code
+                FROM links
+                WHERE short_url IS NOT NULL AND short_code IS NULL
+            ) AS derived
+            WHERE code <> ''
+        ) AS candidates
+        WHERE links.id = candidates.id
+          AND candidates.rank = 1
+          AND NOT EXISTS (SELECT 1 FROM links AS taken WHERE taken.short_code = candidates.code)
+    """)
+    _reassign_duplicate_codes(op.get_bind())
+    
+    # Built concurrently so existing tables stay writable while the indexes are created
+    with op.get_context().autocommit_block():
+        for name, table, index_columns, unique, where in INDEXES:
+            op.create_index(
+                name, table, index_columns,
+                unique=unique,
+                postgresql_where=sa.text(where) if where else None,
+                postgresql_concurrently=True,
+                if_not_exists=True,
+            )
+
+def _reassign_duplicate_codes(bind):
+    """Give every link left without a code a new unique one, and a short_url to match
+    
+    Redirects look links up by short_code, so a link without one would be
+    unreachable. Candidates are checked against the table in one query per
+    round, since the unique index does not exist yet.
+    """
+    stranded = bind.execute(sa.text("""
+        SELECT id, short_url FROM links
+        WHERE short_code IS NULL
+          AND short_url IS NOT NULL
+          AND regexp_replace(rtrim(short_url, '/'), '^.*/', '') <> ''
+        ORDER BY created_at, id
+    """)).fetchall()
+    if not stranded:
+        return
+    
+    logger.info(f"Assigning new short codes to {len(stranded)} link(s) whose code an older link kept")
+    while stranded:
+        candidates = {
+            ''.join(random.choices(SHORT_CODE_ALPHABET, k=SHORT_CODE_LENGTH)) for _ in range(2 * len(stranded))
+        }
+        taken = bind.execute(
+            sa.text("SELECT short_code FROM links WHERE short_code = ANY(:codes)"), {"codes": sorted(candidates)}
+        ).scalars().all()
+        codes = list(candidates - set(taken))[:len(stranded)]
+        bind.execute(
+            sa.text("UPDATE links SET short_code = :code, short_url = :short_url WHERE id = :id"),
+            [{"id": link.id, "code": code, "short_url": _with_code(link.short_url, code)} for link, code in zip(stranded, codes)]
+        )
+        stranded = stranded[len(codes):]
+
+def _with_code(short_url: str, code: str) -> str:
+    """short_url with its last path segment replaced by `code`"""
+    prefix, slash, _ = short_url.rstrip('/').rpartition('/')
+    return f"{prefix}{slash}{code}"
+
+def downgrade():
+    with op.get_context().autocommit_block():
+        for name, table, _, _, _ in reversed(INDEXES):
+            op.drop_index(name, table_name=table, postgresql_concurrently=True, if_exists=True)
+    op.drop_column("links", "short_code")
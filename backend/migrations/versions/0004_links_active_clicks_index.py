@@ -0,0 +1,27 @@
+"""Index for the redirect cache warm-up: active links by clicks, most clicked first
+
+Revision ID: 0004
+Revises: 0003
+Create Date: 2026-10-19
+"""
+from alembic import op
+import sqlalchemy as sa
+
+revision = "0004"
+down_revision = "0003"
+branch_labels = None
+depends_on = None
+
+def upgrade():
+    # Built concurrently so links stay writable while the index is created
+    with op.get_context().autocommit_block():
+        op.create_index(
+            "ix_links_active_clicks", "links", [sa.text("clicks DESC")],
+            postgresql_where=sa.text("is_active"),
+            postgresql_concurrently=True,
+            if_not_exists=True,
+        )
+
+def downgrade():
+    with op.get_context().autocommit_block():
+        op.drop_index("ix_links_active_clicks", table_name="links", postgresql_concurrently=True, if_exists=True)
@@ -1,6 +1,6 @@
 from pydantic import BaseModel, Field, validator
 from typing import List, Optional, Dict, Any
-from datetime import datetime
+from datetime import datetime, date
 import uuid
 from enum import Enum
 
@@ -230,9 +230,25 @@ class ImportStatusResponse(BaseModel):
     created_at: datetime
     updated_at: datetime
     completed_at: Optional[datetime] = None
-    errors: List[Dict[str, Any]] = []
+    errors: List[Dict[str, Any]] = []  # Aggregated by error type; see /import/jobs/{job_id}/errors
     metadata: Dict[str, Any] = {}
 
+class ImportJobErrorDetail(BaseModel):
+    id: int
+    row_number: Optional[int] = None
+    field: Optional[str] = None
+    error_type: str
+    message: str
+    created_at: datetime
+
+class ImportJobErrorsResponse(BaseModel):
+    job_id: str
+    total_errors: int  # Every error seen by the job
+    stored_errors: int  # Errors kept in import_job_errors (capped per job)
+    offset: int
+    limit: int
+    errors: List[ImportJobErrorDetail]
+
 # Error Models
 class ImportError(BaseModel):
     row_number: int
@@ -258,6 +274,22 @@ class FileUploadResponse(BaseModel):
     preview_data: Optional[List[Dict[str, Any]]] = None
     validation_result: Optional[ImportValidationResult] = None
 
+class ChunkedUploadStatus(BaseModel):
+    upload_id: str
+    filename: str  # Name of the assembled file inside the upload directory
+    original_filename: str
+    content_type: Optional[str] = None
+    import_type: ImportType
+    created_by: str
+    total_size: int
+    chunk_size: int
+    total_chunks: int
+    received_chunks: List[int] = []
+    status: str = "uploading"  # uploading, completed
+    created_at: datetime = Field(default_factory=datetime.utcnow)
+    completed_at: Optional[datetime] = None
+    job_id: Optional[str] = None  # Import job started on completion, if requested
+
 # Batch Processing Models
 class BatchProcessingStatus(BaseModel):
     batch_id: str
@@ -270,9 +302,28 @@ class BatchProcessingStatus(BaseModel):
     estimated_remaining_time: Optional[int] = None
 
 # Export Models (for data export functionality)
+class ExportType(str, Enum):
+    LINKS = "links"
+    USERS = "users"
+    ANALYTICS = "analytics"
+    CONTACTS = "contacts"
+
+class ExportStatus(str, Enum):
+    PENDING = "pending"
+    PROCESSING = "processing"
+    COMPLETED = "completed"
+    FAILED = "failed"
+    EXPIRED = "expired"  # file removed after the retention period
+
+class ExportFormat(str, Enum):
+    CSV = "csv"
+    JSON = "json"
+    NDJSON = "ndjson"
+    EXCEL = "excel"
+
 class ExportRequest(BaseModel):
-    export_type: str  # links, users, analytics, etc.
-    format: str = "csv"  # csv, json, excel
+    export_type: ExportType
+    format: ExportFormat = ExportFormat.CSV
     filters: Dict[str, Any] = {}
     include_analytics: bool = False
     date_range_start: Optional[datetime] = None
@@ -283,4 +334,53 @@ class ExportResponse(BaseModel):
     download_url: str
     expires_at: datetime
     file_size: int
-    record_count: int
\ No newline at end of file
+    record_count: int
+
+class ExportJobStatus(BaseModel):
+    export_id: str
+    export_type: ExportType
+    format: ExportFormat
+    status: ExportStatus
+    record_count: int = 0
+    file_size: int = 0
+    error: Optional[str] = None
+    created_at: datetime
+    completed_at: Optional[datetime] = None
+    expires_at: Optional[datetime] = None  # When the exported file is removed
+
+class TopLink(BaseModel):
+    id: str
+    short_url: Optional[str] = None
+    title: Optional[str] = None
+    clicks: int = 0
+
+class UserSummary(BaseModel):
+    user_id: str
+    total_links: int = 0
+    active_links: int = 0
+    total_clicks: int = 0
+    top_links: List[TopLink] = []
+    updated_at: Optional[datetime] = None
+
+class DailyClicks(BaseModel):
+    day: date
+    clicks: int = 0
+
+class DailyImports(BaseModel):
+    day: date
+    jobs: int = 0
+    records: int = 0
+    successful: int = 0
+    failed: int = 0
+
+class PlatformMetrics(BaseModel):
+    users_total: int = 0
+    users_active: int = 0
+    users_by_plan: Dict[str, int] = {}
+    links_total: int = 0
+    links_active: int = 0
+    clicks_total: int = 0
+    clicks_per_day: List[DailyClicks] = []
+    imports_per_day: List[DailyImports] = []
+    refreshed_at: datetime
+    stale_seconds: float = 0  # Age of the snapshot when served
@@ -0,0 +1,203 @@
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy import select, func
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from database import AsyncSessionLocal, UserClickCounterTable, AnalyticsTable, LinkTable
+from sharding import link_shards
+from typing import Dict, Optional
+from datetime import datetime
+import asyncio
+import logging
+import os
+
+logger = logging.getLogger(__name__)
+
+# off: count only; soft: flag users over their limit but keep redirecting;
+# hard: stop redirecting once a user reaches limit * CLICK_QUOTA_HARD_RATIO
+CLICK_QUOTA_MODE = os.getenv("CLICK_QUOTA_MODE", "soft").lower()
+CLICK_QUOTA_HARD_RATIO = float(os.getenv("CLICK_QUOTA_HARD_RATIO", "1.0"))
+CLICK_QUOTA_FLUSH_SECONDS = float(os.getenv("CLICK_QUOTA_FLUSH_SECONDS", "10"))
+
+# Results of ClickQuotaTracker.record_click
+QUOTA_OK = "ok"
+QUOTA_OVER_SOFT_LIMIT = "over_soft_limit"
+QUOTA_BLOCKED = "blocked"
+
+def current_month() -> str:
+    """Quota period key for now (UTC calendar month)"""
+    return datetime.utcnow().strftime("%Y-%m")
+
+class ClickQuotaTracker:
+    """Per-user monthly click counters kept in memory
+    
+    A user's count is the total persisted in user_click_counters (across all
+    workers, as of our last flush) plus the clicks this process recorded
+    since. record_click is a couple of dict operations; the flusher adds
+    pending deltas to the table periodically and reads back the new totals.
+    """
+    
+    def __init__(self, mode: str = CLICK_QUOTA_MODE, hard_ratio: float = CLICK_QUOTA_HARD_RATIO):
+        self.mode = mode
+        self.hard_ratio = hard_ratio
+        self.month = current_month()
+        self._persisted: Dict[str, int] = {}
+        self._pending: Dict[str, int] = {}
+        # Unflushed clicks of past months: month -> user -> clicks
+        self._rollover: Dict[str, Dict[str, int]] = {}
+        self._warned: set = set()
+        self._flush_lock = asyncio.Lock()
+        self._task: Optional[asyncio.Task] = None
+    
+    def _roll_month(self):
+        month = current_month()
+        if month != self.month:
+            # Clicks still pending belong to the previous month and are flushed under it
+            self._keep_rollover(self.month, self._pending)
+            self.month = month
+            self._persisted = {}
+            self._pending = {}
+            self._warned = set()
+    
+    def _keep_rollover(self, month: str, pending: Dict[str, int]):
+        # Merged, so a month rolled over twice (or a failed flush) never replaces unflushed clicks
+        rollover = self._rollover.setdefault(month, {})
+        for user_id, clicks in pending.items():
+            rollover[user_id] = rollover.get(user_id, 0) + clicks
+    
+    def get_count(self, user_id: str) -> int:
+        return self._persisted.get(user_id, 0) + self._pending.get(user_id, 0)
+    
+    def record_click(self, user_id: str, monthly_limit: int) -> str:
+        """Count a click for a link owner and say whether the redirect may proceed"""
+        self._roll_month()
+        count = self.get_count(user_id)
+        
+        if self.mode == "hard" and count >= monthly_limit * self.hard_ratio:
+            return QUOTA_BLOCKED
+        
+        self._pending[user_id] = self._pending.get(user_id, 0) + 1
+        
+        if self.mode != "off" and count + 1 > monthly_limit:
+            if user_id not in self._warned:
+                self._warned.add(user_id)
+                logger.warning(f"User {user_id} exceeded their monthly click limit of {monthly_limit}")
+            return QUOTA_OVER_SOFT_LIMIT
+        return QUOTA_OK
+    
+    async def load(self, db: AsyncSession):
+        """Load this month's persisted totals, backfilling from analytics on first use"""
+        self._roll_month()
+        
+        stmt = select(UserClickCounterTable.user_id, UserClickCounterTable.clicks).where(
+            UserClickCounterTable.month == self.month
+        )
+        result = await db.execute(stmt)
+        rows = result.fetchall()
+        
+        if not rows:
+            await self.backfill(db, self.month)
+            result = await db.execute(stmt)
+            rows = result.fetchall()
+        
+        self._persisted = {row.user_id: row.clicks for row in rows}
+    
+    async def backfill(self, db: AsyncSession, month: str):
+        """Seed a month's counters from the analytics already recorded"""
+        month_start = datetime.strptime(month, "%Y-%m")
+        if month_start.month == 12:
+            month_end = month_start.replace(year=month_start.year + 1, month=1)
+        else:
+            month_end = month_start.replace(month=month_start.month + 1)
+        
+        clicks_by_user = select(
+            LinkTable.user_id,
+            func.coalesce(func.sum(AnalyticsTable.clicks), 0)
+        ).join(
+            LinkTable, LinkTable.id == AnalyticsTable.link_id
+        ).where(
+            LinkTable.user_id.isnot(None),
+            AnalyticsTable.click_date >= month_start,
+            AnalyticsTable.click_date < month_end
+        ).group_by(LinkTable.user_id)
+        
+        async def on_shard(shard_db: AsyncSession):
+            return (await shard_db.execute(clicks_by_user)).fetchall()
+        
+        # A link and its analytics live on the same shard, so the join stays local
+        totals: Dict[str, int] = {}
+        for rows in await link_shards.fan_out(on_shard, db):
+            for user_id, clicks in rows:
+                totals[user_id] = totals.get(user_id, 0) + int(clicks)
+        
+        if totals:
+            now = datetime.utcnow()
+            await db.execute(
+                pg_insert(UserClickCounterTable).on_conflict_do_nothing(),
+                [{"user_id": user_id, "month": month, "clicks": clicks, "updated_at": now} for user_id, clicks in totals.items()]
+            )
+        await db.commit()
+        logger.info(f"Backfilled monthly click counters for {month}")
+    
+    async def flush(self):
+        """Add pending clicks to user_click_counters and refresh totals"""
+        async with self._flush_lock:
+            self._roll_month()
+            batches = [(month, pending) for month, pending in self._rollover.items() if pending]
+            self._rollover = {}
+            if self._pending:
+                batches.append((self.month, self._pending))
+                self._pending = {}
+            
+            if not batches:
+                return
+            
+            try:
+                async with AsyncSessionLocal() as db:
+                    for month, pending in batches:
+                        stmt = pg_insert(UserClickCounterTable).values([
+                            {"user_id": user_id, "month": month, "clicks": clicks, "updated_at": datetime.utcnow()}
+                            for user_id, clicks in pending.items()
+                        ])
+                        stmt = stmt.on_conflict_do_update(
+                            index_elements=[UserClickCounterTable.user_id, UserClickCounterTable.month],
+                            set_={
+                                "clicks": UserClickCounterTable.clicks + stmt.excluded.clicks,
+                                "updated_at": stmt.excluded.updated_at
+                            }
+                        ).returning(UserClickCounterTable.user_id, UserClickCounterTable.clicks)
+                        result = await db.execute(stmt)
+                        
+                        if month == self.month:
+                            # Totals now include every worker's flushed clicks
+                            for row in result.fetchall():
+                                self._persisted[row.user_id] = row.clicks
+                    await db.commit()
+            
+            except Exception as e:
+                logger.error(f"Error flushing click counters: {e}")
+                # Keep the clicks for the next attempt
+                for month, pending in batches:
+                    if month != self.month:
+                        self._keep_rollover(month, pending)
+                        continue
+                    for user_id, clicks in pending.items():
+                        self._pending[user_id] = self._pending.get(user_id, 0) + clicks
+    
+    async def _run(self, interval: float):
+        while True:
+            await asyncio.sleep(interval)
+            await self.flush()
+    
+    async def start(self, interval: float = CLICK_QUOTA_FLUSH_SECONDS):
+        """Load counters and start the periodic flusher"""
+        async with AsyncSessionLocal() as db:
+            await self.load(db)
+        self._task = asyncio.create_task(self._run(interval))
+    
+    async def stop(self):
+        """Stop the flusher and persist what is pending"""
+        if self._task:
+            self._task.cancel()
+            self._task = None
+        await self.flush()
+
+click_quota_tracker = ClickQuotaTracker()
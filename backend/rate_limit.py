@@ -0,0 +1,238 @@
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from typing import Dict, List, Optional
+import json
+import logging
+import math
+import os
+import time
+
+logger = logging.getLogger(__name__)
+
+# =====================================================
+# RATE LIMIT CONFIGURATION
+# =====================================================
+
+class RateLimit:
+    """Token bucket parameters: refill `rate` tokens per second up to `burst`"""
+    
+    __slots__ = ("rate", "burst")
+    
+    def __init__(self, requests: int, period_seconds: float, burst: Optional[int] = None):
+        self.rate = requests / period_seconds
+        self.burst = burst if burst is not None else requests
+    
+    @classmethod
+    def parse(cls, value: str) -> "RateLimit":
+        """Parse "<requests>/<seconds>" or "<requests>/<seconds>:<burst>", e.g. "600/60:100" """
+        spec, _, burst = value.partition(":")
+        requests, _, period = spec.partition("/")
+        return cls(int(requests), float(period or 1), int(burst) if burst else None)
+
+def _limit_from_env(group: str, default: str) -> RateLimit:
+    return RateLimit.parse(os.getenv(f"RATE_LIMIT_{group.upper()}", default))
+
+# Per route group limits, overridable with RATE_LIMIT_<GROUP>
+RATE_LIMITS: Dict[str, RateLimit] = {
+    "redirect": _limit_from_env("redirect", "600/60:100"),
+    "create": _limit_from_env("create", "30/60:10"),
+    "import": _limit_from_env("import", "120/60:30"),
+    "admin": _limit_from_env("admin", "300/60:60"),
+}
+
+# Off by default: behind a proxy every client shares the proxy's address until
+# RATE_LIMIT_TRUSTED_HOPS is set, and one bucket would throttle the whole site
+RATE_LIMIT_ENABLED = os.getenv("RATE_LIMIT_ENABLED", "false").lower() == "true"
+# Proxies in front of the app that append to X-Forwarded-For; 0 keys on the socket peer.
+# RATE_LIMIT_TRUST_PROXY=true is the older spelling of one proxy.
+RATE_LIMIT_TRUSTED_HOPS = int(os.getenv(
+    "RATE_LIMIT_TRUSTED_HOPS", "1" if os.getenv("RATE_LIMIT_TRUST_PROXY", "false").lower() == "true" else "0"
+))
+RATE_LIMIT_REDIS_URL = os.getenv("RATE_LIMIT_REDIS_URL")
+
+def classify_route(method: str, path: str) -> Optional[str]:
+    """Map a request to its rate limit group, or None when it is not limited"""
+    if path.startswith("/go/") or path.startswith("/api/redirect/"):
+        return "redirect"
+    if method == "POST" and path == "/api/links":
+        return "create"
+    if path.startswith("/api/import") or path.startswith("/api/export"):
+        return "import"
+    if path.startswith("/api/users") or path.startswith("/api/admin"):
+        return "admin"
+    return None
+
+def forwarded_client_ip(forwarded_for: Optional[str], peer: Optional[str], trusted_hops: int) -> Optional[str]:
+    """The client address as seen by the outermost of `trusted_hops` proxies
+    
+    Each proxy appends the address it received the request from, so only the
+    last `trusted_hops` entries of X-Forwarded-For are trustworthy; anything
+    before them was sent by the client.
+    """
+    if trusted_hops > 0 and forwarded_for:
+        hops = [hop.strip() for hop in forwarded_for.split(",") if hop.strip()]
+        if hops:
+            return hops[-min(trusted_hops, len(hops))]
+    return peer
+
+# =====================================================
+# BACKENDS
+# =====================================================
+
+class RateLimitBackend(ABC):
+    """Interface of token bucket stores"""
+    
+    @abstractmethod
+    async def take(self, key: str, rate: float, burst: float) -> float:
+        """Remove one token from the bucket at `key`; 0 lets the request through,
+        otherwise the seconds until a token is available"""
+
+class InMemoryRateLimitBackend(RateLimitBackend):
+    """Token buckets in a per-process LRU; limits apply per worker
+    
+    When full, the least recently used bucket is dropped, so a flood of new
+    clients only costs the quietest ones their state.
+    """
+    
+    def __init__(self, max_keys: int = 100000):
+        self.max_keys = max_keys
+        # key -> [tokens, last refill time], least recently used first
+        self._buckets: "OrderedDict[str, List[float]]" = OrderedDict()
+    
+    async def take(self, key: str, rate: float, burst: float) -> float:
+        return self.take_now(key, rate, burst, time.monotonic())
+    
+    def take_now(self, key: str, rate: float, burst: float, now: float) -> float:
+        bucket = self._buckets.get(key)
+        if bucket is None:
+            while len(self._buckets) >= self.max_keys:
+                self._buckets.popitem(last=False)
+            self._buckets[key] = [burst - 1, now]
+            return 0.0
+        
+        self._buckets.move_to_end(key)
+        tokens = bucket[0] + (now - bucket[1]) * rate
+        if tokens > burst:
+            tokens = burst
+        bucket[1] = now
+        if tokens >= 1:
+            bucket[0] = tokens - 1
+            return 0.0
+        bucket[0] = tokens
+        return (1 - tokens) / rate
+
+# Token bucket as a single atomic script, timed by the Redis server clock
+REDIS_TOKEN_BUCKET_SCRIPT = """
+local rate = tonumber(ARGV[1])
+local burst = tonumber(ARGV[2])
+local clock = redis.call('TIME')
+local now = tonumber(clock[1]) + tonumber(clock[2]) / 1000000
+local bucket = redis.call('HMGET', KEYS[1], 'tokens', 'ts')
+local tokens = tonumber(bucket[1])
+local ts = tonumber(bucket[2])
+if tokens == nil then
+    tokens = burst
+    ts = now
+end
+tokens = math.min(burst, tokens + (now - ts) * rate)
+local retry_after = 0
+if tokens >= 1 then
+    tokens = tokens - 1
+else
+    retry_after = (1 - tokens) / rate
+end
+redis.call('HSET', KEYS[1], 'tokens', tokens, 'ts', now)
+redis.call('EXPIRE', KEYS[1], math.ceil(burst / rate) + 1)
+return tostring(retry_after)
+"""
+
+class RedisRateLimitBackend(RateLimitBackend):
+    """Token buckets shared by all workers through a Redis-protocol store
+    
+    Takes any redis.asyncio-compatible client. If the store is unreachable
+    requests are let through rather than failing the site.
+    """
+    
+    def __init__(self, client, prefix: str = "ratelimit:"):
+        self.client = client
+        self.prefix = prefix
+        self._script = client.register_script(REDIS_TOKEN_BUCKET_SCRIPT)
+    
+    async def take(self, key: str, rate: float, burst: float) -> float:
+        try:
+            retry_after = await self._script(keys=[self.prefix + key], args=[rate, burst])
+            return float(retry_after)
+        except Exception as e:
+            logger.error(f"Rate limit store unavailable, allowing request: {e}")
+            return 0.0
+
+def create_rate_limit_backend() -> RateLimitBackend:
+    """Backend from configuration: shared when RATE_LIMIT_REDIS_URL is set"""
+    if RATE_LIMIT_REDIS_URL:
+        import redis.asyncio as redis
+        return RedisRateLimitBackend(redis.from_url(RATE_LIMIT_REDIS_URL))
+    return InMemoryRateLimitBackend()
+
+# =====================================================
+# MIDDLEWARE
+# =====================================================
+
+class RateLimitMiddleware:
+    """ASGI middleware applying token buckets per route group
+    
+    Buckets are keyed on the client IP (taken from X-Forwarded-For behind
+    RATE_LIMIT_TRUSTED_HOPS proxies, see forwarded_client_ip). Identity headers such as X-API-Key or
+    X-User-Id are not verified here, so they are never used as keys: a
+    client could rotate them to get fresh buckets. Denied requests get a
+    429 with Retry-After. Unlimited routes pass straight through.
+    """
+    
+    def __init__(
+        self,
+        app,
+        backend: Optional[RateLimitBackend] = None,
+        limits: Optional[Dict[str, RateLimit]] = None,
+        trusted_hops: int = RATE_LIMIT_TRUSTED_HOPS
+    ):
+        self.app = app
+        self.backend = backend or create_rate_limit_backend()
+        self.limits = limits or RATE_LIMITS
+        self.trusted_hops = trusted_hops
+    
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+        
+        group = classify_route(scope["method"], scope["path"])
+        if group is None:
+            return await self.app(scope, receive, send)
+        
+        limit = self.limits[group]
+        retry_after = await self.backend.take(f"{group}:{self._identify(scope)}", limit.rate, limit.burst)
+        
+        if retry_after > 0:
+            return await self._reject(send, retry_after)
+        return await self.app(scope, receive, send)
+    
+    def _identify(self, scope) -> str:
+        client = scope.get("client")
+        peer = client[0] if client else None
+        forwarded_for = None
+        if self.trusted_hops:
+            # Proxies may append a header of their own instead of extending the first one
+            values = [value.decode("latin-1") for name, value in scope["headers"] if name == b"x-forwarded-for"]
+            forwarded_for = ",".join(values) or None
+        return f"ip:{forwarded_client_ip(forwarded_for, peer, self.trusted_hops) or 'unknown'}"
+    
+    async def _reject(self, send, retry_after: float):
+        body = json.dumps({"detail": "Rate limit exceeded"}).encode()
+        await send({
+            "type": "http.response.start",
+            "status": 429,
+            "headers": [
+                (b"content-type", b"application/json"),
+                (b"content-length", str(len(body)).encode()),
+                (b"retry-after", str(math.ceil(retry_after)).encode()),
+            ],
+        })
+        await send({"type": "http.response.body", "body": body})
@@ -0,0 +1,215 @@
+from shared_cache import SharedCache, shared_cache
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+from collections import OrderedDict
+from urllib.parse import quote
+import asyncio
+import logging
+import os
+import time
+import zlib
+
+logger = logging.getLogger(__name__)
+
+REDIRECT_CACHE_TTL_SECONDS = float(os.getenv("REDIRECT_CACHE_TTL_SECONDS", "300"))
+# Without a shared cache an invalidation only reaches the worker that made the change, so the
+# other workers' copies of a deactivated or deleted link must expire quickly instead
+REDIRECT_CACHE_LOCAL_TTL_SECONDS = float(os.getenv("REDIRECT_CACHE_LOCAL_TTL_SECONDS", "5"))
+REDIRECT_CACHE_MAX_ENTRIES = int(os.getenv("REDIRECT_CACHE_MAX_ENTRIES", "100000"))
+
+# 301 lets browsers and CDNs keep the redirect, so repeat clicks never reach us: they are
+# not counted, and toggling or deleting a link only takes effect for them after max-age
+REDIRECT_PERMANENT = os.getenv("REDIRECT_PERMANENT", "false").lower() == "true"
+REDIRECT_STATUS = 301 if REDIRECT_PERMANENT else 302
+# The 302 default lets clients keep the redirect but revalidate it (ETag -> 304) on every click
+REDIRECT_CACHE_CONTROL = os.getenv(
+    "REDIRECT_CACHE_CONTROL", "public, max-age=86400" if REDIRECT_PERMANENT else "private, no-cache"
+)
+
+def redirect_headers(original_url: str, etag: str) -> list:
+    """Raw ASGI headers of the redirect to `original_url`, encoded once per cached link"""
+    # Same quoting as Starlette's RedirectResponse
+    location = quote(original_url, safe=":/%#?=@[]!$&'()*+,;")
+    return [
+        (b"location", location.encode("latin-1")),
+        (b"cache-control", REDIRECT_CACHE_CONTROL.encode("latin-1")),
+        (b"etag", etag.encode("latin-1")),
+        (b"content-length", b"0"),
+    ]
+
+def redirect_etag(original_url: str) -> str:
+    return f'"{REDIRECT_STATUS}-{zlib.crc32(original_url.encode("utf-8")):08x}"'
+
+class CachedLink:
+    """What a redirect needs from a link row"""
+    
+    __slots__ = ("id", "short_url", "original_url", "user_id", "is_active", "expires_at", "headers", "etag")
+    
+    def __init__(self, id: str, short_url: str, original_url: str, user_id: Optional[str], is_active: bool, expires_at: float):
+        self.id = id
+        self.short_url = short_url
+        self.original_url = original_url
+        self.user_id = user_id
+        self.is_active = is_active
+        self.expires_at = expires_at
+        self.etag = redirect_etag(original_url)
+        self.headers = redirect_headers(original_url, self.etag)
+    
+    def to_dict(self) -> dict:
+        return {
+            "id": self.id,
+            "short_url": self.short_url,
+            "original_url": self.original_url,
+            "user_id": self.user_id,
+            "is_active": self.is_active,
+        }
+
+def _link_values(link) -> dict:
+    return {
+        "id": link.id,
+        "short_url": link.short_url,
+        "original_url": link.original_url,
+        "user_id": link.user_id,
+        "is_active": link.is_active,
+    }
+
+class RedirectCache:
+    """Two-tier cache of short code -> link for the redirect path
+    
+    The first tier is a per-process LRU with a TTL; the second is the shared
+    cache, so a link loaded by one worker is a hit for the others. Changes
+    to a link (toggle, delete) must call invalidate(), which clears both
+    tiers and every other worker's local copy. With no shared cache
+    configured, entries live for REDIRECT_CACHE_LOCAL_TTL_SECONDS only.
+    
+    Misses go through get_or_load(), which lets all concurrent misses for one
+    code wait on a single database query instead of each running their own.
+    A load overtaken by an invalidation is neither cached nor joined by
+    later misses, since its row may predate the change.
+    """
+    
+    namespace = "redirect"
+    
+    def __init__(
+        self,
+        shared: SharedCache = shared_cache,
+        ttl_seconds: Optional[float] = None,
+        max_entries: int = REDIRECT_CACHE_MAX_ENTRIES
+    ):
+        self.shared = shared
+        if ttl_seconds is None:
+            ttl_seconds = REDIRECT_CACHE_TTL_SECONDS if shared.enabled else REDIRECT_CACHE_LOCAL_TTL_SECONDS
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[str, CachedLink]" = OrderedDict()
+        # short code -> the one load running for it
+        self._loading: Dict[str, asyncio.Future] = {}
+        # short code -> [generation, loads running]; invalidations bump the generation,
+        # and the entry lives until the last load for the code (including overtaken ones) ends
+        self._generations: Dict[str, List[int]] = {}
+        shared.register(self.namespace, self.drop_local)
+    
+    def get_cached(self, short_code: str) -> Optional[CachedLink]:
+        """Get a link from this process's tier only"""
+        link = self._entries.get(short_code)
+        if link is None:
+            return None
+        if link.expires_at < time.monotonic():
+            del self._entries[short_code]
+            return None
+        self._entries.move_to_end(short_code)
+        return link
+    
+    async def get(self, short_code: str) -> Optional[CachedLink]:
+        """Get a link from the local tier, then the shared tier; None means load it from the database"""
+        link = self.get_cached(short_code)
+        if link is not None:
+            return link
+        
+        value = await self.shared.get(self.namespace, short_code)
+        if value is None:
+            return None
+        return self._store(short_code, value)
+    
+    async def get_or_load(self, short_code: str, load: Callable[[], Awaitable[Optional[Any]]]) -> Optional[CachedLink]:
+        """Get a link from the cache, or from `load()` (a link row or None) on a miss
+        
+        The first miss starts the load as its own task; misses arriving while
+        it runs await the same task. Shielding it means a caller that gives
+        up (client disconnect) does not cancel the load for the others, so
+        `load` must open its own session rather than borrow the caller's.
+        """
+        link = await self.get(short_code)
+        if link is not None:
+            return link
+        
+        loading = self._loading.get(short_code)
+        if loading is None:
+            state = self._generations.setdefault(short_code, [0, 0])
+            state[1] += 1
+            loading = asyncio.ensure_future(self._load(short_code, load, state[0]))
+            self._loading[short_code] = loading
+            loading.add_done_callback(lambda done: self._load_finished(short_code, done))
+        return await asyncio.shield(loading)
+    
+    async def _load(self, short_code: str, load: Callable[[], Awaitable[Optional[Any]]], generation: int) -> Optional[CachedLink]:
+        row = await load()
+        if row is None:
+            return None
+        if self._generations[short_code][0] != generation:
+            # Invalidated while loading: answer the callers already waiting, cache nothing
+            return CachedLink(expires_at=0, **_link_values(row))
+        
+        cached = await self.set(short_code, row)
+        if self._generations[short_code][0] != generation:
+            # Invalidated while the shared write was in flight, which may have landed after the delete
+            self._entries.pop(short_code, None)
+            await self.shared.invalidate(self.namespace, short_code)
+        return cached
+    
+    def _load_finished(self, short_code: str, done: asyncio.Future):
+        if self._loading.get(short_code) is done:
+            del self._loading[short_code]
+        state = self._generations[short_code]
+        state[1] -= 1
+        if not state[1]:
+            del self._generations[short_code]
+        if not done.cancelled() and done.exception() is not None:
+            logger.debug(f"Loading link {short_code} failed: {done.exception()}")
+    
+    async def set(self, short_code: str, link) -> CachedLink:
+        """Cache a link as read from the database, in both tiers"""
+        cached = self.prime(short_code, link)
+        await self.shared.set(self.namespace, short_code, cached.to_dict(), self.ttl_seconds)
+        return cached
+    
+    def prime(self, short_code: str, link) -> CachedLink:
+        """Cache a link in this process only (warm-up; every worker loads its own)"""
+        return self._store(short_code, _link_values(link))
+    
+    async def invalidate(self, short_code: str):
+        """Forget a link everywhere after it was changed or deleted"""
+        self.drop_local(short_code)
+        await self.shared.invalidate(self.namespace, short_code)
+    
+    def drop_local(self, short_code: str):
+        self._entries.pop(short_code, None)
+        state = self._generations.get(short_code)
+        if state is not None:
+            # Running loads may have read the row before the change; later misses start a new one
+            state[0] += 1
+            self._loading.pop(short_code, None)
+    
+    def clear(self):
+        self._entries.clear()
+    
+    def _store(self, short_code: str, value: dict) -> CachedLink:
+        link = CachedLink(expires_at=time.monotonic() + self.ttl_seconds, **value)
+        self._entries[short_code] = link
+        self._entries.move_to_end(short_code)
+        
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+        
+        return link
+
+redirect_cache = RedirectCache()
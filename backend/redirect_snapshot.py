@@ -0,0 +1,547 @@
+"""Edge redirect snapshots: short code -> URL maps served without a database
+
+    python manage.py export-redirects /srv/redirects      # on a host with database access
+    REDIRECT_SNAPSHOT_DIR=/srv/redirects uvicorn redirect_snapshot:app --workers 4
+    python redirect_snapshot.py info /srv/redirects/redirects-<version>.snap
+
+A full snapshot holds every active link; a delta holds the changes between
+two snapshot versions (a deleted or deactivated code has an empty URL).
+Next to each full snapshot, a minimal perfect hash index maps a code to
+its entry in one hash and one probe. The redirect server memory-maps the
+newest snapshot it can reach (with its index) and applies deltas on top,
+checking the directory periodically.
+"""
+from redirect_cache import redirect_headers, redirect_etag, REDIRECT_STATUS
+from typing import Dict, Iterable, Iterator, List, Optional, Sequence, Tuple
+from array import array
+from functools import lru_cache
+import argparse
+import asyncio
+import hashlib
+import json
+import logging
+import mmap
+import os
+import re
+import random
+import struct
+import sys
+import time
+
+logger = logging.getLogger(__name__)
+
+REDIRECT_SNAPSHOT_DIR = os.getenv("REDIRECT_SNAPSHOT_DIR")
+REDIRECT_SNAPSHOT_REFRESH_SECONDS = float(os.getenv("REDIRECT_SNAPSHOT_REFRESH_SECONDS", "30"))
+
+SNAPSHOT_MAGIC = b"LKREDIR1"
+# magic, kind, version, base version, entry count, codes length, urls length
+SNAPSHOT_HEADER = struct.Struct("<8sQQQQQQ")
+KIND_FULL = 0
+KIND_DELTA = 1
+
+INDEX_MAGIC = b"LKREDMPH"
+# magic, snapshot version, key count, bucket count
+INDEX_HEADER = struct.Struct("<8sQQQ")
+
+SNAPSHOT_NAME = re.compile(r"^redirects-(\d+)\.snap$")
+DELTA_NAME = re.compile(r"^redirects-(\d+)-(\d+)\.delta$")
+INDEX_NAME = re.compile(r"^redirects-(\d+)\.mph$")
+
+def snapshot_name(version: int) -> str:
+    return f"redirects-{version}.snap"
+
+def delta_name(base_version: int, version: int) -> str:
+    return f"redirects-{base_version}-{version}.delta"
+
+def index_name(version: int) -> str:
+    return f"redirects-{version}.mph"
+
+# =====================================================
+# SNAPSHOT FILE
+# =====================================================
+
+class RedirectSnapshot:
+    """Sorted short code -> URL entries with an offset index
+    
+    Codes and URLs are two UTF-8 blobs; two uint64 offset arrays (count + 1
+    entries each) mark where entry i starts and ends in each blob. Codes are
+    sorted bytewise, so a lookup is a binary search that slices only the
+    codes it compares. Opened from a file, everything is a view over one
+    read-only mmap, shared between processes through the page cache.
+    """
+    
+    def __init__(
+        self,
+        version: int,
+        code_offsets: Sequence[int],
+        codes,
+        url_offsets: Sequence[int],
+        urls,
+        kind: int = KIND_FULL,
+        base_version: int = 0,
+        mapped: Optional[mmap.mmap] = None
+    ):
+        self.version = version
+        self.kind = kind
+        self.base_version = base_version
+        self.code_offsets = code_offsets
+        self.codes = codes
+        self.url_offsets = url_offsets
+        self.urls = urls
+        self._mapped = mapped
+        # Optional PerfectHashIndex over the codes; find() binary searches without one
+        self.index: Optional["PerfectHashIndex"] = None
+    
+    def __len__(self) -> int:
+        return len(self.code_offsets) - 1
+    
+    def code_at(self, index: int) -> bytes:
+        return bytes(self.codes[self.code_offsets[index]:self.code_offsets[index + 1]])
+    
+    def url_at(self, index: int) -> str:
+        return bytes(self.urls[self.url_offsets[index]:self.url_offsets[index + 1]]).decode("utf-8")
+    
+    def find(self, code: bytes) -> int:
+        """Index of `code`, or -1"""
+        if self.index is not None:
+            entry = self.index.lookup(code)
+            return entry if entry < len(self) and self.code_at(entry) == code else -1
+        
+        low, high = 0, len(self)
+        while low < high:
+            middle = (low + high) // 2
+            candidate = self.code_at(middle)
+            if candidate < code:
+                low = middle + 1
+            elif candidate > code:
+                high = middle
+            else:
+                return middle
+        return -1
+    
+    def get(self, short_code: str) -> Optional[str]:
+        """URL for a code; '' marks a removal in a delta, None means absent"""
+        index = self.find(short_code.encode("utf-8"))
+        return self.url_at(index) if index >= 0 else None
+    
+    def items(self) -> Iterator[Tuple[str, str]]:
+        for index in range(len(self)):
+            yield self.code_at(index).decode("utf-8"), self.url_at(index)
+    
+    @classmethod
+    def build(cls, entries: Iterable[Tuple[str, str]], version: int, kind: int = KIND_FULL, base_version: int = 0) -> "RedirectSnapshot":
+        """Build from (short_code, url) pairs; a later pair for the same code wins"""
+        by_code = {code.encode("utf-8"): url.encode("utf-8") for code, url in entries}
+        code_offsets, url_offsets = array("Q", [0]), array("Q", [0])
+        codes, urls = bytearray(), bytearray()
+        for code in sorted(by_code):
+            codes += code
+            urls += by_code[code]
+            code_offsets.append(len(codes))
+            url_offsets.append(len(urls))
+        return cls(version, code_offsets, bytes(codes), url_offsets, bytes(urls), kind, base_version)
+    
+    @classmethod
+    def diff(cls, base: "RedirectSnapshot", current: "RedirectSnapshot") -> "RedirectSnapshot":
+        """Delta turning `base` into `current`: changed or new entries, and '' for removed codes"""
+        changes: List[Tuple[str, str]] = []
+        base_items, current_items = base.items(), current.items()
+        old, new = next(base_items, None), next(current_items, None)
+        while old is not None or new is not None:
+            if new is None or (old is not None and old[0].encode("utf-8") < new[0].encode("utf-8")):
+                changes.append((old[0], ""))
+                old = next(base_items, None)
+            elif old is None or new[0].encode("utf-8") < old[0].encode("utf-8"):
+                changes.append(new)
+                new = next(current_items, None)
+            else:
+                if old[1] != new[1]:
+                    changes.append(new)
+                old, new = next(base_items, None), next(current_items, None)
+        return cls.build(changes, current.version, KIND_DELTA, base.version)
+    
+    def save(self, path: str):
+        """Write the snapshot atomically (temporary file, then rename) so readers never see a partial file"""
+        temporary = os.path.join(os.path.dirname(path) or ".", f".{os.path.basename(path)}.tmp")
+        with open(temporary, "wb") as f:
+            f.write(SNAPSHOT_HEADER.pack(
+                SNAPSHOT_MAGIC, self.kind, self.version, self.base_version, len(self), len(self.codes), len(self.urls)
+            ))
+            for data in (
+                array("Q", self.code_offsets).tobytes(), array("Q", self.url_offsets).tobytes(),
+                bytes(self.codes), bytes(self.urls)
+            ):
+                f.write(data)
+                # Keep every section 8-byte aligned
+                f.write(b"\0" * (-len(data) % 8))
+        os.replace(temporary, path)
+    
+    @classmethod
+    def open(cls, path: str) -> "RedirectSnapshot":
+        """Memory-map a snapshot or delta file; nothing is copied"""
+        with open(path, "rb") as f:
+            mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        
+        magic, kind, version, base_version, count, codes_length, urls_length = SNAPSHOT_HEADER.unpack_from(mapped, 0)
+        if magic != SNAPSHOT_MAGIC:
+            mapped.close()
+            raise ValueError(f"{path} is not a redirect snapshot")
+        
+        view = memoryview(mapped)
+        offset = SNAPSHOT_HEADER.size
+        sections = []
+        for size, typecode in (((count + 1) * 8, "Q"), ((count + 1) * 8, "Q"), (codes_length, None), (urls_length, None)):
+            section = view[offset:offset + size]
+            sections.append(section.cast(typecode) if typecode else section)
+            offset += size + (-size % 8)
+        
+        code_offsets, url_offsets, codes, urls = sections
+        return cls(version, code_offsets, codes, url_offsets, urls, kind, base_version, mapped=mapped)
+
+# =====================================================
+# MINIMAL PERFECT HASH INDEX
+# =====================================================
+
+MASK64 = (1 << 64) - 1
+
+def _code_hash(code: bytes) -> int:
+    return int.from_bytes(hashlib.blake2b(code, digest_size=8).digest(), "little")
+
+def _displace(code_hash: int, seed: int) -> int:
+    # murmur3 finalizer over the code hash mixed with the seed
+    value = (code_hash ^ (seed * 0x9E3779B97F4A7C15)) & MASK64
+    value ^= value >> 33
+    value = (value * 0xFF51AFD7ED558CCD) & MASK64
+    value ^= value >> 33
+    value = (value * 0xC4CEB9FE1A85EC53) & MASK64
+    return value ^ (value >> 33)
+
+class PerfectHashIndex:
+    """Minimal perfect hash from the codes of a snapshot to their entry numbers
+    
+    Hash-and-displace: each code falls into a bucket by its hash; a bucket
+    stores either the seed that moves all its codes to free slots, or
+    (negated) the slot of its single code. A lookup is one hash, one or two
+    array reads and, in the snapshot, one code comparison to reject codes
+    that are not in the set. The arrays are int32/uint32 views over an mmap,
+    so any number of workers share one copy through the page cache.
+    """
+    
+    def __init__(self, version: int, seeds: Sequence[int], entries: Sequence[int], mapped: Optional[mmap.mmap] = None):
+        self.version = version
+        self.seeds = seeds
+        self.entries = entries
+        self._mapped = mapped
+    
+    def __len__(self) -> int:
+        return len(self.entries)
+    
+    def lookup(self, code: bytes) -> int:
+        """Entry number the code would have; the caller checks it really is that entry"""
+        if not self.entries:
+            return len(self.entries)
+        code_hash = _code_hash(code)
+        seed = self.seeds[code_hash % len(self.seeds)]
+        slot = -seed - 1 if seed < 0 else _displace(code_hash, seed) % len(self.entries)
+        return self.entries[slot]
+    
+    @classmethod
+    def build(cls, snapshot: RedirectSnapshot, max_seed: int = 1 << 24) -> "PerfectHashIndex":
+        count = len(snapshot)
+        seeds = array("i", [0]) * max(count, 1)
+        entries = array("I", [0]) * count
+        buckets: List[List[Tuple[int, int]]] = [[] for _ in range(len(seeds))]
+        for entry in range(count):
+            code_hash = _code_hash(snapshot.code_at(entry))
+            buckets[code_hash % len(seeds)].append((code_hash, entry))
+        
+        taken = bytearray(count)
+        order = sorted(range(len(buckets)), key=lambda bucket: len(buckets[bucket]), reverse=True)
+        position = 0
+        # Fullest buckets first, while most slots are free; each gets the first seed placing all its codes
+        for position, bucket in enumerate(order):
+            members = buckets[bucket]
+            if len(members) <= 1:
+                break
+            for seed in range(1, max_seed):
+                slots = [_displace(code_hash, seed) % count for code_hash, _ in members]
+                if len(set(slots)) == len(slots) and not any(taken[slot] for slot in slots):
+                    break
+            else:
+                raise ValueError(f"No seed places bucket {bucket} ({len(members)} codes)")
+            seeds[bucket] = seed
+            for slot, (_, entry) in zip(slots, members):
+                taken[slot] = 1
+                entries[slot] = entry
+        else:
+            position = len(order)
+        
+        # Single-code buckets go straight into the remaining free slots
+        free = (slot for slot in range(count) if not taken[slot])
+        for bucket in order[position:]:
+            if not buckets[bucket]:
+                break
+            slot = next(free)
+            seeds[bucket] = -slot - 1
+            entries[slot] = buckets[bucket][0][1]
+        
+        return cls(snapshot.version, seeds, entries)
+    
+    def save(self, path: str):
+        temporary = os.path.join(os.path.dirname(path) or ".", f".{os.path.basename(path)}.tmp")
+        with open(temporary, "wb") as f:
+            f.write(INDEX_HEADER.pack(INDEX_MAGIC, self.version, len(self.entries), len(self.seeds)))
+            for data in (array("i", self.seeds).tobytes(), array("I", self.entries).tobytes()):
+                f.write(data)
+                f.write(b"\0" * (-len(data) % 8))
+        os.replace(temporary, path)
+    
+    @classmethod
+    def open(cls, path: str) -> "PerfectHashIndex":
+        with open(path, "rb") as f:
+            mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        
+        magic, version, count, bucket_count = INDEX_HEADER.unpack_from(mapped, 0)
+        if magic != INDEX_MAGIC:
+            mapped.close()
+            raise ValueError(f"{path} is not a redirect hash index")
+        
+        view = memoryview(mapped)
+        offset = INDEX_HEADER.size
+        seeds = view[offset:offset + bucket_count * 4].cast("i")
+        offset += bucket_count * 4 + (-bucket_count * 4 % 8)
+        entries = view[offset:offset + count * 4].cast("I")
+        return cls(version, seeds, entries, mapped=mapped)
+
+def open_snapshot(directory: str, version: int) -> RedirectSnapshot:
+    """Map a full snapshot and, when present and matching, its hash index"""
+    snapshot = RedirectSnapshot.open(os.path.join(directory, snapshot_name(version)))
+    index_path = os.path.join(directory, index_name(version))
+    if os.path.exists(index_path):
+        index = PerfectHashIndex.open(index_path)
+        if index.version == snapshot.version and len(index) == len(snapshot):
+            snapshot.index = index
+        else:
+            logger.warning(f"Ignoring {index_path}, it does not match its snapshot")
+    return snapshot
+
+# =====================================================
+# REDIRECT TABLE: snapshot + applied deltas
+# =====================================================
+
+class RedirectTable:
+    """The newest reachable state of a snapshot directory
+    
+    The newest full snapshot is always mapped (with its hash index) as soon
+    as it appears, and the overlay starts empty. Deltas only bridge the gap
+    from there: export writes a delta before its full snapshot, so for a
+    moment the delta is the newest state; it goes into a small in-memory
+    overlay until the matching snapshot replaces it.
+    """
+    
+    def __init__(self, directory: str):
+        self.directory = directory
+        self.snapshot: Optional[RedirectSnapshot] = None
+        self.overlay: Dict[str, str] = {}
+        self.version = 0
+    
+    def get(self, short_code: str) -> Optional[str]:
+        url = self.overlay.get(short_code)
+        if url is None and self.snapshot is not None:
+            url = self.snapshot.get(short_code)
+        return url or None
+    
+    def refresh(self) -> bool:
+        """Catch up with the directory; returns whether the table changed"""
+        started = (self.version, self.snapshot)
+        snapshots, deltas = {}, {}
+        for name in os.listdir(self.directory):
+            match = SNAPSHOT_NAME.match(name)
+            if match:
+                snapshots[int(match.group(1))] = name
+                continue
+            match = DELTA_NAME.match(name)
+            if match:
+                deltas[int(match.group(1))] = (int(match.group(2)), name)
+        
+        newest = max(snapshots, default=0)
+        if newest >= self.version and newest > (self.snapshot.version if self.snapshot is not None else 0):
+            self.snapshot = open_snapshot(self.directory, newest)
+            self.overlay = {}
+            self.version = newest
+        
+        while self.snapshot is not None and self.version in deltas:
+            version, name = deltas[self.version]
+            delta = RedirectSnapshot.open(os.path.join(self.directory, name))
+            self.overlay.update(delta.items())
+            self.version = version
+        
+        changed = (self.version, self.snapshot) != started
+        if changed:
+            logger.info(f"Redirect table at version {self.version} ({len(self.snapshot)} links, {len(self.overlay)} changed since)")
+        return changed
+
+def prune_snapshots(directory: str, keep: int = 2) -> List[str]:
+    """Delete snapshots, indexes and deltas older than the newest `keep` snapshots; returns the removed names
+    
+    Edges that already mapped a removed file keep reading it (the mapping
+    outlives the name); on their next refresh they move to the newest one.
+    """
+    names = os.listdir(directory)
+    versions = sorted((int(match.group(1)) for match in map(SNAPSHOT_NAME.match, names) if match), reverse=True)
+    if len(versions) <= keep:
+        return []
+    oldest_kept = versions[keep - 1]
+    
+    removed = []
+    for name in names:
+        match = SNAPSHOT_NAME.match(name) or INDEX_NAME.match(name) or DELTA_NAME.match(name)
+        if match and int(match.group(1)) < oldest_kept:
+            os.remove(os.path.join(directory, name))
+            removed.append(name)
+    return removed
+
+# =====================================================
+# STANDALONE REDIRECT SERVER (ASGI)
+# =====================================================
+
+@lru_cache(maxsize=100000)
+def _encoded_redirect(url: str) -> Tuple[list, str]:
+    etag = redirect_etag(url)
+    return redirect_headers(url, etag), etag
+
+NOT_FOUND_BODY = b'{"detail":"Link not found or inactive"}'
+NOT_FOUND_HEADERS = [(b"content-type", b"application/json"), (b"content-length", str(len(NOT_FOUND_BODY)).encode())]
+
+class SnapshotRedirectApp:
+    """ASGI app answering GET/HEAD /go/{code} from a snapshot directory, with no database access
+    
+    Responses carry the same headers as the main app's redirects. Clicks
+    served here are not counted.
+    """
+    
+    prefixes = ("/go/", "/api/redirect/")
+    
+    def __init__(self, directory: Optional[str] = REDIRECT_SNAPSHOT_DIR, refresh_seconds: float = REDIRECT_SNAPSHOT_REFRESH_SECONDS):
+        self.table = RedirectTable(directory) if directory else None
+        self.refresh_seconds = refresh_seconds
+        self._task: Optional[asyncio.Task] = None
+    
+    async def __call__(self, scope, receive, send):
+        if scope["type"] == "lifespan":
+            return await self._lifespan(receive, send)
+        if scope["type"] != "http":
+            return
+        
+        url = None
+        path = scope["path"]
+        if scope["method"] in ("GET", "HEAD") and self.table is not None:
+            for prefix in self.prefixes:
+                if path.startswith(prefix):
+                    url = self.table.get(path[len(prefix):])
+                    break
+        
+        if url is None:
+            await send({"type": "http.response.start", "status": 404, "headers": NOT_FOUND_HEADERS})
+            await send({"type": "http.response.body", "body": NOT_FOUND_BODY})
+            return
+        
+        headers, etag = _encoded_redirect(url)
+        status = REDIRECT_STATUS
+        for name, value in scope["headers"]:
+            if name == b"if-none-match" and etag.encode("latin-1") in value:
+                status = 304
+        await send({"type": "http.response.start", "status": status, "headers": list(headers)})
+        await send({"type": "http.response.body", "body": b""})
+    
+    async def _lifespan(self, receive, send):
+        while True:
+            message = await receive()
+            if message["type"] == "lifespan.startup":
+                if self.table is None:
+                    await send({"type": "lifespan.startup.failed", "message": "REDIRECT_SNAPSHOT_DIR is not set"})
+                    return
+                self.table.refresh()
+                self._task = asyncio.create_task(self._refresh_periodically())
+                await send({"type": "lifespan.startup.complete"})
+            elif message["type"] == "lifespan.shutdown":
+                if self._task is not None:
+                    self._task.cancel()
+                await send({"type": "lifespan.shutdown.complete"})
+                return
+    
+    async def _refresh_periodically(self):
+        while True:
+            await asyncio.sleep(self.refresh_seconds)
+            try:
+                self.table.refresh()
+            except Exception as e:
+                logger.error(f"Redirect snapshot refresh failed: {e}")
+
+app = SnapshotRedirectApp()
+
+# =====================================================
+# COMMAND LINE
+# =====================================================
+
+def benchmark(snapshot: RedirectSnapshot, count: int = 200000) -> dict:
+    """Lookups per second for existing codes, with the hash index and with binary search"""
+    codes = [snapshot.code_at(random.randrange(len(snapshot))) for _ in range(count)] if len(snapshot) else []
+    
+    def rate() -> int:
+        started = time.perf_counter()
+        for code in codes:
+            snapshot.find(code)
+        return int(len(codes) / max(time.perf_counter() - started, 1e-9))
+    
+    index, results = snapshot.index, {"entries": len(snapshot)}
+    if index is not None:
+        results["hash_lookups_per_second"] = rate()
+    snapshot.index = None
+    results["binary_search_lookups_per_second"] = rate()
+    snapshot.index = index
+    return results
+
+def main(argv: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(description="Inspect redirect snapshots")
+    commands = parser.add_subparsers(dest="command", required=True)
+    
+    info = commands.add_parser("info", help="Show a snapshot or delta header")
+    info.add_argument("path")
+    
+    lookup = commands.add_parser("lookup", help="Resolve codes against a snapshot directory")
+    lookup.add_argument("directory")
+    lookup.add_argument("codes", nargs="+")
+    
+    build_index = commands.add_parser("index", help="Build the hash index of a full snapshot in a directory")
+    build_index.add_argument("directory")
+    build_index.add_argument("version", type=int)
+    
+    bench = commands.add_parser("bench", help="Measure lookup throughput of a full snapshot in a directory")
+    bench.add_argument("directory")
+    bench.add_argument("version", type=int)
+    bench.add_argument("--count", type=int, default=200000)
+    
+    args = parser.parse_args(argv)
+    if args.command == "info":
+        snapshot = RedirectSnapshot.open(args.path)
+        print(json.dumps({
+            "kind": "delta" if snapshot.kind == KIND_DELTA else "full",
+            "version": snapshot.version,
+            "base_version": snapshot.base_version,
+            "entries": len(snapshot),
+        }))
+    elif args.command == "lookup":
+        table = RedirectTable(args.directory)
+        table.refresh()
+        for code in args.codes:
+            print(f"{code}\t{table.get(code) or '-'}")
+    elif args.command == "index":
+        snapshot = RedirectSnapshot.open(os.path.join(args.directory, snapshot_name(args.version)))
+        PerfectHashIndex.build(snapshot).save(os.path.join(args.directory, index_name(args.version)))
+        print(f"Wrote hash index of {len(snapshot)} codes")
+    else:
+        print(json.dumps(benchmark(open_snapshot(args.directory, args.version), args.count)))
+
+if __name__ == "__main__":
+    sys.exit(main())
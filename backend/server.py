@@ -1,5 +1,5 @@
-from fastapi import FastAPI, APIRouter, UploadFile, File, HTTPException, Form, BackgroundTasks, Depends
-from fastapi.responses import JSONResponse, RedirectResponse
+from fastapi import FastAPI, APIRouter, UploadFile, File, HTTPException, Form, BackgroundTasks, Depends, Request, Header
+from fastapi.responses import JSONResponse, Response, StreamingResponse, FileResponse
 from dotenv import load_dotenv
 from starlette.middleware.cors import CORSMiddleware
 from sqlalchemy.ext.asyncio import AsyncSession
@@ -12,13 +12,14 @@ from typing import List, Optional, Dict, Any
 import uuid
 from datetime import datetime
 import aiofiles
+import asyncio
 import json
 
 # Import database models and session
 from database import (
-    get_db, create_tables, engine, AsyncSessionLocal,
+    get_db, dispose_engines, AsyncSessionLocal, ReplicaSessionLocal,
     StatusCheckTable, UserTable, SubscriptionTable, LinkTable, 
-    ImportJobTable, AnalyticsTable, DomainTable, ContactTable
+    ImportJobTable, ImportJobErrorTable, AnalyticsTable, DomainTable, ContactTable
 )
 
 # Import Pydantic models
@@ -27,7 +28,30 @@ from models import (
     LinkImportRequest, UserImportRequest, AnalyticsImportRequest,
     DomainImportRequest, ContactImportRequest, PlatformMigrationRequest,
     FileUploadResponse, ImportValidationResult,
-    PlanType, PlanLimits, SubscriptionPlan, UserSubscription, User
+    ImportJobErrorDetail, ImportJobErrorsResponse, ChunkedUploadStatus,
+    ExportRequest, ExportResponse, ExportJobStatus, ExportFormat, ExportStatus,
+    PlanType, PlanLimits, SubscriptionPlan, UserSubscription, User, UserSummary, PlatformMetrics
+)
+from import_services import (
+    ImportService, FileProcessor, DataValidator, DataProcessor,
+    DEFAULT_IMPORT_BATCH_SIZE, COLUMNAR_FORMATS
+)
+from upload_services import ChunkedUploadService, DEFAULT_CHUNK_SIZE
+from subscription_services import PLAN_LIST, get_plan_limits, entitlement_cache, reserve_link_quota
+from shared_cache import shared_cache
+from redirect_cache import redirect_cache, CachedLink, REDIRECT_STATUS
+from cache_warmup import warm_redirect_cache
+from quota_services import click_quota_tracker, QUOTA_BLOCKED
+from rate_limit import RateLimitMiddleware, RATE_LIMIT_ENABLED
+from db_routing import get_read_db, ReadYourWritesMiddleware, REPLICA_ENABLED, READ_YOUR_WRITES_SECONDS
+from sharding import link_shards
+from bot_filter import bot_classifier, client_ip, BOT_CLICK_POLICY
+from analytics_pipeline import analytics_pipeline, ClickEvent
+from geo_enrichment import geo_enricher
+from user_stats_services import UserStatsService
+from metrics_services import PlatformMetricsService, platform_metrics_refresher
+from export_services import (
+    ExportService, EXPORT_FILE_EXTENSIONS, EXPORT_MEDIA_TYPES, verify_download
 )
 
 ROOT_DIR = Path(__file__).parent
@@ -37,6 +61,15 @@ load_dotenv(ROOT_DIR / '.env')
 UPLOAD_DIR = Path(__file__).parent / "uploads"
 UPLOAD_DIR.mkdir(exist_ok=True)
 
+# Create export directory
+EXPORT_DIR = Path(__file__).parent / "exports"
+EXPORT_DIR.mkdir(exist_ok=True)
+
+# Initialize services
+file_processor = FileProcessor()
+data_validator = DataValidator()
+chunked_upload_service = ChunkedUploadService(UPLOAD_DIR)
+
 # Create the main app without a prefix
 app = FastAPI()
 
@@ -73,7 +106,7 @@ async def create_status_check(input: StatusCheckCreate, db: AsyncSession = Depen
     return status_obj
 
 @api_router.get("/status", response_model=List[StatusCheck])
-async def get_status_checks(db: AsyncSession = Depends(get_db)):
+async def get_status_checks(db: AsyncSession = Depends(get_read_db)):
     # Get all status checks
     stmt = select(StatusCheckTable)
     result = await db.execute(stmt)
@@ -92,53 +125,7 @@ async def get_status_checks(db: AsyncSession = Depends(get_db)):
 @api_router.get("/subscription/plans", response_model=List[SubscriptionPlan])
 async def get_subscription_plans():
     """Get all available subscription plans"""
-    plans = [
-        SubscriptionPlan(
-            name="Basic",
-            plan_type=PlanType.BASIC,
-            price_monthly=0.0,
-            price_yearly=0.0,
-            limits=PlanLimits(
-                max_links=5,
-                max_clicks_per_month=1000,
-                custom_domains=False,
-                analytics_retention_days=30,
-                api_access=False,
-                ads_free=False
-            ),
-            features=[
-                "Up to 5 shortened links",
-                "Basic analytics (30 days)",
-                "Standard support",
-                "QR code generation"
-            ]
-        ),
-        SubscriptionPlan(
-            name="Pro",
-            plan_type=PlanType.PRO,
-            price_monthly=9.99,
-            price_yearly=99.99,
-            limits=PlanLimits(
-                max_links=100,
-                max_clicks_per_month=100000,
-                custom_domains=True,
-                analytics_retention_days=365,
-                api_access=True,
-                ads_free=True
-            ),
-            features=[
-                "Up to 100 shortened links",
-                "Advanced analytics (365 days)",
-                "Priority support",
-                "Custom domains",
-                "Ad-free experience",
-                "API access",
-                "Advanced QR code styling",
-                "Bulk operations"
-            ]
-        )
-    ]
-    return plans
+    return PLAN_LIST
 
 @api_router.get("/subscription/current/{user_id}", response_model=UserSubscription)
 async def get_current_subscription(user_id: str, db: AsyncSession = Depends(get_db)):
@@ -262,18 +249,15 @@ async def upgrade_subscription(
             await db.commit()
         
         # Update user limits based on plan
-        user_limits = {"max_links": 5, "links_created": 0}
-        if plan_type == PlanType.PRO:
-            user_limits["max_links"] = 100
-        
         stmt = update(UserTable).where(UserTable.id == user_id).values(
             plan_type=plan_type,
             plan_expires=subscription.plan_expires,
-            max_links=user_limits["max_links"],
+            max_links=get_plan_limits(plan_type).max_links,
             updated_at=datetime.utcnow()
         )
         await db.execute(stmt)
         await db.commit()
+        await entitlement_cache.invalidate(user_id)
         
         return subscription
         
@@ -289,46 +273,36 @@ async def validate_plan_limits(
 ):
     """Validate if user can perform action based on plan limits"""
     try:
-        # Get user
-        stmt = select(UserTable).where(UserTable.id == user_id)
-        result = await db.execute(stmt)
-        user_row = result.fetchone()
+        # Served from the entitlement cache; only a miss reads the user row
+        entitlement = await entitlement_cache.get(db, user_id)
         
-        if not user_row:
+        if not entitlement:
             raise HTTPException(status_code=404, detail="User not found")
         
+        limits = entitlement.limits
+        
         if action == "create_link":
-            if user_row.plan_type == "basic" and user_row.links_created >= 5:
-                return {
-                    "allowed": False,
-                    "message": "You've reached your link limit. Upgrade to Pro for up to 100 links.",
-                    "current_usage": user_row.links_created,
-                    "limit": 5
-                }
-            elif user_row.plan_type == "pro" and user_row.links_created >= 100:
+            if not entitlement.can_create_link:
+                if entitlement.plan_type == PlanType.BASIC:
+                    message = f"You've reached your link limit. Upgrade to Pro for up to {get_plan_limits(PlanType.PRO).max_links} links."
+                else:
+                    message = f"You've reached your plan limit of {entitlement.max_links} links."
                 return {
                     "allowed": False,
-                    "message": "You've reached your Pro plan limit of 100 links.",
-                    "current_usage": user_row.links_created,
-                    "limit": 100
+                    "message": message,
+                    "current_usage": entitlement.links_created,
+                    "limit": entitlement.max_links
                 }
         
         elif action == "access_analytics":
-            if user_row.plan_type == "basic":
-                return {
-                    "allowed": True,
-                    "message": "Basic analytics (30 days) available",
-                    "retention_days": 30
-                }
-            else:
-                return {
-                    "allowed": True,
-                    "message": "Advanced analytics (365 days) available",
-                    "retention_days": 365
-                }
+            return {
+                "allowed": True,
+                "message": f"{'Basic' if entitlement.plan_type == PlanType.BASIC else 'Advanced'} analytics ({limits.analytics_retention_days} days) available",
+                "retention_days": limits.analytics_retention_days
+            }
         
         elif action == "custom_domain":
-            if user_row.plan_type == "basic":
+            if not limits.custom_domains:
                 return {
                     "allowed": False,
                     "message": "Custom domains are available with Pro plan"
@@ -337,10 +311,12 @@ async def validate_plan_limits(
         return {
             "allowed": True,
             "message": "Action allowed",
-            "current_usage": user_row.links_created,
-            "limit": user_row.max_links
+            "current_usage": entitlement.links_created,
+            "limit": entitlement.max_links
         }
         
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"Error validating plan limits: {e}")
         raise HTTPException(status_code=500, detail=str(e))
@@ -351,7 +327,11 @@ async def increment_usage(
     action: str = Form(...),  # "link_created", "api_call", etc.
     db: AsyncSession = Depends(get_db)
 ):
-    """Increment user usage counters"""
+    """Increment user usage counters
+    
+    POST /api/links already reserves link quota atomically; this endpoint is
+    kept for usage that happens outside link creation.
+    """
     try:
         if action == "link_created":
             stmt = update(UserTable).where(UserTable.id == user_id).values(
@@ -359,6 +339,7 @@ async def increment_usage(
             )
             await db.execute(stmt)
             await db.commit()
+            await entitlement_cache.record_link_created(user_id)
         
         return {"success": True, "message": "Usage incremented"}
         
@@ -372,12 +353,13 @@ async def increment_usage(
 
 @api_router.post("/import/jobs", response_model=ImportResponse)
 async def create_import_job(
+    background_tasks: BackgroundTasks,
     import_type: ImportType = Form(...),
     filename: str = Form(...),
     created_by: str = Form(...),
     db: AsyncSession = Depends(get_db)
 ):
-    """Create a new import job"""
+    """Create a new import job, processing the file if it is already in the upload directory"""
     try:
         job = ImportJob(
             import_type=import_type,
@@ -400,6 +382,9 @@ async def create_import_job(
         await db.execute(stmt)
         await db.commit()
         
+        if Path(filename).name == filename and (UPLOAD_DIR / filename).is_file():
+            background_tasks.add_task(process_import_file, job.id, filename, import_type)
+        
         return ImportResponse(
             job_id=job.id,
             import_type=job.import_type,
@@ -418,7 +403,7 @@ async def get_import_jobs(
     created_by: str = None,
     import_type: ImportType = None,
     limit: int = 50,
-    db: AsyncSession = Depends(get_db)
+    db: AsyncSession = Depends(get_read_db)
 ):
     """Get import jobs with optional filters"""
     try:
@@ -429,7 +414,8 @@ async def get_import_jobs(
         if import_type:
             stmt = stmt.where(ImportJobTable.import_type == import_type)
         
-        stmt = stmt.limit(limit)
+        # Row-level errors live in import_job_errors; job.errors only holds the per-type summary
+        stmt = stmt.order_by(ImportJobTable.created_at.desc()).limit(limit)
         
         result = await db.execute(stmt)
         jobs = result.scalars().all()
@@ -458,7 +444,7 @@ async def get_import_jobs(
         raise HTTPException(status_code=500, detail=str(e))
 
 @api_router.get("/import/jobs/{job_id}", response_model=ImportStatusResponse)
-async def get_import_job_status(job_id: str, db: AsyncSession = Depends(get_db)):
+async def get_import_job_status(job_id: str, db: AsyncSession = Depends(get_read_db)):
     """Get specific import job status"""
     try:
         stmt = select(ImportJobTable).where(ImportJobTable.id == job_id)
@@ -488,10 +474,66 @@ async def get_import_job_status(job_id: str, db: AsyncSession = Depends(get_db))
         logger.error(f"Error getting import job status: {e}")
         raise HTTPException(status_code=500, detail=str(e))
 
+@api_router.get("/import/jobs/{job_id}/errors", response_model=ImportJobErrorsResponse)
+async def get_import_job_errors(
+    job_id: str,
+    error_type: Optional[str] = None,
+    offset: int = 0,
+    limit: int = 100,
+    db: AsyncSession = Depends(get_read_db)
+):
+    """Get the stored row errors of an import job, paginated"""
+    try:
+        limit = max(1, min(limit, 1000))
+        offset = max(0, offset)
+        
+        stmt = select(ImportJobTable.error_count, ImportJobTable.job_metadata).where(ImportJobTable.id == job_id)
+        result = await db.execute(stmt)
+        job = result.fetchone()
+        
+        if not job:
+            raise HTTPException(status_code=404, detail="Import job not found")
+        
+        stmt = select(ImportJobErrorTable).where(ImportJobErrorTable.job_id == job_id)
+        if error_type:
+            stmt = stmt.where(ImportJobErrorTable.error_type == error_type)
+        stmt = stmt.order_by(ImportJobErrorTable.id).offset(offset).limit(limit)
+        
+        result = await db.execute(stmt)
+        errors = result.scalars().all()
+        
+        return ImportJobErrorsResponse(
+            job_id=job_id,
+            total_errors=job.error_count or 0,
+            stored_errors=(job.job_metadata or {}).get("errors_stored", 0),
+            offset=offset,
+            limit=limit,
+            errors=[
+                ImportJobErrorDetail(
+                    id=error.id,
+                    row_number=error.row_number,
+                    field=error.field,
+                    error_type=error.error_type,
+                    message=error.message,
+                    created_at=error.created_at
+                )
+                for error in errors
+            ]
+        )
+        
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Error getting import job errors: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+
 @api_router.delete("/import/jobs/{job_id}")
 async def delete_import_job(job_id: str, db: AsyncSession = Depends(get_db)):
     """Delete an import job"""
     try:
+        stmt = delete(ImportJobErrorTable).where(ImportJobErrorTable.job_id == job_id)
+        await db.execute(stmt)
+        
         stmt = delete(ImportJobTable).where(ImportJobTable.id == job_id)
         await db.execute(stmt)
         await db.commit()
@@ -502,15 +544,382 @@ async def delete_import_job(job_id: str, db: AsyncSession = Depends(get_db)):
         logger.error(f"Error deleting import job: {e}")
         raise HTTPException(status_code=500, detail=str(e))
 
+# =====================================================
+# CHUNKED UPLOAD ENDPOINTS (resumable, for large import files)
+# =====================================================
+
+@api_router.post("/import/uploads", response_model=ChunkedUploadStatus)
+async def init_chunked_upload(
+    filename: str = Form(...),
+    total_size: int = Form(...),
+    import_type: ImportType = Form(...),
+    created_by: str = Form(...),
+    chunk_size: int = Form(DEFAULT_CHUNK_SIZE),
+    content_type: str = Form(None)
+):
+    """Start a resumable chunked upload"""
+    try:
+        removed = await chunked_upload_service.cleanup_expired_uploads()
+        if removed:
+            logger.info(f"Removed {removed} expired chunked upload(s)")
+        
+        return await chunked_upload_service.init_upload(
+            filename=filename,
+            total_size=total_size,
+            import_type=import_type,
+            created_by=created_by,
+            chunk_size=chunk_size,
+            content_type=content_type
+        )
+        
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        logger.error(f"Error starting chunked upload: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+@api_router.get("/import/uploads/{upload_id}", response_model=ChunkedUploadStatus)
+async def get_chunked_upload(upload_id: str):
+    """Get upload state; clients resume by sending the chunks not yet received"""
+    upload = await chunked_upload_service.get_upload(upload_id)
+    if not upload:
+        raise HTTPException(status_code=404, detail="Upload not found")
+    return upload
+
+@api_router.put("/import/uploads/{upload_id}/chunks/{chunk_index}")
+async def upload_chunk(
+    upload_id: str,
+    chunk_index: int,
+    request: Request,
+    x_chunk_sha256: str = Header(...)
+):
+    """Upload one chunk as the raw request body, verified against X-Chunk-SHA256"""
+    try:
+        upload = await chunked_upload_service.write_chunk(
+            upload_id, chunk_index, request.stream(), x_chunk_sha256
+        )
+        if not upload:
+            raise HTTPException(status_code=404, detail="Upload not found")
+        
+        return {
+            "upload_id": upload_id,
+            "chunk_index": chunk_index,
+            "received_chunks": len(upload.received_chunks),
+            "total_chunks": upload.total_chunks
+        }
+        
+    except HTTPException:
+        raise
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        logger.error(f"Error uploading chunk: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+@api_router.post("/import/uploads/{upload_id}/complete", response_model=ChunkedUploadStatus)
+async def complete_chunked_upload(
+    upload_id: str,
+    background_tasks: BackgroundTasks,
+    checksum: str = Form(None),
+    start_import: bool = Form(False),
+    batch_size: int = Form(DEFAULT_IMPORT_BATCH_SIZE),
+    db: AsyncSession = Depends(get_db)
+):
+    """Assemble a chunked upload and optionally start importing it right away
+    
+    Without start_import the file waits for POST /import/uploads/{upload_id}/import,
+    and is removed with the upload once it expires.
+    """
+    try:
+        upload = await chunked_upload_service.complete_upload(upload_id, checksum)
+        if not upload:
+            raise HTTPException(status_code=404, detail="Upload not found")
+        
+        if start_import:
+            upload = await start_upload_import(upload, background_tasks, batch_size, db)
+        
+        return upload
+        
+    except HTTPException:
+        raise
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        logger.error(f"Error completing chunked upload: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+@api_router.post("/import/uploads/{upload_id}/import", response_model=ChunkedUploadStatus)
+async def import_chunked_upload(
+    upload_id: str,
+    background_tasks: BackgroundTasks,
+    batch_size: int = Form(DEFAULT_IMPORT_BATCH_SIZE),
+    db: AsyncSession = Depends(get_db)
+):
+    """Start importing a completed chunked upload"""
+    try:
+        upload = await chunked_upload_service.get_upload(upload_id)
+        if not upload:
+            raise HTTPException(status_code=404, detail="Upload not found")
+        
+        return await start_upload_import(upload, background_tasks, batch_size, db)
+        
+    except HTTPException:
+        raise
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        logger.error(f"Error starting chunked upload import: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+async def start_upload_import(
+    upload: ChunkedUploadStatus,
+    background_tasks: BackgroundTasks,
+    batch_size: int,
+    db: AsyncSession
+) -> ChunkedUploadStatus:
+    """Create the import job of a completed upload and queue it"""
+    if upload.status != "completed":
+        raise ValueError("Upload is not completed yet")
+    if upload.job_id:
+        raise ValueError(f"Upload is already being imported by job {upload.job_id}")
+    
+    job = await ImportService(db).create_import_job(
+        import_type=upload.import_type,
+        filename=upload.filename,
+        original_filename=upload.original_filename,
+        created_by=upload.created_by
+    )
+    upload = await chunked_upload_service.set_import_job(upload.upload_id, job.id)
+    background_tasks.add_task(
+        process_import_file,
+        job.id,
+        upload.filename,
+        upload.import_type,
+        batch_size
+    )
+    return upload
+
+@api_router.delete("/import/uploads/{upload_id}")
+async def abort_chunked_upload(upload_id: str):
+    """Discard a chunked upload that is not being imported"""
+    try:
+        if not await chunked_upload_service.abort_upload(upload_id):
+            raise HTTPException(status_code=404, detail="Upload not found")
+        return {"message": "Upload aborted successfully"}
+        
+    except HTTPException:
+        raise
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+# =====================================================
+# DATA EXPORT ENDPOINTS
+# =====================================================
+
+@api_router.post("/export", response_model=ExportJobStatus)
+async def create_export(
+    export_request: ExportRequest,
+    background_tasks: BackgroundTasks,
+    db: AsyncSession = Depends(get_db)
+):
+    """Start a background export job; poll it, then request a download URL"""
+    try:
+        export_service = ExportService(db)
+        await export_service.cleanup_expired_exports(EXPORT_DIR)
+        
+        job = await export_service.create_export_job(export_request)
+        background_tasks.add_task(run_export_job, job.export_id, export_request)
+        
+        return job
+        
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        logger.error(f"Error creating export: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+@api_router.post("/export/stream")
+async def stream_export(export_request: ExportRequest):
+    """Stream a CSV/JSON/NDJSON export directly in the response body"""
+    if export_request.format == ExportFormat.EXCEL:
+        raise HTTPException(status_code=400, detail="Excel exports cannot be streamed; use POST /api/export")
+    
+    try:
+        # Validate filters before the response starts
+        ExportService(None).build_query(export_request)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    
+    async def body():
+        # The session must outlive the handler, so it is owned by the generator; exports read from the replica
+        async with ReplicaSessionLocal() as db:
+            async for chunk in ExportService(db).stream_export(export_request):
+                yield chunk
+    
+    filename = f"{export_request.export_type.value}.{EXPORT_FILE_EXTENSIONS[export_request.format]}"
+    return StreamingResponse(
+        body(),
+        media_type=EXPORT_MEDIA_TYPES[export_request.format],
+        headers={"Content-Disposition": f'attachment; filename="{filename}"'}
+    )
+
+@api_router.get("/export/{export_id}", response_model=ExportJobStatus)
+async def get_export_status(export_id: str, db: AsyncSession = Depends(get_read_db)):
+    """Get export job status"""
+    job = await ExportService(db).get_export_job(export_id)
+    if not job:
+        raise HTTPException(status_code=404, detail="Export not found")
+    return job
+
+@api_router.get("/export/{export_id}/url", response_model=ExportResponse)
+async def get_export_download_url(export_id: str, request: Request, db: AsyncSession = Depends(get_read_db)):
+    """Get a time-limited download URL for a completed export"""
+    export_service = ExportService(db)
+    job = await export_service.get_export_job(export_id)
+    
+    if not job:
+        raise HTTPException(status_code=404, detail="Export not found")
+    if job.status != ExportStatus.COMPLETED or (job.expires_at and job.expires_at <= datetime.utcnow()):
+        raise HTTPException(status_code=409, detail=f"Export is not available for download (status: {job.status.value})")
+    
+    return export_service.build_export_response(job, str(request.base_url).rstrip("/"))
+
+@api_router.get("/export/download/{export_id}")
+async def download_export(
+    export_id: str,
+    expires: int,
+    signature: str,
+    db: AsyncSession = Depends(get_db)
+):
+    """Download an export file through a signed URL"""
+    if not verify_download(export_id, expires, signature):
+        raise HTTPException(status_code=403, detail="Download link is invalid or has expired")
+    
+    filename = await ExportService(db).get_export_filename(export_id)
+    if not filename or not (EXPORT_DIR / filename).exists():
+        raise HTTPException(status_code=404, detail="Export not found")
+    
+    return FileResponse(EXPORT_DIR / filename, filename=filename)
+
+# =====================================================
+# BACKGROUND TASK FUNCTIONS
+# =====================================================
+
+async def process_import_file(
+    job_id: str,
+    filename: str,
+    import_type: ImportType,
+    batch_size: int = DEFAULT_IMPORT_BATCH_SIZE
+):
+    """Background task to stream an uploaded file through validation and insert in batches"""
+    async with AsyncSessionLocal() as db:
+        import_service = ImportService(db)
+        data_processor = DataProcessor(db)
+        
+        try:
+            if import_type == ImportType.LINKS:
+                validate, process = data_validator.validate_links_data, data_processor.process_links_import
+            elif import_type == ImportType.USERS:
+                validate, process = data_validator.validate_users_data, data_processor.process_users_import
+            elif import_type == ImportType.ANALYTICS:
+                validate, process = data_validator.validate_analytics_data, data_processor.process_analytics_import
+            else:
+                raise ValueError(f"File import is not supported for {import_type.value}")
+            
+            await import_service.update_import_job(job_id, {"status": ImportStatus.PROCESSING})
+            
+            file_path = str(UPLOAD_DIR / filename)
+            file_format = file_processor.detect_file_format(filename, None)
+            
+            # Both pipelines yield (records, successes, errors, error details with batch-relative rows)
+            async def columnar_results():
+                # Column-wise fast path: Arrow batches go straight to COPY
+                async for batch in file_processor.iter_columnar_batches(file_path, file_format, batch_size):
+                    result = await data_processor.process_analytics_batch(batch, job_id)
+                    yield result["processed_count"], result["success_count"], result["error_count"], result["errors"]
+            
+            async def record_results():
+                async for batch in file_processor.iter_file_batches(file_path, file_format, batch_size):
+                    # JSON array elements that are not objects are row errors rather than records
+                    batch_errors = [
+                        {"row": i + 1, "error_type": "invalid_record", "error": f"Expected an object, found {type(record).__name__}"}
+                        for i, record in enumerate(batch) if not isinstance(record, dict)
+                    ]
+                    record_indexes = [i for i, record in enumerate(batch) if isinstance(record, dict)]
+                    records = [batch[i] for i in record_indexes]
+                    
+                    validation = validate(records)
+                    invalid_rows = {error["row"] for error in validation["errors"]}
+                    valid_indexes = [i for i in range(len(records)) if i + 1 not in invalid_rows]
+                    
+                    result = await process([records[i] for i in valid_indexes], job_id)
+                    
+                    # Validator rows refer to the records, processor rows to the valid ones; map both back to batch rows
+                    for error in validation["errors"]:
+                        batch_errors.append({**error, "row": record_indexes[error["row"] - 1] + 1})
+                    for error in result["errors"]:
+                        batch_errors.append({**error, "row": record_indexes[valid_indexes[error["row"] - 1]] + 1})
+                    
+                    error_count = len(batch) - len(records) + len(invalid_rows) + result["error_count"]
+                    yield len(batch), result["success_count"], error_count, batch_errors
+            
+            if import_type == ImportType.ANALYTICS and file_format in COLUMNAR_FORMATS:
+                results = columnar_results()
+            else:
+                results = record_results()
+            
+            processed_records = success_count = error_count = 0
+            
+            async for batch_records, batch_successes, batch_error_count, batch_errors in results:
+                # Row numbers in the job are file-wide
+                await import_service.record_errors(job_id, [
+                    {**error, "row": processed_records + error["row"]} if error.get("row") else error
+                    for error in batch_errors
+                ])
+                
+                processed_records += batch_records
+                success_count += batch_successes
+                error_count += batch_error_count
+                
+                await import_service.update_import_job(job_id, {
+                    "processed_records": processed_records,
+                    "success_count": success_count,
+                    "error_count": error_count
+                })
+            
+            if error_count == 0:
+                status = ImportStatus.COMPLETED
+            elif success_count > 0:
+                status = ImportStatus.PARTIAL
+            else:
+                status = ImportStatus.FAILED
+            
+            await import_service.update_import_job(job_id, {
+                "status": status,
+                "total_records": processed_records,
+                "completed_at": datetime.utcnow()
+            })
+            
+        except Exception as e:
+            logger.error(f"Error processing import file: {e}")
+            await db.rollback()
+            await import_service.record_errors(job_id, [{"error_type": type(e).__name__, "error": str(e)}])
+            await import_service.update_import_job(job_id, {"status": ImportStatus.FAILED})
+
+async def run_export_job(export_id: str, export_request: ExportRequest):
+    """Background task to write an export file"""
+    async with AsyncSessionLocal() as db:
+        await ExportService(db).run_export_job(export_id, export_request, EXPORT_DIR)
+
 # =====================================================
 # USER MANAGEMENT ENDPOINTS
 # =====================================================
 
 @api_router.get("/users", response_model=List[User])
-async def get_users(db: AsyncSession = Depends(get_db)):
+async def get_users(db: AsyncSession = Depends(get_read_db)):
     """Get all users"""
     try:
-        stmt = select(UserTable)
+        stmt = select(UserTable).order_by(UserTable.created_at.desc())
         result = await db.execute(stmt)
         users = result.scalars().all()
         
@@ -537,7 +946,7 @@ async def get_users(db: AsyncSession = Depends(get_db)):
         raise HTTPException(status_code=500, detail=str(e))
 
 @api_router.get("/users/{user_id}", response_model=User)
-async def get_user(user_id: str, db: AsyncSession = Depends(get_db)):
+async def get_user(user_id: str, db: AsyncSession = Depends(get_read_db)):
     """Get a specific user"""
     try:
         stmt = select(UserTable).where(UserTable.id == user_id)
@@ -566,6 +975,23 @@ async def get_user(user_id: str, db: AsyncSession = Depends(get_db)):
         logger.error(f"Error getting user: {e}")
         raise HTTPException(status_code=500, detail=str(e))
 
+@api_router.get("/users/{user_id}/summary", response_model=UserSummary)
+async def get_user_summary(user_id: str, db: AsyncSession = Depends(get_db)):
+    """Get a user's dashboard totals and top links"""
+    try:
+        summary = await UserStatsService(db).get_summary(user_id)
+        
+        if not summary:
+            raise HTTPException(status_code=404, detail="User not found")
+        
+        return summary
+        
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Error getting user summary: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+
 @api_router.put("/users/{user_id}", response_model=User)
 async def update_user(
     user_id: str,
@@ -599,6 +1025,7 @@ async def update_user(
         
         await db.execute(update_stmt)
         await db.commit()
+        await entitlement_cache.invalidate(user_id)
         
         # Return updated user
         stmt = select(UserTable).where(UserTable.id == user_id)
@@ -643,6 +1070,7 @@ async def suspend_user(user_id: str, db: AsyncSession = Depends(get_db)):
         
         await db.execute(update_stmt)
         await db.commit()
+        await entitlement_cache.invalidate(user_id)
         
         return {"message": "User suspended successfully"}
         
@@ -669,6 +1097,7 @@ async def activate_user(user_id: str, db: AsyncSession = Depends(get_db)):
         
         await db.execute(update_stmt)
         await db.commit()
+        await entitlement_cache.invalidate(user_id)
         
         return {"message": "User activated successfully"}
         
@@ -676,6 +1105,27 @@ async def activate_user(user_id: str, db: AsyncSession = Depends(get_db)):
         logger.error(f"Error activating user: {e}")
         raise HTTPException(status_code=500, detail=str(e))
 
+# =====================================================
+# ADMIN METRICS ENDPOINTS
+# =====================================================
+
+@api_router.get("/admin/metrics", response_model=PlatformMetrics)
+async def get_platform_metrics(db: AsyncSession = Depends(get_db)):
+    """Get platform-wide totals from the materialized snapshot (see refreshed_at / stale_seconds)"""
+    try:
+        metrics = await PlatformMetricsService(db).get()
+        
+        if not metrics:
+            raise HTTPException(status_code=503, detail="Platform metrics are being computed, try again shortly")
+        
+        return metrics
+        
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Error getting platform metrics: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+
 # =====================================================
 # LINK MANAGEMENT ENDPOINTS
 # =====================================================
@@ -699,6 +1149,7 @@ class LinkResponse(BaseModel):
     custom_domain: Optional[str] = None
     is_active: bool
     clicks: int
+    bot_clicks: int = 0
     user_id: Optional[str] = None
     user_email: Optional[str] = None
     created_at: datetime
@@ -714,14 +1165,33 @@ def generate_short_code():
 async def create_link(link: LinkCreate, db: AsyncSession = Depends(get_db)):
     """Create a new short link"""
     try:
+        reservation = None
+        if link.user_id:
+            entitlement = await entitlement_cache.get(db, link.user_id)
+            if not entitlement:
+                raise HTTPException(status_code=404, detail="User not found")
+            
+            # Authoritative check-and-increment, committed together with the link below. A cached
+            # entitlement at its limit may predate an upgrade made on another worker, so only this rejects
+            reservation = await reserve_link_quota(db, link.user_id)
+            if not reservation:
+                await db.rollback()
+                await entitlement_cache.invalidate(link.user_id)
+                entitlement = await entitlement_cache.get(db, link.user_id) or entitlement
+                raise HTTPException(
+                    status_code=403,
+                    detail=f"Link limit of {entitlement.max_links} reached for the {entitlement.plan_type} plan"
+                )
+        
         # Generate unique short code
         short_code = generate_short_code()
         
-        # Check if short code already exists
+        # Check if short code already exists, on the shard that owns it
         while True:
-            stmt = select(LinkTable).where(LinkTable.short_url.like(f"%{short_code}%"))
-            result = await db.execute(stmt)
-            existing = result.scalar_one_or_none()
+            stmt = select(LinkTable.id).where(LinkTable.short_code == short_code)
+            async with link_shards.session(link_shards.shard_for_code(short_code), db) as shard_db:
+                result = await shard_db.execute(stmt)
+                existing = result.scalar_one_or_none()
             if not existing:
                 break
             short_code = generate_short_code()
@@ -735,6 +1205,7 @@ async def create_link(link: LinkCreate, db: AsyncSession = Depends(get_db)):
             id=str(uuid.uuid4()),
             original_url=link.original_url,
             short_url=short_url,
+            short_code=short_code,
             title=link.title,
             description=link.description,
             category=link.category,
@@ -743,13 +1214,30 @@ async def create_link(link: LinkCreate, db: AsyncSession = Depends(get_db)):
             user_email=link.user_email,
             is_active=True,
             clicks=0,
+            bot_clicks=0,
             created_at=datetime.utcnow(),
             updated_at=datetime.utcnow()
         )
         
-        db.add(new_link)
-        await db.commit()
-        await db.refresh(new_link)
+        async with link_shards.session(link_shards.shard_for_code(short_code), db) as shard_db:
+            shard_db.add(new_link)
+            if link.user_id:
+                await UserStatsService(db).record_link_created(link.user_id)
+            if link_shards.is_separate(shard_db, db):
+                # The link is committed on its shard before the quota and stats on the primary
+                await shard_db.commit()
+            await db.commit()
+            await shard_db.refresh(new_link)
+        
+        if reservation:
+            # Only now that the reservation is committed may the caches count it
+            await entitlement_cache.store(
+                link.user_id,
+                plan_type=reservation.plan_type,
+                max_links=reservation.max_links,
+                links_created=reservation.links_created,
+                is_active=reservation.is_active
+            )
         
         return LinkResponse(
             id=new_link.id,
@@ -761,14 +1249,21 @@ async def create_link(link: LinkCreate, db: AsyncSession = Depends(get_db)):
             custom_domain=new_link.custom_domain,
             is_active=new_link.is_active,
             clicks=new_link.clicks,
+            bot_clicks=new_link.bot_clicks or 0,
             user_id=new_link.user_id,
             user_email=new_link.user_email,
             created_at=new_link.created_at,
             updated_at=new_link.updated_at
         )
         
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"Error creating link: {e}")
+        await db.rollback()
+        if link.user_id:
+            # The quota reservation was rolled back with the link insert
+            await entitlement_cache.invalidate(link.user_id)
         raise HTTPException(status_code=500, detail=str(e))
 
 @api_router.get("/links", response_model=List[LinkResponse])
@@ -776,7 +1271,7 @@ async def get_links(
     user_id: Optional[str] = None,
     user_email: Optional[str] = None,
     limit: int = 100,
-    db: AsyncSession = Depends(get_db)
+    db: AsyncSession = Depends(get_read_db)
 ):
     """Get links with optional filters"""
     try:
@@ -789,8 +1284,16 @@ async def get_links(
         
         stmt = stmt.limit(limit).order_by(LinkTable.created_at.desc())
         
-        result = await db.execute(stmt)
-        links = result.scalars().all()
+        async def links_on_shard(shard_db: AsyncSession):
+            result = await shard_db.execute(stmt)
+            return result.scalars().all()
+        
+        # Every shard returns its newest `limit` links; keep the newest overall
+        links = sorted(
+            (link for shard_links in await link_shards.fan_out(links_on_shard, db) for link in shard_links),
+            key=lambda link: link.created_at or datetime.min,
+            reverse=True
+        )[:limit]
         
         return [
             LinkResponse(
@@ -803,6 +1306,7 @@ async def get_links(
                 custom_domain=link.custom_domain,
                 is_active=link.is_active,
                 clicks=link.clicks,
+                bot_clicks=link.bot_clicks or 0,
                 user_id=link.user_id,
                 user_email=link.user_email,
                 created_at=link.created_at,
@@ -815,13 +1319,21 @@ async def get_links(
         logger.error(f"Error getting links: {e}")
         raise HTTPException(status_code=500, detail=str(e))
 
+async def find_link(link_id: str, db: AsyncSession):
+    """(shard, link) for a link id, looked up on every shard in parallel"""
+    stmt = select(LinkTable).where(LinkTable.id == link_id)
+    
+    async def on_shard(shard_db: AsyncSession):
+        result = await shard_db.execute(stmt)
+        return result.scalar_one_or_none()
+    
+    return await link_shards.find_shard(on_shard, db)
+
 @api_router.get("/links/{link_id}", response_model=LinkResponse)
-async def get_link(link_id: str, db: AsyncSession = Depends(get_db)):
+async def get_link(link_id: str, db: AsyncSession = Depends(get_read_db)):
     """Get a specific link"""
     try:
-        stmt = select(LinkTable).where(LinkTable.id == link_id)
-        result = await db.execute(stmt)
-        link = result.scalar_one_or_none()
+        _, link = await find_link(link_id, db)
         
         if not link:
             raise HTTPException(status_code=404, detail="Link not found")
@@ -836,6 +1348,7 @@ async def get_link(link_id: str, db: AsyncSession = Depends(get_db)):
             custom_domain=link.custom_domain,
             is_active=link.is_active,
             clicks=link.clicks,
+            bot_clicks=link.bot_clicks or 0,
             user_id=link.user_id,
             user_email=link.user_email,
             created_at=link.created_at,
@@ -850,9 +1363,7 @@ async def get_link(link_id: str, db: AsyncSession = Depends(get_db)):
 async def toggle_link(link_id: str, db: AsyncSession = Depends(get_db)):
     """Toggle link active status"""
     try:
-        stmt = select(LinkTable).where(LinkTable.id == link_id)
-        result = await db.execute(stmt)
-        link = result.scalar_one_or_none()
+        shard, link = await find_link(link_id, db)
         
         if not link:
             raise HTTPException(status_code=404, detail="Link not found")
@@ -863,8 +1374,15 @@ async def toggle_link(link_id: str, db: AsyncSession = Depends(get_db)):
             updated_at=datetime.utcnow()
         )
         
-        await db.execute(update_stmt)
+        # The summary delta goes first so its lock is held while the link changes
+        if link.user_id:
+            await UserStatsService(db).record_link_toggled(link.user_id, not link.is_active)
+        async with link_shards.session(shard, db) as shard_db:
+            await shard_db.execute(update_stmt)
+            if link_shards.is_separate(shard_db, db):
+                await shard_db.commit()
         await db.commit()
+        await redirect_cache.invalidate(link.short_code)
         
         return {"message": f"Link {'activated' if not link.is_active else 'deactivated'} successfully"}
         
@@ -876,13 +1394,29 @@ async def toggle_link(link_id: str, db: AsyncSession = Depends(get_db)):
 async def delete_link(link_id: str, db: AsyncSession = Depends(get_db)):
     """Delete a link"""
     try:
-        stmt = delete(LinkTable).where(LinkTable.id == link_id)
-        result = await db.execute(stmt)
+        shard, link = await find_link(link_id, db)
+        if not link:
+            raise HTTPException(status_code=404, detail="Link not found")
+        
+        # Hold the owner's summary lock while the link is deleted on its shard
+        if link.user_id:
+            await UserStatsService(db).lock([link.user_id])
+        
+        stmt = delete(LinkTable).where(LinkTable.id == link_id).returning(
+            LinkTable.short_code, LinkTable.user_id, LinkTable.is_active, LinkTable.clicks
+        )
+        async with link_shards.session(shard, db) as shard_db:
+            deleted = (await shard_db.execute(stmt)).fetchone()
+            if deleted and link_shards.is_separate(shard_db, db):
+                await shard_db.commit()
         
-        if result.rowcount == 0:
+        if not deleted:
             raise HTTPException(status_code=404, detail="Link not found")
-            
+        
+        if deleted.user_id:
+            await UserStatsService(db).record_link_deleted(deleted.user_id, link_id, deleted.is_active, deleted.clicks)
         await db.commit()
+        await redirect_cache.invalidate(deleted.short_code)
         
         return {"message": "Link deleted successfully"}
         
@@ -894,44 +1428,95 @@ async def delete_link(link_id: str, db: AsyncSession = Depends(get_db)):
 # REDIRECT ENDPOINT (Critical for link shortening)
 # =====================================================
 
-from fastapi.responses import RedirectResponse
+async def load_redirect_link(short_code: str, shard: int):
+    """Read a link for the redirect cache, in a session of its own (shared by coalesced requests)"""
+    stmt = select(LinkTable).where(LinkTable.short_code == short_code)
+    
+    if link_shards.sharded:
+        # Look for link with this short code on the shard that owns it; no lookup needed to find the shard
+        async with link_shards.session(shard) as shard_db:
+            return (await shard_db.execute(stmt)).scalar_one_or_none()
+    
+    async with ReplicaSessionLocal() as replica:
+        link = (await replica.execute(stmt)).scalar_one_or_none()
+    
+    if not link and REPLICA_ENABLED:
+        # A link created moments ago may not have reached the replica yet
+        async with AsyncSessionLocal() as primary:
+            link = (await primary.execute(stmt)).scalar_one_or_none()
+    
+    return link
+
+class CachedRedirectResponse(Response):
+    """Redirect sent straight from a cached link's pre-encoded headers
+    
+    Skips Starlette's per-response header building and URL quoting. A client
+    revalidating with the link's ETag gets a 304.
+    """
+    
+    def __init__(self, link: CachedLink, status_code: int = REDIRECT_STATUS):
+        self.status_code = status_code
+        self.body = b""
+        self.background = None
+        # A copy, since middleware may add headers to the list it is sent
+        self.raw_headers = list(link.headers)
+
+def redirect_response(link: CachedLink, request: Request) -> CachedRedirectResponse:
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match and (if_none_match.strip() == "*" or link.etag in if_none_match):
+        return CachedRedirectResponse(link, status_code=304)
+    return CachedRedirectResponse(link)
+
+async def resolve_redirect(short_code: str, request: Request, db: AsyncSession) -> CachedRedirectResponse:
+    """Look up a short code, record the click and build the redirect"""
+    shard = link_shards.shard_for_code(short_code)
+    # Local cache, then the cache shared by all workers, then one database query however many requests missed
+    link = await redirect_cache.get_or_load(short_code, lambda: load_redirect_link(short_code, shard))
+    
+    if not link or not link.is_active:
+        raise HTTPException(status_code=404, detail="Link not found or inactive")
+    
+    if request.method == "HEAD":
+        # Link checkers and previews probing the target; not a click
+        return redirect_response(link, request)
+    
+    user_agent = request.headers.get("user-agent")
+    ip_address = client_ip(request.headers, request.client)
+    
+    # Crawlers and link previews still get redirected but never reach analytics or quotas
+    if BOT_CLICK_POLICY != "record" and bot_classifier.is_bot(user_agent, ip_address):
+        if BOT_CLICK_POLICY == "count":
+            analytics_pipeline.submit(ClickEvent(link.id, link.short_url, link.original_url, is_bot=True, shard=shard))
+        return redirect_response(link, request)
+    
+    if link.user_id:
+        # O(1) monthly click quota check against in-memory counters
+        owner = await entitlement_cache.get(db, link.user_id)
+        if owner:
+            quota = click_quota_tracker.record_click(link.user_id, owner.limits.max_clicks_per_month)
+            if quota == QUOTA_BLOCKED:
+                raise HTTPException(status_code=429, detail="This link has reached its monthly click limit")
+    
+    # Click count and analytics row are written (and enriched) in batches off the request path
+    analytics_pipeline.submit(ClickEvent(
+        link.id,
+        link.short_url,
+        link.original_url,
+        user_id=link.user_id,
+        user_agent=user_agent,
+        ip_address=ip_address,
+        referrer=request.headers.get("referer"),
+        shard=shard
+    ))
+    
+    # Redirect to original URL; a revalidation (304) still counts as a click
+    return redirect_response(link, request)
 
-@api_router.get("/redirect/{short_code}")
-async def redirect_link(short_code: str, db: AsyncSession = Depends(get_db)):
+@api_router.api_route("/redirect/{short_code}", methods=["GET", "HEAD"])
+async def redirect_link(short_code: str, request: Request, db: AsyncSession = Depends(get_read_db)):
     """Redirect short URL to original URL"""
     try:
-        # Look for link with this short code
-        stmt = select(LinkTable).where(LinkTable.short_url.like(f"%{short_code}%"))
-        result = await db.execute(stmt)
-        link = result.scalar_one_or_none()
-        
-        if not link or not link.is_active:
-            raise HTTPException(status_code=404, detail="Link not found or inactive")
-            
-        # Increment click count
-        update_stmt = update(LinkTable).where(LinkTable.id == link.id).values(
-            clicks=link.clicks + 1,
-            updated_at=datetime.utcnow()
-        )
-        await db.execute(update_stmt)
-        await db.commit()
-        
-        # Log analytics
-        analytics_record = AnalyticsTable(
-            id=str(uuid.uuid4()),
-            link_id=link.id,
-            short_url=link.short_url,
-            original_url=link.original_url,
-            clicks=1,
-            unique_clicks=1,
-            click_date=datetime.utcnow(),
-            created_at=datetime.utcnow()
-        )
-        db.add(analytics_record)
-        await db.commit()
-        
-        # Redirect to original URL
-        return RedirectResponse(url=link.original_url, status_code=302)
+        return await resolve_redirect(short_code, request, db)
         
     except HTTPException:
         raise
@@ -943,42 +1528,11 @@ async def redirect_link(short_code: str, db: AsyncSession = Depends(get_db)):
 # DIRECT REDIRECT ENDPOINT (for short URLs)
 # =====================================================
 
-@app.get("/go/{short_code}")
-async def direct_redirect(short_code: str, db: AsyncSession = Depends(get_db)):
+@app.api_route("/go/{short_code}", methods=["GET", "HEAD"])
+async def direct_redirect(short_code: str, request: Request, db: AsyncSession = Depends(get_read_db)):
     """Direct redirect endpoint for short URLs"""
     try:
-        # Look for link with this short code
-        stmt = select(LinkTable).where(LinkTable.short_url.like(f"%{short_code}%"))
-        result = await db.execute(stmt)
-        link = result.scalar_one_or_none()
-        
-        if not link or not link.is_active:
-            raise HTTPException(status_code=404, detail="Link not found or inactive")
-            
-        # Increment click count
-        update_stmt = update(LinkTable).where(LinkTable.id == link.id).values(
-            clicks=link.clicks + 1,
-            updated_at=datetime.utcnow()
-        )
-        await db.execute(update_stmt)
-        await db.commit()
-        
-        # Log analytics
-        analytics_record = AnalyticsTable(
-            id=str(uuid.uuid4()),
-            link_id=link.id,
-            short_url=link.short_url,
-            original_url=link.original_url,
-            clicks=1,
-            unique_clicks=1,
-            click_date=datetime.utcnow(),
-            created_at=datetime.utcnow()
-        )
-        db.add(analytics_record)
-        await db.commit()
-        
-        # Redirect to original URL
-        return RedirectResponse(url=link.original_url, status_code=302)
+        return await resolve_redirect(short_code, request, db)
         
     except HTTPException:
         raise
@@ -989,6 +1543,14 @@ async def direct_redirect(short_code: str, db: AsyncSession = Depends(get_db)):
 # Include the router in the main app
 app.include_router(api_router)
 
+# Token bucket rate limiting per route group (added before CORS so 429s still carry CORS headers)
+if RATE_LIMIT_ENABLED:
+    app.add_middleware(RateLimitMiddleware)
+
+# Clients that just wrote read from the primary for a few seconds (replica lag)
+if REPLICA_ENABLED and READ_YOUR_WRITES_SECONDS > 0:
+    app.add_middleware(ReadYourWritesMiddleware)
+
 app.add_middleware(
     CORSMiddleware,
     allow_credentials=True,
@@ -1006,94 +1568,39 @@ logger = logging.getLogger(__name__)
 
 @app.on_event("startup")
 async def startup_event():
-    """Create database tables on startup and seed sample data"""
+    """Start the background workers; the schema is managed out of band (manage.py migrate)"""
     try:
-        await create_tables()
-        logger.info("Database tables created successfully")
+        # Load monthly click counters and start persisting them periodically
+        await click_quota_tracker.start()
+        logger.info("Click quota tracker started")
+        
+        # Materialized admin metrics, refreshed in the background
+        platform_metrics_refresher.start()
+        
+        # Batched, enriched click recording
+        await asyncio.to_thread(geo_enricher.load)
+        analytics_pipeline.start()
+        logger.info("Analytics pipeline started")
+        
+        # Drop local cache entries other workers invalidated
+        shared_cache.start()
         
-        # Seed sample users for testing
-        await seed_sample_data()
-        logger.info("Sample data seeded successfully")
+        # Preload the hottest links so a fresh worker does not send its first redirects to the database
+        await warm_redirect_cache()
         
     except Exception as e:
         logger.error(f"Error during startup: {e}")
 
-async def seed_sample_data():
-    """Seed sample users for testing"""
-    try:
-        async with AsyncSessionLocal() as db:
-            # Check if users already exist
-            stmt = select(UserTable).limit(1)
-            result = await db.execute(stmt)
-            existing_user = result.scalar_one_or_none()
-            
-            if not existing_user:
-                # Create sample users
-                sample_users = [
-                    UserTable(
-                        id=str(uuid.uuid4()),
-                        email='john@example.com',
-                        name='John Doe',
-                        user_type='customer',
-                        plan_type='basic',
-                        max_links=5,
-                        links_created=0,
-                        is_active=True,
-                        created_at=datetime.utcnow(),
-                        updated_at=datetime.utcnow()
-                    ),
-                    UserTable(
-                        id=str(uuid.uuid4()),
-                        email='sarah@example.com',
-                        name='Sarah Wilson',
-                        user_type='customer',
-                        plan_type='pro',
-                        max_links=100,
-                        links_created=0,
-                        is_active=True,
-                        created_at=datetime.utcnow(),
-                        updated_at=datetime.utcnow()
-                    ),
-                    UserTable(
-                        id=str(uuid.uuid4()),
-                        email='admin@linkly.com',
-                        name='Admin User',
-                        user_type='admin',
-                        plan_type='pro',
-                        max_links=1000,
-                        links_created=0,
-                        is_active=True,
-                        created_at=datetime.utcnow(),
-                        updated_at=datetime.utcnow()
-                    ),
-                    UserTable(
-                        id=str(uuid.uuid4()),
-                        email='mike@example.com',
-                        name='Mike Johnson',
-                        user_type='customer',
-                        plan_type='basic',
-                        max_links=5,
-                        links_created=0,
-                        is_active=False,
-                        created_at=datetime.utcnow(),
-                        updated_at=datetime.utcnow()
-                    )
-                ]
-                
-                for user in sample_users:
-                    db.add(user)
-                
-                await db.commit()
-                logger.info("Sample users created successfully")
-                
-    except Exception as e:
-        logger.error(f"Error seeding sample data: {e}")
-
 @app.on_event("shutdown")
 async def shutdown_event():
     """Close database connections on shutdown"""
     try:
-        await engine.dispose()
+        await platform_metrics_refresher.stop()
+        await analytics_pipeline.stop()
+        await click_quota_tracker.stop()
+        await shared_cache.stop()
+        await link_shards.dispose()
+        await dispose_engines()
         logger.info("Database connections closed")
     except Exception as e:
         logger.error(f"Error closing database connections: {e}")
\ No newline at end of file
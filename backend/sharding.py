@@ -0,0 +1,182 @@
+from sqlalchemy import MetaData
+from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
+from sqlalchemy.orm import sessionmaker
+from database import engine, AsyncSessionLocal, LinkTable, AnalyticsTable, DATABASE_URL, _async_url
+from contextlib import asynccontextmanager
+from typing import Any, Awaitable, Callable, List, Optional, Sequence
+import asyncio
+import json
+import logging
+import os
+import zlib
+
+logger = logging.getLogger(__name__)
+
+# Short codes hash into a fixed number of buckets; the shard map assigns buckets
+# to databases, so moving a bucket range never changes any code's bucket
+SHARD_BUCKETS = 1024
+
+# JSON shard map: {"shards": [{"url": "...", "buckets": [first, last]}, ...]};
+# shards without "buckets" share the remaining buckets evenly
+LINK_SHARD_MAP = os.getenv("LINK_SHARD_MAP")
+# Shorthand: comma-separated shard URLs with the buckets split evenly
+LINK_SHARD_URLS = os.getenv("LINK_SHARD_URLS")
+
+# Tables stored on the shards; everything else stays on the primary
+SHARDED_TABLES = (LinkTable.__table__, AnalyticsTable.__table__)
+
+# Shards run their own migration chain (links and analytics only) with the main alembic.ini
+BACKEND_DIR = os.path.dirname(os.path.abspath(__file__))
+ALEMBIC_INI = os.path.join(BACKEND_DIR, "alembic.ini")
+SHARD_MIGRATIONS_DIR = os.path.join(BACKEND_DIR, "migrations", "shard_versions")
+
+def bucket_for_code(short_code: str) -> int:
+    return zlib.crc32(short_code.encode("utf-8")) % SHARD_BUCKETS
+
+class Shard:
+    __slots__ = ("index", "url", "engine", "session_factory", "is_primary")
+    
+    def __init__(self, index: int, url: Optional[str]):
+        self.index = index
+        self.url = _async_url(url) if url else DATABASE_URL
+        # A shard pointing at the primary database shares its engine and, on request, its session
+        self.is_primary = self.url == DATABASE_URL
+        self.engine = engine if self.is_primary else create_async_engine(self.url, echo=True)
+        self.session_factory = AsyncSessionLocal if self.is_primary else sessionmaker(
+            self.engine, class_=AsyncSession, expire_on_commit=False
+        )
+
+class ShardMap:
+    """Places links and their analytics on databases by a hash of the short code
+    
+    The bucket -> shard table is built once in memory, so routing a code is a
+    CRC32 and a list index with no lookup. Queries that are not keyed by short
+    code (by user, by link id, platform totals) fan out to every shard in
+    parallel and merge. Without configuration there is one shard, the primary
+    database, and every call site behaves as before.
+    """
+    
+    def __init__(self, shards: Sequence[Shard], bucket_map: Sequence[int]):
+        if len(bucket_map) != SHARD_BUCKETS:
+            raise ValueError(f"Shard map must assign all {SHARD_BUCKETS} buckets")
+        self.shards = list(shards)
+        self.bucket_map = list(bucket_map)
+    
+    @classmethod
+    def from_config(cls, config: Optional[dict]) -> "ShardMap":
+        """Build from {"shards": [{"url", "buckets"?: [first, last]}]}; None means the primary only"""
+        entries = (config or {}).get("shards") or [{"url": None}]
+        shards = [Shard(index, entry.get("url")) for index, entry in enumerate(entries)]
+        
+        bucket_map: List[Optional[int]] = [None] * SHARD_BUCKETS
+        for shard, entry in zip(shards, entries):
+            if entry.get("buckets"):
+                first, last = entry["buckets"]
+                if not 0 <= first <= last < SHARD_BUCKETS:
+                    raise ValueError(
+                        f"Shard {shard.index} buckets [{first}, {last}] must satisfy 0 <= first <= last < {SHARD_BUCKETS}"
+                    )
+                for bucket in range(first, last + 1):
+                    if bucket_map[bucket] is not None:
+                        raise ValueError(f"Shard {shard.index} buckets [{first}, {last}] overlap shard {bucket_map[bucket]} at bucket {bucket}")
+                    bucket_map[bucket] = shard.index
+        
+        unassigned = [bucket for bucket, shard in enumerate(bucket_map) if shard is None]
+        evenly = [shard.index for shard, entry in zip(shards, entries) if not entry.get("buckets")]
+        if unassigned and not evenly:
+            raise ValueError(f"Shard map leaves {len(unassigned)} bucket(s) unassigned")
+        for position, bucket in enumerate(unassigned):
+            bucket_map[bucket] = evenly[position * len(evenly) // len(unassigned)]
+        return cls(shards, bucket_map)
+    
+    @classmethod
+    def from_env(cls) -> "ShardMap":
+        if LINK_SHARD_MAP:
+            with open(LINK_SHARD_MAP) as f:
+                return cls.from_config(json.load(f))
+        if LINK_SHARD_URLS:
+            return cls.from_config({"shards": [{"url": url.strip()} for url in LINK_SHARD_URLS.split(",") if url.strip()]})
+        return cls.from_config(None)
+    
+    @property
+    def sharded(self) -> bool:
+        return len(self.shards) > 1 or not self.shards[0].is_primary
+    
+    def shard_for_code(self, short_code: str) -> int:
+        return self.bucket_map[bucket_for_code(short_code)]
+    
+    @asynccontextmanager
+    async def session(self, shard: int, db: Optional[AsyncSession] = None):
+        """A session on a shard; `db` itself when given and the shard is the primary
+        
+        Reusing the caller's session keeps unsharded writes in one transaction
+        and unsharded reads on whatever database get_read_db picked. Callers
+        commit a separate shard session themselves (see is_separate).
+        """
+        if db is not None and self.shards[shard].is_primary:
+            yield db
+            return
+        async with self.shards[shard].session_factory() as session:
+            yield session
+    
+    @staticmethod
+    def is_separate(session: AsyncSession, db: Optional[AsyncSession]) -> bool:
+        return session is not db
+    
+    async def fan_out(self, run: Callable[[AsyncSession], Awaitable[Any]], db: Optional[AsyncSession] = None) -> List[Any]:
+        """Run `run(session)` on every shard in parallel, results in shard order"""
+        async def on_shard(shard: int):
+            async with self.session(shard, db) as session:
+                return await run(session)
+        
+        if len(self.shards) == 1:
+            return [await on_shard(0)]
+        return list(await asyncio.gather(*(on_shard(shard.index) for shard in self.shards)))
+    
+    async def find_shard(self, run: Callable[[AsyncSession], Awaitable[Any]], db: Optional[AsyncSession] = None):
+        """(shard, result) for the first shard where `run` returns something other than None"""
+        for shard, result in enumerate(await self.fan_out(run, db)):
+            if result is not None:
+                return shard, result
+        return None, None
+    
+    def shard_metadata(self) -> MetaData:
+        """The sharded tables, without foreign keys to tables that live on the primary"""
+        metadata = MetaData()
+        names = {table.name for table in SHARDED_TABLES}
+        for table in SHARDED_TABLES:
+            copy = table.to_metadata(metadata)
+            for constraint in list(copy.foreign_key_constraints):
+                if constraint.elements[0].target_fullname.split(".")[0] not in names:
+                    copy.constraints.discard(constraint)
+                    for element in constraint.elements:
+                        element.parent.foreign_keys.discard(element)
+                        copy.foreign_keys.discard(element)
+        return metadata
+    
+    def upgrade_schemas(self, revision: str = "head"):
+        """Run the shard migration chain on every non-primary shard
+        
+        The primary gets links and analytics from the main chain. Alembic runs
+        its own event loop, so call this outside of one.
+        """
+        from alembic import command
+        from alembic.config import Config
+        
+        metadata = self.shard_metadata()
+        for shard in self.shards:
+            if shard.is_primary:
+                continue
+            config = Config(ALEMBIC_INI)
+            config.set_main_option("version_locations", SHARD_MIGRATIONS_DIR)
+            config.attributes["database_url"] = shard.url
+            config.attributes["target_metadata"] = metadata
+            command.upgrade(config, revision)
+            logger.info(f"Shard {shard.index} schema is up to date")
+    
+    async def dispose(self):
+        for shard in self.shards:
+            if not shard.is_primary:
+                await shard.engine.dispose()
+
+link_shards = ShardMap.from_env()
@@ -0,0 +1,231 @@
+from abc import ABC, abstractmethod
+from typing import Any, AsyncIterator, Callable, Dict, Optional, Tuple
+import asyncio
+import json
+import logging
+import os
+import time
+import uuid
+
+logger = logging.getLogger(__name__)
+
+# =====================================================
+# SHARED CACHE CONFIGURATION
+# =====================================================
+
+# Redis-protocol store shared by all workers; unset keeps every cache per process
+SHARED_CACHE_REDIS_URL = os.getenv("SHARED_CACHE_REDIS_URL")
+SHARED_CACHE_PREFIX = os.getenv("SHARED_CACHE_PREFIX", "linkly:cache:")
+# Workers drop their local copy of a key when a message naming it arrives here
+SHARED_CACHE_CHANNEL = os.getenv("SHARED_CACHE_CHANNEL", "linkly:cache:invalidate")
+
+# =====================================================
+# BACKENDS
+# =====================================================
+
+class SharedCacheBackend(ABC):
+    """Interface of shared cache stores: string values with a TTL, plus pub/sub"""
+    
+    @abstractmethod
+    async def get(self, key: str) -> Optional[str]:
+        ...
+    
+    @abstractmethod
+    async def set(self, key: str, value: str, ttl_seconds: float):
+        ...
+    
+    @abstractmethod
+    async def delete(self, key: str):
+        ...
+    
+    @abstractmethod
+    async def publish(self, channel: str, message: str):
+        ...
+    
+    @abstractmethod
+    def listen(self, channel: str) -> AsyncIterator[str]:
+        """Messages published to `channel`, as an async iterator"""
+    
+    async def close(self):
+        pass
+
+class InMemorySharedCacheBackend(SharedCacheBackend):
+    """Stand-in for Redis within one process, for tests and local development
+    
+    Several SharedCache instances given the same backend behave like workers
+    sharing one Redis: they see each other's values and every published
+    message reaches every listener.
+    """
+    
+    def __init__(self):
+        # key -> (value, expiry on the monotonic clock)
+        self._values: Dict[str, Tuple[str, float]] = {}
+        self._listeners: Dict[str, list] = {}
+    
+    async def get(self, key: str) -> Optional[str]:
+        entry = self._values.get(key)
+        if entry is None:
+            return None
+        if entry[1] < time.monotonic():
+            del self._values[key]
+            return None
+        return entry[0]
+    
+    async def set(self, key: str, value: str, ttl_seconds: float):
+        self._values[key] = (value, time.monotonic() + ttl_seconds)
+    
+    async def delete(self, key: str):
+        self._values.pop(key, None)
+    
+    async def publish(self, channel: str, message: str):
+        for queue in self._listeners.get(channel, []):
+            queue.put_nowait(message)
+    
+    async def listen(self, channel: str) -> AsyncIterator[str]:
+        queue: asyncio.Queue = asyncio.Queue()
+        self._listeners.setdefault(channel, []).append(queue)
+        try:
+            while True:
+                yield await queue.get()
+        finally:
+            self._listeners[channel].remove(queue)
+
+class RedisSharedCacheBackend(SharedCacheBackend):
+    """Values and invalidations through a Redis-protocol store
+    
+    Takes any redis.asyncio-compatible client.
+    """
+    
+    def __init__(self, client, prefix: str = SHARED_CACHE_PREFIX):
+        self.client = client
+        self.prefix = prefix
+    
+    async def get(self, key: str) -> Optional[str]:
+        value = await self.client.get(self.prefix + key)
+        return value.decode("utf-8") if isinstance(value, bytes) else value
+    
+    async def set(self, key: str, value: str, ttl_seconds: float):
+        await self.client.set(self.prefix + key, value, px=max(1, int(ttl_seconds * 1000)))
+    
+    async def delete(self, key: str):
+        await self.client.delete(self.prefix + key)
+    
+    async def publish(self, channel: str, message: str):
+        await self.client.publish(channel, message)
+    
+    async def listen(self, channel: str) -> AsyncIterator[str]:
+        pubsub = self.client.pubsub()
+        await pubsub.subscribe(channel)
+        try:
+            async for message in pubsub.listen():
+                if message["type"] == "message":
+                    data = message["data"]
+                    yield data.decode("utf-8") if isinstance(data, bytes) else data
+        finally:
+            await pubsub.aclose()
+    
+    async def close(self):
+        await self.client.aclose()
+
+def create_shared_cache_backend() -> Optional[SharedCacheBackend]:
+    """Backend from configuration: None (local caches only) unless SHARED_CACHE_REDIS_URL is set"""
+    if SHARED_CACHE_REDIS_URL:
+        import redis.asyncio as redis
+        return RedisSharedCacheBackend(redis.from_url(SHARED_CACHE_REDIS_URL))
+    return None
+
+# =====================================================
+# SHARED TIER
+# =====================================================
+
+class SharedCache:
+    """Second cache tier behind the per-process caches, with invalidation fan-out
+    
+    Local caches register a namespace and a callback dropping one of their
+    keys. A miss in a local cache falls through to get(); values loaded from
+    the database are published with set(). invalidate() deletes the shared
+    value and broadcasts the key, so every other worker drops its local copy.
+    Store errors are logged and treated as misses: the database stays the
+    source of truth and requests never fail because the cache is down.
+    """
+    
+    def __init__(self, backend: Optional[SharedCacheBackend] = None, channel: str = SHARED_CACHE_CHANNEL):
+        self.backend = backend
+        self.channel = channel
+        # Lets a worker skip its own broadcasts; it already dropped the key
+        self.origin = uuid.uuid4().hex
+        self._handlers: Dict[str, Callable[[str], None]] = {}
+        self._task: Optional[asyncio.Task] = None
+    
+    @property
+    def enabled(self) -> bool:
+        return self.backend is not None
+    
+    def register(self, namespace: str, on_invalidate: Callable[[str], None]):
+        """Route broadcast invalidations of `namespace` keys to a local cache"""
+        self._handlers[namespace] = on_invalidate
+    
+    async def get(self, namespace: str, key: str) -> Optional[Any]:
+        if self.backend is None:
+            return None
+        try:
+            value = await self.backend.get(f"{namespace}:{key}")
+        except Exception as e:
+            logger.warning(f"Shared cache read failed for {namespace}:{key}: {e}")
+            return None
+        return json.loads(value) if value is not None else None
+    
+    async def set(self, namespace: str, key: str, value: Any, ttl_seconds: float):
+        if self.backend is None:
+            return
+        try:
+            await self.backend.set(f"{namespace}:{key}", json.dumps(value, default=str), ttl_seconds)
+        except Exception as e:
+            logger.warning(f"Shared cache write failed for {namespace}:{key}: {e}")
+    
+    async def invalidate(self, namespace: str, key: str):
+        """Delete the shared value and tell every worker to drop its local copy"""
+        if self.backend is None:
+            return
+        try:
+            await self.backend.delete(f"{namespace}:{key}")
+            await self.backend.publish(self.channel, f"{self.origin} {namespace} {key}")
+        except Exception as e:
+            logger.warning(f"Shared cache invalidation failed for {namespace}:{key}: {e}")
+    
+    def start(self):
+        if self.backend is not None and self._task is None:
+            self._task = asyncio.create_task(self._listen())
+            logger.info("Shared cache invalidation listener started")
+    
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        if self.backend is not None:
+            await self.backend.close()
+    
+    async def _listen(self):
+        while True:
+            try:
+                async for message in self.backend.listen(self.channel):
+                    self._dispatch(message)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Shared cache invalidation listener failed, resubscribing: {e}")
+                await asyncio.sleep(1)
+    
+    def _dispatch(self, message: str):
+        origin, namespace, key = message.split(" ", 2)
+        if origin == self.origin:
+            return
+        handler = self._handlers.get(namespace)
+        if handler is not None:
+            handler(key)
+
+shared_cache = SharedCache(create_shared_cache_backend())
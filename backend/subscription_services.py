@@ -0,0 +1,261 @@
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy import select, update, func, case
+from database import UserTable
+from models import PlanType, PlanLimits, SubscriptionPlan
+from shared_cache import SharedCache, shared_cache
+from typing import Dict, List, Optional
+from collections import OrderedDict
+import logging
+import os
+import time
+
+logger = logging.getLogger(__name__)
+
+# =====================================================
+# PLAN CATALOG (built once per process)
+# =====================================================
+
+PLAN_CATALOG: Dict[PlanType, SubscriptionPlan] = {
+    PlanType.BASIC: SubscriptionPlan(
+        name="Basic",
+        plan_type=PlanType.BASIC,
+        price_monthly=0.0,
+        price_yearly=0.0,
+        limits=PlanLimits(
+            max_links=5,
+            max_clicks_per_month=1000,
+            custom_domains=False,
+            analytics_retention_days=30,
+            api_access=False,
+            ads_free=False
+        ),
+        features=[
+            "Up to 5 shortened links",
+            "Basic analytics (30 days)",
+            "Standard support",
+            "QR code generation"
+        ]
+    ),
+    PlanType.PRO: SubscriptionPlan(
+        name="Pro",
+        plan_type=PlanType.PRO,
+        price_monthly=9.99,
+        price_yearly=99.99,
+        limits=PlanLimits(
+            max_links=100,
+            max_clicks_per_month=100000,
+            custom_domains=True,
+            analytics_retention_days=365,
+            api_access=True,
+            ads_free=True
+        ),
+        features=[
+            "Up to 100 shortened links",
+            "Advanced analytics (365 days)",
+            "Priority support",
+            "Custom domains",
+            "Ad-free experience",
+            "API access",
+            "Advanced QR code styling",
+            "Bulk operations"
+        ]
+    )
+}
+
+PLAN_LIST: List[SubscriptionPlan] = list(PLAN_CATALOG.values())
+
+def get_plan(plan_type: str) -> SubscriptionPlan:
+    """Get a plan from the catalog, falling back to Basic for unknown plan types"""
+    try:
+        return PLAN_CATALOG[PlanType(plan_type)]
+    except ValueError:
+        return PLAN_CATALOG[PlanType.BASIC]
+
+def get_plan_limits(plan_type: str) -> PlanLimits:
+    """Get the limits of a plan"""
+    return get_plan(plan_type).limits
+
+# A user's link quota in SQL: their own max_links, or their plan's limit when it is NULL
+# (rows created before the column was filled in), with the same Basic fallback as get_plan
+EFFECTIVE_MAX_LINKS = func.coalesce(
+    UserTable.max_links,
+    case(
+        {plan_type.value: plan.limits.max_links for plan_type, plan in PLAN_CATALOG.items()},
+        value=UserTable.plan_type,
+        else_=PLAN_CATALOG[PlanType.BASIC].limits.max_links
+    )
+)
+
+# =====================================================
+# PER-USER ENTITLEMENT CACHE
+# =====================================================
+
+ENTITLEMENT_CACHE_TTL_SECONDS = float(os.getenv("ENTITLEMENT_CACHE_TTL_SECONDS", "300"))
+ENTITLEMENT_CACHE_MAX_ENTRIES = int(os.getenv("ENTITLEMENT_CACHE_MAX_ENTRIES", "100000"))
+
+class Entitlement:
+    """What a user may do right now: plan, link quota and current usage"""
+    
+    __slots__ = ("user_id", "plan_type", "max_links", "links_created", "is_active", "expires_at")
+    
+    def __init__(self, user_id: str, plan_type: str, max_links: int, links_created: int, is_active: bool, expires_at: float):
+        self.user_id = user_id
+        self.plan_type = plan_type
+        self.max_links = max_links
+        self.links_created = links_created
+        self.is_active = is_active
+        self.expires_at = expires_at
+    
+    @property
+    def limits(self) -> PlanLimits:
+        return get_plan_limits(self.plan_type)
+    
+    @property
+    def can_create_link(self) -> bool:
+        return self.links_created < self.max_links
+
+class EntitlementCache:
+    """Per-process LRU cache of user entitlements, backed by the shared cache
+    
+    Entries are loaded from the shared tier or UserTable on a miss and kept
+    for a TTL. Anything that changes a user's plan, quota or usage must update
+    or invalidate the entry, so the hot paths (link creation, limit checks)
+    skip the database.
+    """
+    
+    namespace = "entitlement"
+    
+    def __init__(
+        self,
+        ttl_seconds: float = ENTITLEMENT_CACHE_TTL_SECONDS,
+        max_entries: int = ENTITLEMENT_CACHE_MAX_ENTRIES,
+        shared: SharedCache = shared_cache
+    ):
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self.shared = shared
+        self._entries: "OrderedDict[str, Entitlement]" = OrderedDict()
+        shared.register(self.namespace, self.drop_local)
+    
+    def get_cached(self, user_id: str) -> Optional[Entitlement]:
+        """Get a cached entitlement without touching the database"""
+        entitlement = self._entries.get(user_id)
+        if entitlement is None:
+            return None
+        if entitlement.expires_at < time.monotonic():
+            del self._entries[user_id]
+            return None
+        self._entries.move_to_end(user_id)
+        return entitlement
+    
+    async def get(self, db: AsyncSession, user_id: str) -> Optional[Entitlement]:
+        """Get a user's entitlement, loading it on a cache miss"""
+        entitlement = self.get_cached(user_id)
+        if entitlement is not None:
+            return entitlement
+        
+        shared = await self.shared.get(self.namespace, user_id)
+        if shared is not None:
+            return self.set(user_id, **shared)
+        
+        stmt = select(
+            UserTable.plan_type, UserTable.max_links, UserTable.links_created, UserTable.is_active
+        ).where(UserTable.id == user_id)
+        result = await db.execute(stmt)
+        user_row = result.fetchone()
+        
+        if not user_row:
+            return None
+        
+        return await self.store(
+            user_id,
+            plan_type=user_row.plan_type,
+            max_links=user_row.max_links,
+            links_created=user_row.links_created or 0,
+            is_active=user_row.is_active
+        )
+    
+    async def store(self, user_id: str, plan_type: str, max_links: Optional[int], links_created: int, is_active: bool = True) -> Entitlement:
+        """Cache an entitlement read from (or just written to) the database, in both tiers"""
+        entitlement = self.set(user_id, plan_type, max_links, links_created, is_active)
+        await self.shared.set(self.namespace, user_id, {
+            "plan_type": entitlement.plan_type,
+            "max_links": entitlement.max_links,
+            "links_created": entitlement.links_created,
+            "is_active": entitlement.is_active,
+        }, self.ttl_seconds)
+        return entitlement
+    
+    def set(self, user_id: str, plan_type: str, max_links: Optional[int], links_created: int, is_active: bool = True) -> Entitlement:
+        """Store a user's entitlement in this process only"""
+        if max_links is None:
+            max_links = get_plan_limits(plan_type).max_links
+        
+        entitlement = Entitlement(
+            user_id=user_id,
+            plan_type=plan_type,
+            max_links=max_links,
+            links_created=links_created,
+            is_active=is_active,
+            expires_at=time.monotonic() + self.ttl_seconds
+        )
+        self._entries[user_id] = entitlement
+        self._entries.move_to_end(user_id)
+        
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+        
+        return entitlement
+    
+    async def record_link_created(self, user_id: str):
+        """Count a new link against a cached entitlement; other workers reload theirs"""
+        entitlement = self._entries.get(user_id)
+        if entitlement is not None:
+            entitlement.links_created += 1
+        await self.shared.invalidate(self.namespace, user_id)
+    
+    async def invalidate(self, user_id: str):
+        """Drop a user's cached entitlement everywhere after their plan or quota changed"""
+        self.drop_local(user_id)
+        await self.shared.invalidate(self.namespace, user_id)
+    
+    def drop_local(self, user_id: str):
+        self._entries.pop(user_id, None)
+    
+    def clear(self):
+        self._entries.clear()
+
+entitlement_cache = EntitlementCache()
+
+async def reserve_link_quota(db: AsyncSession, user_id: str) -> Optional[Entitlement]:
+    """Atomically count one more link against a user's quota
+    
+    A single conditional UPDATE both checks and increments, so concurrent
+    requests can never push links_created past max_links. Runs inside the
+    caller's transaction: commit it together with the link insert, or roll
+    back to release the reservation. Returns None when the user is at their
+    limit or does not exist. The returned entitlement is not cached; store
+    it in entitlement_cache once the transaction has committed.
+    """
+    stmt = update(UserTable).where(
+        UserTable.id == user_id,
+        func.coalesce(UserTable.links_created, 0) < EFFECTIVE_MAX_LINKS
+    ).values(
+        links_created=func.coalesce(UserTable.links_created, 0) + 1
+    ).returning(
+        UserTable.plan_type, EFFECTIVE_MAX_LINKS.label("max_links"), UserTable.links_created, UserTable.is_active
+    )
+    result = await db.execute(stmt)
+    user_row = result.fetchone()
+    
+    if not user_row:
+        return None
+    
+    return Entitlement(
+        user_id=user_id,
+        plan_type=user_row.plan_type,
+        max_links=user_row.max_links,
+        links_created=user_row.links_created,
+        is_active=user_row.is_active,
+        expires_at=time.monotonic() + entitlement_cache.ttl_seconds
+    )
@@ -0,0 +1,65 @@
+from typing import List, NamedTuple, Optional
+from functools import lru_cache
+import os
+import re
+
+# Distinct user agents remembered by the parser; real traffic repeats a small set heavily
+UA_PARSE_CACHE_SIZE = int(os.getenv("UA_PARSE_CACHE_SIZE", "20000"))
+
+class UserAgentInfo(NamedTuple):
+    device_type: Optional[str]
+    browser: Optional[str]
+    os: Optional[str]
+
+UNKNOWN_USER_AGENT = UserAgentInfo(None, None, None)
+
+# First match wins, so more specific tokens come before the engines they build on
+BROWSER_PATTERNS = [
+    (re.compile(r"edg(?:e|a|ios)?/"), "Edge"),
+    (re.compile(r"opr/|opera|opios/"), "Opera"),
+    (re.compile(r"samsungbrowser/"), "Samsung Internet"),
+    (re.compile(r"yabrowser/"), "Yandex Browser"),
+    (re.compile(r"ucbrowser/"), "UC Browser"),
+    (re.compile(r"fban|fbav|instagram"), "In-App Browser"),
+    (re.compile(r"firefox/|fxios/"), "Firefox"),
+    (re.compile(r"chrome/|crios/|chromium/"), "Chrome"),
+    (re.compile(r"msie |trident/"), "Internet Explorer"),
+    (re.compile(r"version/[\d.]+.*safari/|mobile/\w+ safari"), "Safari"),
+]
+
+OS_PATTERNS = [
+    (re.compile(r"windows phone"), "Windows Phone"),
+    (re.compile(r"windows"), "Windows"),
+    (re.compile(r"iphone|ipad|ipod"), "iOS"),
+    (re.compile(r"android"), "Android"),
+    (re.compile(r"\bcros\b"), "Chrome OS"),
+    (re.compile(r"mac os x|macintosh"), "macOS"),
+    (re.compile(r"linux|x11"), "Linux"),
+]
+
+TABLET_PATTERN = re.compile(r"ipad|tablet|kindle|silk/|playbook")
+MOBILE_PATTERN = re.compile(r"mobi|iphone|ipod|android|windows phone|blackberry|opera mini")
+
+@lru_cache(maxsize=UA_PARSE_CACHE_SIZE)
+def parse_user_agent(user_agent: str) -> UserAgentInfo:
+    """Device type, browser and OS family of a user agent string (memoised)"""
+    ua = user_agent.lower()
+    
+    browser = next((name for pattern, name in BROWSER_PATTERNS if pattern.search(ua)), "Other")
+    os_name = next((name for pattern, name in OS_PATTERNS if pattern.search(ua)), "Other")
+    
+    # Android tablets are the Android devices that do not advertise "Mobile"
+    if TABLET_PATTERN.search(ua) or ("android" in ua and "mobile" not in ua):
+        device_type = "tablet"
+    elif MOBILE_PATTERN.search(ua):
+        device_type = "mobile"
+    else:
+        device_type = "desktop"
+    
+    return UserAgentInfo(device_type, browser, os_name)
+
+def enrich_user_agents(events: List) -> None:
+    """Analytics pipeline stage: fill device_type, browser and os from the raw user agent"""
+    for event in events:
+        info = parse_user_agent(event.user_agent) if event.user_agent else UNKNOWN_USER_AGENT
+        event.device_type, event.browser, event.os = info
@@ -0,0 +1,281 @@
+from models import ImportType, ChunkedUploadStatus
+from typing import List, Optional, AsyncIterator
+from pathlib import Path
+from datetime import datetime, timedelta
+import aiofiles
+import aiofiles.os
+import asyncio
+import hashlib
+import logging
+import os
+import re
+import shutil
+import uuid
+
+logger = logging.getLogger(__name__)
+
+# Chunk sizes accepted by the resumable upload protocol
+DEFAULT_CHUNK_SIZE = 8 * 1024 * 1024
+MIN_CHUNK_SIZE = 256 * 1024
+MAX_CHUNK_SIZE = 64 * 1024 * 1024
+
+# Largest file accepted through chunked uploads (default 20GB)
+MAX_UPLOAD_SIZE = int(os.getenv("MAX_UPLOAD_SIZE", str(20 * 1024 * 1024 * 1024)))
+
+# How long an unfinished upload, or a completed one that was never imported, is kept
+UPLOAD_RETENTION_HOURS = int(os.getenv("UPLOAD_RETENTION_HOURS", "24"))
+
+class ChunkedUploadService:
+    """Service for resumable chunked uploads written straight to disk
+    
+    Protocol: init -> upload chunk N (any order, retries allowed) -> complete.
+    Every in-progress upload lives in its own directory under
+    ``<upload_dir>/.partial/<upload_id>``:
+    
+    - ``manifest.json``: upload parameters and status (uploading, completed, import job)
+    - ``data.part``: the preallocated target file, chunks are written at their offsets
+    - ``chunks/<index>``: marker holding the verified SHA-256 of chunk <index>
+    
+    State is kept on disk only, so any worker can accept any chunk and an
+    interrupted client can resume by asking which chunks were received.
+    Completing moves the file into the upload directory and keeps the
+    manifest; cleanup_expired_uploads removes abandoned uploads and completed
+    files nobody imported.
+    """
+    
+    def __init__(self, upload_dir: Path):
+        self.upload_dir = Path(upload_dir)
+        self.partial_dir = self.upload_dir / ".partial"
+        self.partial_dir.mkdir(parents=True, exist_ok=True)
+    
+    def _upload_path(self, upload_id: str) -> Path:
+        # upload_id is a UUID we generated; reject anything else before touching the filesystem
+        return self.partial_dir / str(uuid.UUID(upload_id))
+    
+    @staticmethod
+    def _safe_filename(filename: str) -> str:
+        name = Path(filename).name
+        return re.sub(r'[^A-Za-z0-9._-]', '_', name) or "upload"
+    
+    async def init_upload(
+        self,
+        filename: str,
+        total_size: int,
+        import_type: ImportType,
+        created_by: str,
+        chunk_size: int = DEFAULT_CHUNK_SIZE,
+        content_type: Optional[str] = None
+    ) -> ChunkedUploadStatus:
+        """Start a new chunked upload and preallocate its target file"""
+        if total_size <= 0:
+            raise ValueError("total_size must be positive")
+        if total_size > MAX_UPLOAD_SIZE:
+            raise ValueError(f"File size exceeds {MAX_UPLOAD_SIZE} byte limit")
+        if not MIN_CHUNK_SIZE <= chunk_size <= MAX_CHUNK_SIZE:
+            raise ValueError(f"chunk_size must be between {MIN_CHUNK_SIZE} and {MAX_CHUNK_SIZE} bytes")
+        
+        upload_id = str(uuid.uuid4())
+        upload = ChunkedUploadStatus(
+            upload_id=upload_id,
+            filename=f"{upload_id}_{self._safe_filename(filename)}",
+            original_filename=filename,
+            content_type=content_type,
+            import_type=import_type,
+            created_by=created_by,
+            total_size=total_size,
+            chunk_size=chunk_size,
+            total_chunks=(total_size + chunk_size - 1) // chunk_size
+        )
+        
+        upload_path = self._upload_path(upload_id)
+        await aiofiles.os.makedirs(upload_path / "chunks", exist_ok=True)
+        
+        # Sparse preallocation so chunks can be written at any offset
+        async with aiofiles.open(upload_path / "data.part", 'wb') as f:
+            await f.truncate(total_size)
+        
+        await self._save(upload_path, upload)
+        return upload
+    
+    async def _save(self, upload_path: Path, upload: ChunkedUploadStatus):
+        # Replaced atomically so a concurrent reader never sees half a manifest
+        tmp_path = upload_path / f"manifest.json.{uuid.uuid4().hex}"
+        async with aiofiles.open(tmp_path, 'w') as f:
+            await f.write(upload.json(exclude={"received_chunks"}))
+        await aiofiles.os.replace(tmp_path, upload_path / "manifest.json")
+    
+    async def get_upload(self, upload_id: str) -> Optional[ChunkedUploadStatus]:
+        """Get upload state including the chunks received so far"""
+        try:
+            upload_path = self._upload_path(upload_id)
+        except ValueError:
+            return None
+        
+        if not await aiofiles.os.path.exists(upload_path / "manifest.json"):
+            return None
+        
+        async with aiofiles.open(upload_path / "manifest.json", 'r') as f:
+            upload = ChunkedUploadStatus.parse_raw(await f.read())
+        
+        if upload.status == "uploading":
+            upload.received_chunks = await self._received_chunks(upload_path)
+        else:
+            upload.received_chunks = list(range(upload.total_chunks))
+        return upload
+    
+    async def _received_chunks(self, upload_path: Path) -> List[int]:
+        names = await aiofiles.os.listdir(upload_path / "chunks")
+        return sorted(int(name) for name in names if name.isdigit())
+    
+    async def write_chunk(
+        self,
+        upload_id: str,
+        chunk_index: int,
+        data: AsyncIterator[bytes],
+        checksum: str
+    ) -> Optional[ChunkedUploadStatus]:
+        """Stream one chunk to its offset in the target file and verify its SHA-256
+        
+        A chunk is only marked as received once its size and checksum match;
+        a failed chunk can simply be sent again. Resending a received chunk
+        unmarks it first, so a resend that fails verification has to be
+        repeated before the upload can complete.
+        """
+        upload = await self.get_upload(upload_id)
+        if upload is None:
+            return None
+        if upload.status != "uploading":
+            raise ValueError(f"Upload is already {upload.status}")
+        if not 0 <= chunk_index < upload.total_chunks:
+            raise ValueError(f"chunk_index must be between 0 and {upload.total_chunks - 1}")
+        
+        offset = chunk_index * upload.chunk_size
+        expected_size = min(upload.chunk_size, upload.total_size - offset)
+        upload_path = self._upload_path(upload_id)
+        
+        marker_path = upload_path / "chunks" / str(chunk_index)
+        try:
+            await aiofiles.os.remove(marker_path)
+        except FileNotFoundError:
+            pass
+        
+        digest = hashlib.sha256()
+        written = 0
+        async with aiofiles.open(upload_path / "data.part", 'r+b') as f:
+            await f.seek(offset)
+            async for piece in data:
+                written += len(piece)
+                if written > expected_size:
+                    raise ValueError(f"Chunk {chunk_index} exceeds its expected size of {expected_size} bytes")
+                digest.update(piece)
+                await f.write(piece)
+        
+        if written != expected_size:
+            raise ValueError(f"Chunk {chunk_index} has {written} bytes, expected {expected_size}")
+        if digest.hexdigest() != checksum.strip().lower():
+            raise ValueError(f"Checksum mismatch for chunk {chunk_index}")
+        
+        async with aiofiles.open(marker_path, 'w') as f:
+            await f.write(digest.hexdigest())
+        
+        upload.received_chunks = await self._received_chunks(upload_path)
+        return upload
+    
+    async def complete_upload(
+        self,
+        upload_id: str,
+        checksum: Optional[str] = None
+    ) -> Optional[ChunkedUploadStatus]:
+        """Verify every chunk arrived and move the file into the upload directory"""
+        upload = await self.get_upload(upload_id)
+        if upload is None:
+            return None
+        if upload.status != "uploading":
+            raise ValueError(f"Upload is already {upload.status}")
+        
+        missing = sorted(set(range(upload.total_chunks)) - set(upload.received_chunks))
+        if missing:
+            preview = ", ".join(str(index) for index in missing[:20])
+            raise ValueError(f"Upload is missing {len(missing)} chunk(s): {preview}")
+        
+        upload_path = self._upload_path(upload_id)
+        data_path = upload_path / "data.part"
+        
+        if checksum:
+            file_checksum = await asyncio.to_thread(self._sha256_file, data_path)
+            if file_checksum != checksum.strip().lower():
+                raise ValueError("Checksum mismatch for the complete file")
+        
+        await aiofiles.os.replace(data_path, self.upload_dir / upload.filename)
+        await asyncio.to_thread(shutil.rmtree, upload_path / "chunks", True)
+        
+        upload.status = "completed"
+        upload.completed_at = datetime.utcnow()
+        await self._save(upload_path, upload)
+        return upload
+    
+    async def set_import_job(self, upload_id: str, job_id: str) -> Optional[ChunkedUploadStatus]:
+        """Record the import job started for a completed upload; each upload is imported once"""
+        upload = await self.get_upload(upload_id)
+        if upload is None:
+            return None
+        if upload.status != "completed":
+            raise ValueError("Upload is not completed yet")
+        if upload.job_id:
+            raise ValueError(f"Upload is already being imported by job {upload.job_id}")
+        
+        upload.job_id = job_id
+        await self._save(self._upload_path(upload_id), upload)
+        return upload
+    
+    async def abort_upload(self, upload_id: str) -> bool:
+        """Discard an upload, along with its file if it was completed but never imported"""
+        upload = await self.get_upload(upload_id)
+        if upload is None:
+            return False
+        if upload.job_id:
+            raise ValueError(f"Upload is being imported by job {upload.job_id}")
+        
+        await self._remove(self._upload_path(upload_id), upload)
+        return True
+    
+    async def _remove(self, upload_path: Path, upload: Optional[ChunkedUploadStatus]):
+        if upload is not None and upload.status == "completed" and not upload.job_id:
+            file_path = self.upload_dir / upload.filename
+            if await aiofiles.os.path.exists(file_path):
+                await aiofiles.os.remove(file_path)
+        await asyncio.to_thread(shutil.rmtree, upload_path, True)
+    
+    async def cleanup_expired_uploads(self) -> int:
+        """Remove uploads past their retention period; returns how many were removed
+        
+        Unfinished uploads expire UPLOAD_RETENTION_HOURS after they were
+        started and completed ones after they were completed. A completed
+        file is deleted with its upload unless an import job was started.
+        """
+        cutoff = datetime.utcnow() - timedelta(hours=UPLOAD_RETENTION_HOURS)
+        removed = 0
+        for name in await aiofiles.os.listdir(self.partial_dir):
+            upload = await self.get_upload(name)
+            upload_path = self.partial_dir / name
+            if upload is None:
+                if not await aiofiles.os.path.isdir(upload_path):
+                    continue
+                # No readable manifest: an init that never finished
+                started = datetime.utcfromtimestamp(await aiofiles.os.path.getmtime(upload_path))
+            else:
+                started = upload.completed_at or upload.created_at
+            if started > cutoff:
+                continue
+            
+            await self._remove(upload_path, upload)
+            removed += 1
+        return removed
+    
+    @staticmethod
+    def _sha256_file(path: Path, block_size: int = 1024 * 1024) -> str:
+        digest = hashlib.sha256()
+        with open(path, 'rb') as f:
+            for block in iter(lambda: f.read(block_size), b''):
+                digest.update(block)
+        return digest.hexdigest()
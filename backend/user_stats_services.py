@@ -0,0 +1,247 @@
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy import select, update, func, case, bindparam
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from database import UserTable, UserStatsTable, LinkTable
+from sharding import link_shards
+from models import UserSummary, TopLink
+from typing import Any, Dict, Iterable, List, Optional
+from datetime import datetime
+import logging
+import os
+
+logger = logging.getLogger(__name__)
+
+# Links kept in each user's top list
+USER_STATS_TOP_LINKS = int(os.getenv("USER_STATS_TOP_LINKS", "5"))
+# First key of the per-user pg advisory locks (the second is the user id's hash)
+USER_STATS_LOCK_KEY = 7320402
+
+def _top_link(link_id: str, short_url: Optional[str], title: Optional[str], clicks: Optional[int]) -> Dict[str, Any]:
+    return {"id": link_id, "short_url": short_url, "title": title, "clicks": clicks or 0}
+
+def merge_top_links(current: List[Dict[str, Any]], updates: Iterable[Dict[str, Any]], size: int = USER_STATS_TOP_LINKS) -> List[Dict[str, Any]]:
+    """Fold fresh link click totals into a top list"""
+    by_id = {link["id"]: link for link in current or []}
+    for link in updates:
+        by_id[link["id"]] = link
+    return sorted(by_id.values(), key=lambda link: link["clicks"], reverse=True)[:size]
+
+class UserStatsService:
+    """Maintains the per-user dashboard summary in user_stats
+    
+    Every change is applied as a delta on the existing row, in the caller's
+    transaction. A user without a row yet is built from links on first read
+    (rebuild), so deltas are only ever applied to complete totals.
+    
+    Rebuilds and link changes are serialized per user with lock(): a change
+    takes it before writing the link (links may commit on another shard
+    first) and holds it until the primary commits, so a rebuild counts a
+    link either with its delta applied on top or not at all.
+    """
+    
+    def __init__(self, db: AsyncSession):
+        self.db = db
+    
+    async def lock(self, user_ids: Iterable[str]):
+        """Hold the users' summary locks until the current transaction ends"""
+        # Sorted so concurrent batches cannot deadlock
+        for user_id in sorted(set(user_ids)):
+            await self.db.execute(select(func.pg_advisory_xact_lock(USER_STATS_LOCK_KEY, func.hashtext(user_id))))
+    
+    async def record_link_created(self, user_id: str, is_active: bool = True):
+        await self.lock([user_id])
+        await self.db.execute(
+            update(UserStatsTable).where(UserStatsTable.user_id == user_id).values(
+                total_links=UserStatsTable.total_links + 1,
+                active_links=UserStatsTable.active_links + (1 if is_active else 0),
+                updated_at=datetime.utcnow()
+            )
+        )
+    
+    async def record_link_toggled(self, user_id: str, is_active: bool):
+        await self.lock([user_id])
+        await self.db.execute(
+            update(UserStatsTable).where(UserStatsTable.user_id == user_id).values(
+                active_links=UserStatsTable.active_links + (1 if is_active else -1),
+                updated_at=datetime.utcnow()
+            )
+        )
+    
+    async def record_link_deleted(self, user_id: str, link_id: str, was_active: bool, clicks: int):
+        await self.lock([user_id])
+        stmt = select(UserStatsTable).where(UserStatsTable.user_id == user_id).with_for_update()
+        stats = (await self.db.execute(stmt)).scalar_one_or_none()
+        if stats is None:
+            return
+        
+        top_links = [link for link in stats.top_links or [] if link["id"] != link_id]
+        if len(top_links) < len(stats.top_links or []):
+            # The deleted link was in the top list; refill it from the remaining links
+            top_links = await self._top_links_from_links(user_id)
+        
+        await self.db.execute(
+            update(UserStatsTable).where(UserStatsTable.user_id == user_id).values(
+                total_links=UserStatsTable.total_links - 1,
+                active_links=UserStatsTable.active_links - (1 if was_active else 0),
+                total_clicks=UserStatsTable.total_clicks - (clicks or 0),
+                top_links=top_links,
+                updated_at=datetime.utcnow()
+            )
+        )
+    
+    async def record_links_imported(self, links: List[Dict[str, Any]]):
+        """Apply a batch of imported links, which arrive with their click totals"""
+        by_user: Dict[str, List[Dict[str, Any]]] = {}
+        for link in links:
+            if link.get("user_id"):
+                by_user.setdefault(link["user_id"], []).append(link)
+        if not by_user:
+            return
+        
+        await self.lock(by_user)
+        stmt = select(UserStatsTable.user_id, UserStatsTable.top_links).where(
+            UserStatsTable.user_id.in_(sorted(by_user))
+        ).order_by(UserStatsTable.user_id).with_for_update()
+        current = {row.user_id: row.top_links for row in (await self.db.execute(stmt)).fetchall()}
+        if not current:
+            return
+        
+        table = UserStatsTable.__table__
+        await self.db.execute(
+            update(table).where(table.c.user_id == bindparam("stats_user_id")).values(
+                total_links=table.c.total_links + bindparam("links_delta"),
+                active_links=table.c.active_links + bindparam("active_delta"),
+                total_clicks=table.c.total_clicks + bindparam("clicks_delta"),
+                top_links=bindparam("new_top_links", type_=table.c.top_links.type),
+                updated_at=datetime.utcnow()
+            ),
+            [
+                {
+                    "stats_user_id": user_id,
+                    "links_delta": len(user_links),
+                    "active_delta": sum(1 for link in user_links if link["is_active"]),
+                    "clicks_delta": sum(link["clicks"] or 0 for link in user_links),
+                    "new_top_links": merge_top_links(
+                        current[user_id],
+                        (_top_link(link["id"], link["short_url"], link["title"], link["clicks"]) for link in user_links)
+                    ),
+                }
+                for user_id, user_links in by_user.items()
+                if user_id in current
+            ]
+        )
+    
+    async def record_clicks(self, clicks_by_link: Dict[str, int], links: Optional[List] = None):
+        """Apply a batch of link click deltas (from the analytics flusher)
+        
+        `links` are the clicked links' (id, user_id, short_url, title, clicks)
+        rows when the caller already read them from their shards. A caller
+        committing clicks on a separate shard takes lock() for the owners first.
+        """
+        if links is None:
+            links = (await self.db.execute(
+                select(LinkTable.id, LinkTable.user_id, LinkTable.short_url, LinkTable.title, LinkTable.clicks).where(
+                    LinkTable.id.in_(list(clicks_by_link)),
+                    LinkTable.user_id.isnot(None)
+                )
+            )).fetchall()
+        if not links:
+            return
+        
+        by_user: Dict[str, List] = {}
+        for link in links:
+            by_user.setdefault(link.user_id, []).append(link)
+        
+        await self.lock(by_user)
+        # Sorted lock order so concurrent flushers cannot deadlock
+        stmt = select(UserStatsTable.user_id, UserStatsTable.top_links).where(
+            UserStatsTable.user_id.in_(sorted(by_user))
+        ).order_by(UserStatsTable.user_id).with_for_update()
+        current = {row.user_id: row.top_links for row in (await self.db.execute(stmt)).fetchall()}
+        if not current:
+            return
+        
+        table = UserStatsTable.__table__
+        await self.db.execute(
+            update(table).where(table.c.user_id == bindparam("stats_user_id")).values(
+                total_clicks=table.c.total_clicks + bindparam("delta"),
+                top_links=bindparam("new_top_links", type_=table.c.top_links.type),
+                updated_at=datetime.utcnow()
+            ),
+            [
+                {
+                    "stats_user_id": user_id,
+                    "delta": sum(clicks_by_link[link.id] for link in user_links),
+                    "new_top_links": merge_top_links(
+                        current[user_id],
+                        (_top_link(link.id, link.short_url, link.title, link.clicks) for link in user_links)
+                    ),
+                }
+                for user_id, user_links in by_user.items()
+                if user_id in current
+            ]
+        )
+    
+    async def _top_links_from_links(self, user_id: str) -> List[Dict[str, Any]]:
+        stmt = select(LinkTable.id, LinkTable.short_url, LinkTable.title, LinkTable.clicks).where(
+            LinkTable.user_id == user_id
+        ).order_by(LinkTable.clicks.desc().nullslast()).limit(USER_STATS_TOP_LINKS)
+        
+        async def on_shard(db: AsyncSession):
+            return [_top_link(*row) for row in (await db.execute(stmt)).fetchall()]
+        
+        return merge_top_links([], (link for links in await link_shards.fan_out(on_shard, self.db) for link in links))
+    
+    async def rebuild(self, user_id: str) -> Optional[UserStatsTable]:
+        """Recompute a user's summary from their links"""
+        await self.lock([user_id])
+        user = (await self.db.execute(select(UserTable.id).where(UserTable.id == user_id))).scalar_one_or_none()
+        if user is None:
+            return None
+        
+        stmt = select(
+            func.count(LinkTable.id),
+            func.count(case((LinkTable.is_active.is_(True), 1))),
+            func.coalesce(func.sum(LinkTable.clicks), 0)
+        ).where(LinkTable.user_id == user_id)
+        
+        async def on_shard(db: AsyncSession):
+            return (await db.execute(stmt)).one()
+        
+        totals = [sum(values) for values in zip(*await link_shards.fan_out(on_shard, self.db))]
+        
+        values = {
+            "user_id": user_id,
+            "total_links": totals[0],
+            "active_links": totals[1],
+            "total_clicks": totals[2],
+            "top_links": await self._top_links_from_links(user_id),
+            "updated_at": datetime.utcnow(),
+        }
+        stmt = pg_insert(UserStatsTable).values(**values)
+        stmt = stmt.on_conflict_do_update(
+            index_elements=[UserStatsTable.user_id],
+            set_={name: stmt.excluded[name] for name in values if name != "user_id"}
+        )
+        await self.db.execute(stmt)
+        await self.db.commit()
+        return (await self.db.execute(select(UserStatsTable).where(UserStatsTable.user_id == user_id))).scalar_one()
+    
+    async def get_summary(self, user_id: str) -> Optional[UserSummary]:
+        """A user's dashboard summary: one primary key read once the row exists"""
+        stats = (await self.db.execute(
+            select(UserStatsTable).where(UserStatsTable.user_id == user_id)
+        )).scalar_one_or_none()
+        if stats is None:
+            stats = await self.rebuild(user_id)
+            if stats is None:
+                return None
+        
+        return UserSummary(
+            user_id=stats.user_id,
+            total_links=stats.total_links,
+            active_links=stats.active_links,
+            total_clicks=stats.total_clicks,
+            top_links=[TopLink(**link) for link in stats.top_links or []],
+            updated_at=stats.updated_at
+        )
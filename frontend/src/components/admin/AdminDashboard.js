@@ -1,4 +1,4 @@
-import React, { useState } from 'react';
+import React, { useState, useEffect } from 'react';
 import { useTheme } from '../../contexts/ThemeContext';
 
 const AdminDashboard = ({ user, links, users, analytics, onViewChange }) => {
@@ -9,11 +9,21 @@ const AdminDashboard = ({ user, links, users, analytics, onViewChange }) => {
   const [showSettings, setShowSettings] = useState(false);
   const { isDark } = useTheme();
 
+  const [metrics, setMetrics] = useState(null);
+
+  // Platform totals come from the server's materialized snapshot; fall back to local data
+  useEffect(() => {
+    fetch(`${process.env.REACT_APP_BACKEND_URL}/api/admin/metrics`)
+      .then(response => (response.ok ? response.json() : null))
+      .then(setMetrics)
+      .catch(() => setMetrics(null));
+  }, []);
+
   const customerUsers = users.filter(u => u.type === 'customer');
-  const totalUsers = users.length;
-  const totalLinks = links.length;
-  const totalClicks = analytics.totalClicks || 0;
-  const activeLinks = links.filter(link => link.isActive).length;
+  const totalUsers = metrics ? metrics.users_total : users.length;
+  const totalLinks = metrics ? metrics.links_total : links.length;
+  const totalClicks = metrics ? metrics.clicks_total : (analytics.totalClicks || 0);
+  const activeLinks = metrics ? metrics.links_active : links.filter(link => link.isActive).length;
 
   return (
     <div className="min-h-screen bg-gray-50 dark:bg-gray-900 py-8">
@@ -24,6 +34,11 @@ const AdminDashboard = ({ user, links, users, analytics, onViewChange }) => {
             <div>
               <h1 className="text-3xl font-bold text-gray-900 dark:text-white">Admin Dashboard</h1>
               <p className="text-gray-600 dark:text-gray-400">Manage users, links, and system analytics</p>
+              {metrics && (
+                <p className="text-xs text-gray-500 dark:text-gray-500">
+                  Metrics updated {Math.round(metrics.stale_seconds / 60)} min ago
+                </p>
+              )}
             </div>
             <div className="flex items-center space-x-4">
               <button
@@ -1,4 +1,4 @@
-import React, { useState } from 'react';
+import React, { useState, useEffect } from 'react';
 import { DOMAIN_CONFIG } from '../../config/domains';
 import { useTheme } from '../../contexts/ThemeContext';
 
@@ -19,7 +19,20 @@ const CustomerDashboard = ({ user, links, onCreateLink, onDeleteLink, onToggleLi
     }
   };
 
-  const totalClicks = links.reduce((sum, link) => sum + link.clicks, 0);
+  const [summary, setSummary] = useState(null);
+
+  // Totals come from the server-maintained summary; fall back to the local links
+  useEffect(() => {
+    if (!user?.id) return;
+    fetch(`${process.env.REACT_APP_BACKEND_URL}/api/users/${user.id}/summary`)
+      .then(response => (response.ok ? response.json() : null))
+      .then(setSummary)
+      .catch(() => setSummary(null));
+  }, [user?.id, links.length]);
+
+  const totalLinks = summary ? summary.total_links : links.length;
+  const totalClicks = summary ? summary.total_clicks : links.reduce((sum, link) => sum + link.clicks, 0);
+  const activeLinks = summary ? summary.active_links : links.filter(link => link.isActive).length;
 
   const copyToClipboard = async (text, linkId) => {
     try {
@@ -217,7 +230,7 @@ const CustomerDashboard = ({ user, links, onCreateLink, onDeleteLink, onToggleLi
               </div>
               <div className="ml-4">
                 <h3 className="text-lg font-semibold text-gray-900 dark:text-white">Total Links</h3>
-                <p className="text-3xl font-bold text-blue-600 dark:text-blue-400">{links.length}</p>
+                <p className="text-3xl font-bold text-blue-600 dark:text-blue-400">{totalLinks}</p>
               </div>
             </div>
           </div>
@@ -245,7 +258,7 @@ const CustomerDashboard = ({ user, links, onCreateLink, onDeleteLink, onToggleLi
               </div>
               <div className="ml-4">
                 <h3 className="text-lg font-semibold text-gray-900 dark:text-white">Active Links</h3>
-                <p className="text-3xl font-bold text-purple-600 dark:text-purple-400">{links.filter(link => link.isActive).length}</p>
+                <p className="text-3xl font-bold text-purple-600 dark:text-purple-400">{activeLinks}</p>
               </div>
             </div>
           </div>
@@ -10,20 +10,12 @@ const HomePage = ({ onViewChange, onCreateLink }) => {
   const [loading, setLoading] = useState(false);
   const [showUpgradeModal, setShowUpgradeModal] = useState(false);
   const [copySuccess, setCopySuccess] = useState(false);
-  const { checkPlanLimits, incrementUsage, isProUser } = useSubscription();
+  const { recordLinkCreated, isProUser } = useSubscription();
 
   const handleShortenUrl = async (e) => {
     e.preventDefault();
     if (!url) return;
 
-    // Check plan limits for anonymous users (assume they have basic plan)
-    const limitCheck = await checkPlanLimits('anonymous', 'create_link');
-    if (!limitCheck.allowed) {
-      alert(limitCheck.message);
-      setShowUpgradeModal(true);
-      return;
-    }
-
     setLoading(true);
     
     try {
@@ -45,8 +37,13 @@ const HomePage = ({ onViewChange, onCreateLink }) => {
         setUrl('');
         setTitle('');
         
-        // Increment usage for anonymous users
-        incrementUsage('anonymous', 'link_created');
+        // The backend already counted this link against the plan quota
+        recordLinkCreated();
+      } else if (response.status === 403) {
+        // Plan limit reached; enforced server-side when the link is created
+        const error = await response.json();
+        alert(error.detail);
+        setShowUpgradeModal(true);
       } else {
         throw new Error('Failed to create link');
       }
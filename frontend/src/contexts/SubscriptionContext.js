@@ -191,6 +191,16 @@ export const SubscriptionProvider = ({ children }) => {
     }
   };
 
+  // Record a link created through POST /api/links, which reserves quota server-side
+  const recordLinkCreated = () => {
+    dispatch({ 
+      type: UPDATE_USAGE, 
+      payload: { 
+        linksCreated: state.usage.linksCreated + 1 
+      } 
+    });
+  };
+
   // Get plan features
   const getPlanFeatures = (planType) => {
     const plan = state.availablePlans.find(p => p.plan_type === planType);
@@ -244,6 +254,7 @@ export const SubscriptionProvider = ({ children }) => {
     upgradeSubscription,
     checkPlanLimits,
     incrementUsage,
+    recordLinkCreated,
     getPlanFeatures,
     getPlanLimits,
     hasFeature,
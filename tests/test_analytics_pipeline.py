@@ -0,0 +1,105 @@
+"""Analytics batches split across a separate shard and the primary"""
+import asyncio
+import os
+import sys
+from contextlib import asynccontextmanager
+
+import pytest
+
+pytest.importorskip("sqlalchemy")
+pytest.importorskip("asyncpg")
+pytest.importorskip("pydantic")
+pytest.importorskip("numpy")
+
+# database.py builds its engine from DATABASE_URL at import time; nothing connects to it here
+os.environ.setdefault("DATABASE_URL", os.getenv("TEST_DATABASE_URL", "postgresql://localhost/linkly_test"))
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "backend"))
+
+import analytics_pipeline  # noqa: E402
+from analytics_pipeline import AnalyticsPipeline, ClickEvent  # noqa: E402
+
+class Row:
+    def __init__(self, **values):
+        self.__dict__.update(values)
+
+class FakeSession:
+    def __init__(self, fail_commit=False):
+        self.fail_commit = fail_commit
+        self.commits = 0
+        self.rollbacks = 0
+    
+    async def commit(self):
+        if self.fail_commit:
+            raise RuntimeError("primary is down")
+        self.commits += 1
+    
+    async def rollback(self):
+        self.rollbacks += 1
+
+class FakeShardMap:
+    """Shard 0 on the primary, shard 1 in its own database"""
+    
+    def __init__(self):
+        self.shards = [Row(is_primary=True), Row(is_primary=False)]
+        self.separate = FakeSession()
+    
+    @asynccontextmanager
+    async def session(self, shard, db=None):
+        yield db if self.shards[shard].is_primary else self.separate
+    
+    @staticmethod
+    def is_separate(session, db):
+        return session is not db
+
+class FakeUserStats:
+    def __init__(self, db):
+        pass
+    
+    async def lock(self, user_ids):
+        list(user_ids)
+    
+    async def record_clicks(self, clicks_by_link, links=None):
+        pass
+
+def test_failed_primary_commit_retries_only_the_primary_shard(monkeypatch):
+    shard_map = FakeShardMap()
+    primary = FakeSession(fail_commit=True)
+    
+    @asynccontextmanager
+    async def session_local():
+        yield primary
+    
+    async def intern_dimensions(db, events):
+        return [{} for _ in events]
+    
+    async def record_daily_clicks(db, click_dates):
+        list(click_dates)
+    
+    written = []
+    
+    async def write_shard(db, events, rows, now):
+        written.extend(event.link_id for event in events)
+        return []
+    
+    monkeypatch.setattr(analytics_pipeline, "link_shards", shard_map)
+    monkeypatch.setattr(analytics_pipeline, "AsyncSessionLocal", session_local)
+    monkeypatch.setattr(analytics_pipeline, "intern_dimensions", intern_dimensions)
+    monkeypatch.setattr(analytics_pipeline, "record_daily_clicks", record_daily_clicks)
+    monkeypatch.setattr(analytics_pipeline, "UserStatsService", FakeUserStats)
+    
+    pipeline = AnalyticsPipeline()
+    pipeline._write_shard = write_shard
+    pipeline.submit(ClickEvent("on-primary", None, None, shard=0))
+    pipeline.submit(ClickEvent("on-shard", None, None, shard=1))
+    
+    asyncio.run(pipeline.flush())
+    assert shard_map.separate.commits == 1
+    assert [event.link_id for event in pipeline._queue] == ["on-primary"]
+    
+    primary.fail_commit = False
+    asyncio.run(pipeline.flush())
+    assert pipeline.pending() == 0
+    assert primary.commits == 1
+    # The separate shard's click was written once, the primary's once per attempt
+    assert written == ["on-primary", "on-shard", "on-primary"]
+    assert shard_map.separate.commits == 1
@@ -0,0 +1,61 @@
+"""Bot classification by user agent and crawler network"""
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "backend"))
+
+from bot_filter import BotClassifier, client_ip, is_bot_user_agent  # noqa: E402
+
+CHROME_ON_CUBOT = (
+    "Mozilla/5.0 (Linux; Android 9; CUBOT P30) AppleWebKit/537.36 (KHTML, like Gecko) "
+    "Chrome/83.0.4103.106 Mobile Safari/537.36"
+)
+PINTEREST_IN_APP_ANDROID = (
+    "Mozilla/5.0 (Linux; Android 12; SM-G991B Build/SP1A.210812.016; wv) AppleWebKit/537.36 "
+    "(KHTML, like Gecko) Version/4.0 Chrome/114.0.5735.196 Mobile Safari/537.36 [Pinterest/Android]"
+)
+PINTEREST_IN_APP_IOS = (
+    "Mozilla/5.0 (iPhone; CPU iPhone OS 16_5 like Mac OS X) AppleWebKit/605.1.15 "
+    "(KHTML, like Gecko) Mobile/15E148 [Pinterest/iOS]"
+)
+
+def test_phone_and_in_app_browsers_are_not_bots():
+    assert not is_bot_user_agent(CHROME_ON_CUBOT)
+    assert not is_bot_user_agent("Mozilla/5.0 (Linux; Android 11; CUBOT NOTE 20 PRO) Chrome/99.0 Mobile Safari/537.36")
+    assert not is_bot_user_agent(PINTEREST_IN_APP_ANDROID)
+    assert not is_bot_user_agent(PINTEREST_IN_APP_IOS)
+
+def test_crawlers_are_bots():
+    for user_agent in (
+        "Mozilla/5.0 (compatible; Googlebot/2.1; +http://www.google.com/bot.html)",
+        "Mozilla/5.0 (compatible; Pinterestbot/1.0; +http://www.pinterest.com/bot.html)",
+        "Pinterest/0.2 (+https://www.pinterest.com/)",
+        "AdsBot-Google (+http://www.google.com/adsbot.html)",
+        "Slackbot-LinkExpanding 1.0 (+https://api.slack.com/robots)",
+        "Mozilla/5.0 (compatible; YandexBot/3.0; +http://yandex.com/bots)",
+        "TelegramBot (like TwitterBot)",
+        "curl/8.4.0",
+    ):
+        assert is_bot_user_agent(user_agent), user_agent
+
+def test_crawler_networks_and_missing_user_agents():
+    classifier = BotClassifier(["66.249.64.0/19"])
+    assert classifier.is_bot(CHROME_ON_CUBOT, "66.249.66.1")
+    assert not classifier.is_bot(CHROME_ON_CUBOT, "203.0.113.7")
+    assert classifier.is_bot(None, "203.0.113.7")
+
+class Headers:
+    def __init__(self, *pairs):
+        self.pairs = pairs
+    
+    def getlist(self, name):
+        return [value for key, value in self.pairs if key == name]
+
+class Client:
+    host = "10.0.0.1"
+
+def test_client_ip_ignores_forwarded_hops_the_client_sent():
+    headers = Headers(("x-forwarded-for", "66.249.66.1"), ("x-forwarded-for", "203.0.113.7"))
+    assert client_ip(headers, Client(), trusted_hops=1) == "203.0.113.7"
+    assert client_ip(headers, Client(), trusted_hops=0) == "10.0.0.1"
+    assert client_ip(Headers(), Client(), trusted_hops=1) == "10.0.0.1"
@@ -0,0 +1,97 @@
+"""Resumable chunked uploads on a temporary upload directory"""
+import asyncio
+import hashlib
+import os
+import sys
+from datetime import datetime, timedelta
+
+import pytest
+
+pytest.importorskip("pydantic")
+pytest.importorskip("aiofiles")
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "backend"))
+
+from models import ImportType  # noqa: E402
+from upload_services import ChunkedUploadService, MIN_CHUNK_SIZE, UPLOAD_RETENTION_HOURS  # noqa: E402
+
+CHUNKS = [bytes([n]) * MIN_CHUNK_SIZE for n in range(1, 3)]
+
+async def _stream(data):
+    yield data
+
+async def _start(service, chunks=CHUNKS):
+    upload = await service.init_upload(
+        "links.csv", sum(map(len, chunks)), ImportType.LINKS, "admin", chunk_size=MIN_CHUNK_SIZE
+    )
+    for index, chunk in enumerate(chunks):
+        await service.write_chunk(upload.upload_id, index, _stream(chunk), hashlib.sha256(chunk).hexdigest())
+    return upload
+
+def test_failed_resend_of_a_received_chunk_must_be_sent_again(tmp_path):
+    async def scenario():
+        service = ChunkedUploadService(tmp_path)
+        upload = await _start(service)
+        corrupt = b"x" * MIN_CHUNK_SIZE
+        with pytest.raises(ValueError, match="Checksum mismatch"):
+            await service.write_chunk(upload.upload_id, 0, _stream(corrupt), hashlib.sha256(CHUNKS[0]).hexdigest())
+        
+        with pytest.raises(ValueError, match="missing 1 chunk"):
+            await service.complete_upload(upload.upload_id)
+        
+        await service.write_chunk(upload.upload_id, 0, _stream(CHUNKS[0]), hashlib.sha256(CHUNKS[0]).hexdigest())
+        return await service.complete_upload(upload.upload_id)
+    
+    upload = asyncio.run(scenario())
+    assert (tmp_path / upload.filename).read_bytes() == b"".join(CHUNKS)
+
+def test_completed_status_is_kept_and_guards_the_upload(tmp_path):
+    async def scenario():
+        service = ChunkedUploadService(tmp_path)
+        upload = await _start(service)
+        await service.complete_upload(upload.upload_id)
+        
+        stored = await service.get_upload(upload.upload_id)
+        with pytest.raises(ValueError, match="already completed"):
+            await service.write_chunk(upload.upload_id, 0, _stream(CHUNKS[0]), hashlib.sha256(CHUNKS[0]).hexdigest())
+        with pytest.raises(ValueError, match="already completed"):
+            await service.complete_upload(upload.upload_id)
+        
+        imported = await service.set_import_job(upload.upload_id, "job-1")
+        with pytest.raises(ValueError, match="already being imported"):
+            await service.set_import_job(upload.upload_id, "job-2")
+        return stored, imported
+    
+    stored, imported = asyncio.run(scenario())
+    assert stored.status == "completed" and stored.received_chunks == [0, 1]
+    assert imported.job_id == "job-1"
+
+def test_expired_uploads_are_removed_with_files_nobody_imported(tmp_path):
+    async def scenario():
+        service = ChunkedUploadService(tmp_path)
+        abandoned = await _start(service, CHUNKS[:1])
+        never_imported = await _start(service)
+        await service.complete_upload(never_imported.upload_id)
+        imported = await _start(service)
+        await service.complete_upload(imported.upload_id)
+        await service.set_import_job(imported.upload_id, "job-1")
+        fresh = await _start(service)
+        
+        expired_at = datetime.utcnow() - timedelta(hours=UPLOAD_RETENTION_HOURS, minutes=1)
+        for upload in (abandoned, never_imported, imported):
+            stored = await service.get_upload(upload.upload_id)
+            stored.created_at = expired_at
+            if stored.completed_at:
+                stored.completed_at = expired_at
+            await service._save(service._upload_path(upload.upload_id), stored)
+        
+        removed = await service.cleanup_expired_uploads()
+        remaining = [upload.upload_id for upload in (abandoned, never_imported, imported, fresh) if await service.get_upload(upload.upload_id)]
+        return removed, remaining, never_imported, imported, fresh
+    
+    removed, remaining, never_imported, imported, fresh = asyncio.run(scenario())
+    assert removed == 3
+    assert remaining == [fresh.upload_id]
+    assert not (tmp_path / never_imported.filename).exists()
+    # The import job still owns its file
+    assert (tmp_path / imported.filename).exists()
@@ -0,0 +1,42 @@
+"""Monthly click counters across month rollovers and failed flushes"""
+import asyncio
+import os
+import sys
+
+import pytest
+
+pytest.importorskip("sqlalchemy")
+pytest.importorskip("asyncpg")
+
+# database.py builds its engine from DATABASE_URL at import time; nothing connects to it here
+os.environ.setdefault("DATABASE_URL", os.getenv("TEST_DATABASE_URL", "postgresql://localhost/linkly_test"))
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "backend"))
+
+import quota_services  # noqa: E402
+from quota_services import ClickQuotaTracker  # noqa: E402
+
+class UnreachableDatabase:
+    async def __aenter__(self):
+        raise RuntimeError("database is down")
+    
+    async def __aexit__(self, *exc_info):
+        return False
+
+def test_unflushed_months_are_kept_through_rollovers_and_failed_flushes(monkeypatch):
+    months = iter(["2026-08", "2026-08", "2026-08", "2026-09", "2026-09", "2026-10", "2026-10", "2026-10"])
+    monkeypatch.setattr(quota_services, "current_month", lambda: next(months))
+    monkeypatch.setattr(quota_services, "AsyncSessionLocal", UnreachableDatabase)
+    
+    tracker = ClickQuotaTracker(mode="off")
+    tracker.record_click("u1", 100)
+    tracker.record_click("u1", 100)
+    # September: August rolls over
+    tracker.record_click("u1", 100)
+    tracker.record_click("u2", 100)
+    # October: September rolls over without August having been flushed
+    tracker.record_click("u1", 100)
+    asyncio.run(tracker.flush())
+    tracker.record_click("u1", 100)
+    
+    assert tracker._rollover == {"2026-08": {"u1": 2}, "2026-09": {"u1": 1, "u2": 1}}
+    assert tracker._pending == {"u1": 2}
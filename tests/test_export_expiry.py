@@ -0,0 +1,74 @@
+"""Expired exports stay readable after their files are cleaned up
+
+    TEST_DATABASE_URL=postgresql://... python -m pytest tests/test_export_expiry.py
+"""
+import asyncio
+import os
+import subprocess
+import sys
+import uuid
+from datetime import datetime, timedelta
+
+import pytest
+
+pytest.importorskip("sqlalchemy")
+pytest.importorskip("asyncpg")
+pytest.importorskip("alembic")
+pytest.importorskip("pydantic")
+pytest.importorskip("aiofiles")
+
+TEST_DATABASE_URL = os.getenv("TEST_DATABASE_URL")
+if not TEST_DATABASE_URL:
+    pytest.skip("TEST_DATABASE_URL is not set", allow_module_level=True)
+
+BACKEND_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "backend")
+
+# database.py builds its engine from DATABASE_URL at import time
+os.environ["DATABASE_URL"] = TEST_DATABASE_URL
+sys.path.insert(0, BACKEND_DIR)
+
+from sqlalchemy import delete, insert  # noqa: E402
+from database import AsyncSessionLocal, ExportJobTable, engine  # noqa: E402
+from models import ExportStatus  # noqa: E402
+from export_services import ExportService  # noqa: E402
+
+@pytest.fixture(scope="module", autouse=True)
+def migrated_schema():
+    subprocess.run(
+        [sys.executable, "-m", "alembic", "upgrade", "head"],
+        cwd=BACKEND_DIR, check=True, env={**os.environ, "DATABASE_URL": TEST_DATABASE_URL}
+    )
+
+def test_cleaned_up_export_reads_back_as_expired(tmp_path):
+    export_id = uuid.uuid4().hex
+    filename = f"{export_id}.csv"
+    (tmp_path / filename).write_text("id\n")
+
+    async def scenario():
+        try:
+            async with AsyncSessionLocal() as db:
+                await db.execute(insert(ExportJobTable).values(
+                    id=export_id,
+                    export_type="links",
+                    format="csv",
+                    status=ExportStatus.COMPLETED,
+                    filename=filename,
+                    created_at=datetime.utcnow() - timedelta(days=2),
+                    completed_at=datetime.utcnow() - timedelta(days=2),
+                    expires_at=datetime.utcnow() - timedelta(days=1)
+                ))
+                await db.commit()
+
+                service = ExportService(db)
+                await service.cleanup_expired_exports(tmp_path)
+                job = await service.get_export_job(export_id)
+
+                await db.execute(delete(ExportJobTable).where(ExportJobTable.id == export_id))
+                await db.commit()
+                return job
+        finally:
+            await engine.dispose()
+
+    job = asyncio.run(scenario())
+    assert job.status == ExportStatus.EXPIRED
+    assert not (tmp_path / filename).exists()
@@ -0,0 +1,69 @@
+"""Row errors stored for an import job are capped; the summary still counts them all
+
+    TEST_DATABASE_URL=postgresql://... python -m pytest tests/test_import_errors.py
+"""
+import asyncio
+import os
+import sys
+
+import pytest
+
+pytest.importorskip("sqlalchemy")
+pytest.importorskip("asyncpg")
+pytest.importorskip("pydantic")
+pytest.importorskip("pandas")
+
+TEST_DATABASE_URL = os.getenv("TEST_DATABASE_URL")
+if not TEST_DATABASE_URL:
+    pytest.skip("TEST_DATABASE_URL is not set", allow_module_level=True)
+
+# database.py builds its engine from DATABASE_URL at import time
+os.environ["DATABASE_URL"] = TEST_DATABASE_URL
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "backend"))
+
+from sqlalchemy import delete, func, select  # noqa: E402
+from database import AsyncSessionLocal, Base, ImportJobErrorTable, ImportJobTable, engine  # noqa: E402
+from models import ImportType  # noqa: E402
+import import_services  # noqa: E402
+from import_services import ImportService  # noqa: E402
+
+def errors(error_type, rows):
+    return [{"row": row, "field": "original_url", "error_type": error_type, "error": f"bad row {row}"} for row in rows]
+
+def test_row_errors_are_capped_per_job(monkeypatch):
+    monkeypatch.setattr(import_services, "MAX_STORED_ERRORS_PER_JOB", 5)
+
+    async def scenario():
+        try:
+            async with engine.begin() as conn:
+                await conn.run_sync(
+                    Base.metadata.create_all,
+                    tables=[ImportJobTable.__table__, ImportJobErrorTable.__table__]
+                )
+
+            async with AsyncSessionLocal() as db:
+                service = ImportService(db)
+                job = await service.create_import_job(ImportType.LINKS, "links.csv", "links.csv", "tester")
+
+                await service.record_errors(job.id, errors("missing_original_url", range(1, 5)))
+                await service.record_errors(job.id, errors("missing_original_url", [5, 6]) + errors("invalid_url", [7, 8]))
+
+                stored = await db.scalar(
+                    select(func.count()).select_from(ImportJobErrorTable).where(ImportJobErrorTable.job_id == job.id)
+                )
+                saved = (await db.execute(
+                    select(ImportJobTable.errors, ImportJobTable.job_metadata).where(ImportJobTable.id == job.id)
+                )).fetchone()
+
+                await db.execute(delete(ImportJobErrorTable).where(ImportJobErrorTable.job_id == job.id))
+                await db.execute(delete(ImportJobTable).where(ImportJobTable.id == job.id))
+                await db.commit()
+                return stored, saved
+        finally:
+            await engine.dispose()
+
+    stored, job = asyncio.run(scenario())
+    assert stored == 5
+    assert {item["error_type"]: item["count"] for item in job.errors} == {"missing_original_url": 6, "invalid_url": 2}
+    assert job.job_metadata["errors_stored"] == 5
+    assert job.job_metadata["errors_truncated"] is True
@@ -0,0 +1,37 @@
+"""Incremental JSON parsing of import files at every read boundary"""
+import io
+import json
+import os
+import sys
+
+import pytest
+
+pytest.importorskip("sqlalchemy")
+pytest.importorskip("asyncpg")
+pytest.importorskip("pydantic")
+pytest.importorskip("pandas")
+
+# database.py builds its engine from DATABASE_URL at import time; nothing connects to it here
+os.environ.setdefault("DATABASE_URL", os.getenv("TEST_DATABASE_URL", "postgresql://localhost/linkly_test"))
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "backend"))
+
+from import_services import FileProcessor  # noqa: E402
+
+DOCUMENTS = [
+    '[1.5e3]',
+    '[-12.25E+2, {"a": 1.0e-3, "b": [true, null]}, 7, "x"]',
+    '[0.5,10,1e2]',
+    ' [ 123456 , 2.5 ] ',
+]
+
+@pytest.mark.parametrize("document", DOCUMENTS)
+@pytest.mark.parametrize("read_size", range(1, 9))
+def test_array_elements_survive_any_read_boundary(document, read_size):
+    values = list(FileProcessor().iter_json_stream(io.StringIO(document), read_size=read_size))
+    assert values == json.loads(document)
+
+@pytest.mark.parametrize("read_size", range(1, 9))
+def test_concatenated_values_survive_any_read_boundary(read_size):
+    document = '{"a": 1}\n1.5e3\n-2.25\n{"b": 2}'
+    values = list(FileProcessor().iter_json_stream(io.StringIO(document), read_size=read_size))
+    assert values == [{"a": 1}, 1500.0, -2.25, {"b": 2}]
@@ -0,0 +1,111 @@
+"""Query-plan regression test for the request-path queries
+
+Runs against a real Postgres named by TEST_DATABASE_URL (the schema is
+brought up with `alembic upgrade head`) and EXPLAINs every query the API
+endpoints issue, with sequential scans disabled. A query whose plan still
+contains a Seq Scan has no usable index and fails the test.
+
+    TEST_DATABASE_URL=postgresql://... python -m pytest tests/test_query_plans.py
+"""
+import asyncio
+import json
+import os
+import subprocess
+import sys
+from datetime import datetime
+
+import pytest
+
+pytest.importorskip("sqlalchemy")
+pytest.importorskip("asyncpg")
+pytest.importorskip("alembic")
+
+TEST_DATABASE_URL = os.getenv("TEST_DATABASE_URL")
+if not TEST_DATABASE_URL:
+    pytest.skip("TEST_DATABASE_URL is not set", allow_module_level=True)
+
+BACKEND_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "backend")
+
+# database.py builds its engine from DATABASE_URL at import time
+os.environ["DATABASE_URL"] = TEST_DATABASE_URL
+sys.path.insert(0, BACKEND_DIR)
+
+from sqlalchemy import select, text  # noqa: E402
+from sqlalchemy.dialects import postgresql  # noqa: E402
+from sqlalchemy.ext.asyncio import create_async_engine  # noqa: E402
+from database import (  # noqa: E402
+    DATABASE_URL, UserTable, UserStatsTable, UserClickCounterTable, SubscriptionTable, LinkTable,
+    ImportJobTable, ImportJobErrorTable, ExportJobTable, AnalyticsTable, DomainTable, ContactTable,
+    PlatformMetricsTable, DailyClickCountTable
+)
+
+NOW = datetime(2026, 1, 1)
+
+# Every query an endpoint runs per request, as the endpoint builds it
+REQUEST_PATH_QUERIES = {
+    "redirect by short code": select(LinkTable).where(LinkTable.short_code == "abc123"),
+    "link by id": select(LinkTable).where(LinkTable.id == "link-id"),
+    "links by user": select(LinkTable).where(LinkTable.user_id == "user-id").order_by(LinkTable.created_at.desc()).limit(100),
+    "links by email": select(LinkTable).where(LinkTable.user_email == "a@b.c").order_by(LinkTable.created_at.desc()).limit(100),
+    "all links": select(LinkTable).order_by(LinkTable.created_at.desc()).limit(100),
+    "top links (cache warm-up)": select(LinkTable.id, LinkTable.short_code, LinkTable.clicks).where(
+        LinkTable.is_active == True, LinkTable.short_code.isnot(None)  # noqa: E712
+    ).order_by(LinkTable.clicks.desc()).limit(1000),
+    "top links of user": select(LinkTable.id, LinkTable.clicks).where(LinkTable.user_id == "user-id").order_by(LinkTable.clicks.desc()).limit(5),
+    "users": select(UserTable).order_by(UserTable.created_at.desc()),
+    "user by id": select(UserTable).where(UserTable.id == "user-id"),
+    "user summary": select(UserStatsTable).where(UserStatsTable.user_id == "user-id"),
+    "active subscription": select(SubscriptionTable).where(
+        SubscriptionTable.user_id == "user-id", SubscriptionTable.is_active == True  # noqa: E712
+    ),
+    "import jobs": select(ImportJobTable).order_by(ImportJobTable.created_at.desc()).limit(50),
+    "import jobs by creator": select(ImportJobTable).where(ImportJobTable.created_by == "user-id").order_by(ImportJobTable.created_at.desc()).limit(50),
+    "import jobs by type": select(ImportJobTable).where(ImportJobTable.import_type == "links").order_by(ImportJobTable.created_at.desc()).limit(50),
+    "import job errors": select(ImportJobErrorTable).where(ImportJobErrorTable.job_id == "job-id").order_by(ImportJobErrorTable.id).limit(100),
+    "expired exports": select(ExportJobTable.id, ExportJobTable.filename).where(
+        ExportJobTable.status == "completed", ExportJobTable.expires_at <= NOW
+    ),
+    "monthly click counters": select(UserClickCounterTable.user_id, UserClickCounterTable.clicks).where(UserClickCounterTable.month == "2026-01"),
+    "link analytics": select(AnalyticsTable).where(AnalyticsTable.link_id == "link-id").order_by(AnalyticsTable.click_date),
+    "analytics export range": select(AnalyticsTable).where(AnalyticsTable.click_date >= NOW).order_by(AnalyticsTable.click_date),
+    "domains of user": select(DomainTable).where(DomainTable.owner_user_id == "user-id"),
+    "contacts export": select(ContactTable).order_by(ContactTable.created_at),
+    "contact by email": select(ContactTable).where(ContactTable.email == "a@b.c"),
+    "platform metrics": select(PlatformMetricsTable).where(PlatformMetricsTable.name == "platform"),
+    "clicks per day": select(DailyClickCountTable).where(DailyClickCountTable.day >= NOW.date()).order_by(DailyClickCountTable.day),
+}
+
+def _plan_nodes(plan):
+    yield plan
+    for child in plan.get("Plans", []):
+        yield from _plan_nodes(child)
+
+async def _seq_scans():
+    engine = create_async_engine(DATABASE_URL)
+    found = {}
+    try:
+        async with engine.connect() as conn:
+            await conn.execute(text("SET enable_seqscan = off"))
+            for name, stmt in REQUEST_PATH_QUERIES.items():
+                sql = str(stmt.compile(dialect=postgresql.dialect(), compile_kwargs={"literal_binds": True}))
+                result = await conn.execute(text(f"EXPLAIN (FORMAT JSON) {sql}"))
+                plan = result.scalar()
+                if isinstance(plan, str):
+                    plan = json.loads(plan)
+                tables = [node.get("Relation Name") for node in _plan_nodes(plan[0]["Plan"]) if node["Node Type"] == "Seq Scan"]
+                if tables:
+                    found[name] = tables
+    finally:
+        await engine.dispose()
+    return found
+
+@pytest.fixture(scope="module", autouse=True)
+def migrated_schema():
+    subprocess.run(
+        [sys.executable, "-m", "alembic", "upgrade", "head"],
+        cwd=BACKEND_DIR, check=True, env={**os.environ, "DATABASE_URL": TEST_DATABASE_URL}
+    )
+
+def test_request_path_queries_use_indexes():
+    seq_scans = asyncio.run(_seq_scans())
+    assert not seq_scans, f"Queries falling back to a sequential scan: {seq_scans}"
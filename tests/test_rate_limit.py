@@ -0,0 +1,68 @@
+"""Token bucket rate limiting: eviction and client identity"""
+import asyncio
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "backend"))
+
+from rate_limit import InMemoryRateLimitBackend, RateLimit, RateLimitMiddleware, forwarded_client_ip  # noqa: E402
+
+def test_full_backend_evicts_the_least_recently_used_bucket():
+    backend = InMemoryRateLimitBackend(max_keys=3)
+    for key in ("a", "b", "c"):
+        backend.take_now(key, rate=1.0, burst=1.0, now=0.0)
+    assert backend.take_now("a", rate=1.0, burst=1.0, now=0.0) > 0
+    
+    backend.take_now("d", rate=1.0, burst=1.0, now=0.0)
+    assert list(backend._buckets) == ["c", "a", "d"]
+    # "a" kept its empty bucket instead of being reset with everyone else
+    assert backend.take_now("a", rate=1.0, burst=1.0, now=0.0) > 0
+
+def test_identity_headers_do_not_get_a_fresh_bucket():
+    statuses = []
+    
+    async def app(scope, receive, send):
+        await send({"type": "http.response.start", "status": 200, "headers": []})
+    
+    async def send(message):
+        if message["type"] == "http.response.start":
+            statuses.append(message["status"])
+    
+    middleware = RateLimitMiddleware(app, InMemoryRateLimitBackend(), {"create": RateLimit(1, 60)})
+    
+    async def requests():
+        for n in range(3):
+            headers = [(b"x-api-key", f"key-{n}".encode()), (b"x-user-id", f"user-{n}".encode())]
+            scope = {"type": "http", "method": "POST", "path": "/api/links", "headers": headers, "client": ("10.0.0.1", 1234)}
+            await middleware(scope, None, send)
+    
+    asyncio.run(requests())
+    assert statuses == [200, 429, 429]
+
+def test_forwarded_for_trusts_only_the_hops_proxies_appended():
+    assert forwarded_client_ip("spoofed, 198.51.100.7", "10.0.0.1", trusted_hops=1) == "198.51.100.7"
+    assert forwarded_client_ip("spoofed, 198.51.100.7, 10.0.0.2", "10.0.0.1", trusted_hops=2) == "198.51.100.7"
+    assert forwarded_client_ip("198.51.100.7", "10.0.0.1", trusted_hops=2) == "198.51.100.7"
+    assert forwarded_client_ip("198.51.100.7", "10.0.0.1", trusted_hops=0) == "10.0.0.1"
+    assert forwarded_client_ip(None, "10.0.0.1", trusted_hops=1) == "10.0.0.1"
+
+def test_rotating_the_leftmost_forwarded_hop_does_not_get_a_fresh_bucket():
+    statuses = []
+    
+    async def app(scope, receive, send):
+        await send({"type": "http.response.start", "status": 200, "headers": []})
+    
+    async def send(message):
+        if message["type"] == "http.response.start":
+            statuses.append(message["status"])
+    
+    middleware = RateLimitMiddleware(app, InMemoryRateLimitBackend(), {"create": RateLimit(1, 60)}, trusted_hops=1)
+    
+    async def requests():
+        for n in range(3):
+            headers = [(b"x-forwarded-for", f"203.0.113.{n}, 198.51.100.7".encode())]
+            scope = {"type": "http", "method": "POST", "path": "/api/links", "headers": headers, "client": ("10.0.0.1", 1234)}
+            await middleware(scope, None, send)
+    
+    asyncio.run(requests())
+    assert statuses == [200, 429, 429]
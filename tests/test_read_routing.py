@@ -0,0 +1,91 @@
+"""Read-replica routing and the read-your-writes window
+
+Needs two local Postgres instances, e.g. a second cluster on another port
+standing in for the replica:
+
+    TEST_DATABASE_URL=postgresql://localhost:5432/linkly \\
+    TEST_DATABASE_REPLICA_URL=postgresql://localhost:5433/linkly \\
+    python -m pytest tests/test_read_routing.py
+"""
+import asyncio
+import os
+import sys
+import time
+
+import pytest
+
+pytest.importorskip("sqlalchemy")
+pytest.importorskip("asyncpg")
+pytest.importorskip("starlette")
+
+TEST_DATABASE_URL = os.getenv("TEST_DATABASE_URL")
+TEST_DATABASE_REPLICA_URL = os.getenv("TEST_DATABASE_REPLICA_URL")
+if not (TEST_DATABASE_URL and TEST_DATABASE_REPLICA_URL):
+    pytest.skip("TEST_DATABASE_URL and TEST_DATABASE_REPLICA_URL are not set", allow_module_level=True)
+
+os.environ.setdefault("DATABASE_URL", TEST_DATABASE_URL)
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "backend"))
+
+from sqlalchemy import text  # noqa: E402
+from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine  # noqa: E402
+from sqlalchemy.orm import sessionmaker  # noqa: E402
+from starlette.requests import Request  # noqa: E402
+import database  # noqa: E402
+import db_routing  # noqa: E402
+
+def _request(cookie=None):
+    headers = [(b"cookie", f"{db_routing.READ_YOUR_WRITES_COOKIE}={cookie}".encode())] if cookie else []
+    return Request({"type": "http", "method": "GET", "path": "/api/links", "headers": headers})
+
+async def _server_port(request):
+    routed = db_routing.get_read_db(request)
+    session = await routed.__anext__()
+    try:
+        return (await session.execute(text("SELECT current_setting('port')"))).scalar()
+    finally:
+        await routed.aclose()
+
+async def _call(middleware, method, status):
+    sent = []
+    
+    async def app(scope, receive, send):
+        await send({"type": "http.response.start", "status": status, "headers": []})
+        await send({"type": "http.response.body", "body": b""})
+    
+    async def send(message):
+        sent.append(message)
+    
+    await middleware(app)({"type": "http", "method": method, "path": "/api/links"}, None, send)
+    return [value.decode() for name, value in sent[0]["headers"] if name == b"set-cookie"]
+
+@pytest.fixture
+def replica(monkeypatch):
+    engine = create_async_engine(database._async_url(TEST_DATABASE_REPLICA_URL))
+    monkeypatch.setattr(db_routing, "REPLICA_ENABLED", True)
+    monkeypatch.setattr(db_routing, "ReplicaSessionLocal", sessionmaker(engine, class_=AsyncSession, expire_on_commit=False))
+    return engine
+
+def test_reads_go_to_replica_unless_client_just_wrote(replica):
+    async def ports():
+        replica_port = await _server_port(_request())
+        primary_port = await _server_port(_request(cookie=f"{time.time() + 30:.3f}"))
+        expired_port = await _server_port(_request(cookie=f"{time.time() - 1:.3f}"))
+        await replica.dispose()
+        await database.engine.dispose()
+        return replica_port, primary_port, expired_port
+    
+    replica_port, primary_port, expired_port = asyncio.run(ports())
+    assert replica_port != primary_port
+    assert expired_port == replica_port
+
+def test_successful_mutations_open_read_your_writes_window():
+    def middleware(app):
+        return db_routing.ReadYourWritesMiddleware(app, window_seconds=5)
+    
+    cookies = asyncio.run(_call(middleware, "POST", 200))
+    assert len(cookies) == 1 and cookies[0].startswith(f"{db_routing.READ_YOUR_WRITES_COOKIE}=")
+    until = float(cookies[0].split(";")[0].split("=", 1)[1])
+    assert time.time() < until <= time.time() + 5
+    
+    assert asyncio.run(_call(middleware, "GET", 200)) == []
+    assert asyncio.run(_call(middleware, "PUT", 404)) == []
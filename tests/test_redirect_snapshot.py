@@ -0,0 +1,144 @@
+"""Edge redirect snapshots: file round trip, deltas, and the database-free redirect server"""
+import asyncio
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "backend"))
+
+from redirect_snapshot import (  # noqa: E402
+    RedirectSnapshot, RedirectTable, SnapshotRedirectApp, PerfectHashIndex, KIND_DELTA,
+    SNAPSHOT_NAME, snapshot_name, delta_name, index_name, prune_snapshots
+)
+
+LINKS = {f"c{n:05d}": f"https://example.com/page/{n}?ref=é" for n in range(2000)}
+
+def test_snapshot_round_trip_through_mmap(tmp_path):
+    path = str(tmp_path / snapshot_name(1))
+    RedirectSnapshot.build(LINKS.items(), version=1).save(path)
+    
+    snapshot = RedirectSnapshot.open(path)
+    assert snapshot.version == 1 and len(snapshot) == len(LINKS)
+    assert all(snapshot.get(code) == url for code, url in LINKS.items())
+    assert snapshot.get("missing") is None and snapshot.get("") is None
+    assert dict(snapshot.items()) == LINKS
+
+def test_perfect_hash_index_maps_every_code_to_its_entry(tmp_path):
+    snapshot = RedirectSnapshot.build(LINKS.items(), version=3)
+    snapshot.save(str(tmp_path / snapshot_name(3)))
+    PerfectHashIndex.build(snapshot).save(str(tmp_path / index_name(3)))
+    
+    index = PerfectHashIndex.open(str(tmp_path / index_name(3)))
+    assert index.version == 3 and len(index) == len(LINKS)
+    assert sorted(index.lookup(code.encode()) for code in LINKS) == list(range(len(LINKS)))
+    
+    table = RedirectTable(str(tmp_path))
+    table.refresh()
+    assert table.snapshot.index is not None
+    assert all(table.get(code) == url for code, url in LINKS.items())
+    assert table.get("missing") is None and table.get("c0000") is None
+
+def test_tiny_snapshots_get_an_index():
+    for size in range(4):
+        entries = list(LINKS.items())[:size]
+        snapshot = RedirectSnapshot.build(entries, version=1)
+        snapshot.index = PerfectHashIndex.build(snapshot)
+        assert all(snapshot.get(code) == url for code, url in entries)
+        assert snapshot.get("missing") is None
+
+def test_deltas_apply_on_top_of_the_snapshot(tmp_path):
+    base = RedirectSnapshot.build(LINKS.items(), version=1)
+    base.save(str(tmp_path / snapshot_name(1)))
+    table = RedirectTable(str(tmp_path))
+    assert table.refresh() and table.version == 1
+    
+    current_links = dict(LINKS)
+    del current_links["c00001"]
+    current_links["c00002"] = "https://example.com/moved"
+    current_links["new"] = "https://example.com/new"
+    current = RedirectSnapshot.build(current_links.items(), version=2)
+    delta = RedirectSnapshot.diff(base, current)
+    assert delta.kind == KIND_DELTA and delta.base_version == 1 and len(delta) == 3
+    delta.save(str(tmp_path / delta_name(1, 2)))
+    
+    assert table.refresh() and table.version == 2
+    assert table.get("c00001") is None
+    assert table.get("c00002") == "https://example.com/moved"
+    assert table.get("new") == "https://example.com/new"
+    assert table.get("c00003") == LINKS["c00003"]
+    assert not table.refresh()
+
+def test_newer_full_snapshot_replaces_a_broken_delta_chain(tmp_path):
+    RedirectSnapshot.build(LINKS.items(), version=1).save(str(tmp_path / snapshot_name(1)))
+    table = RedirectTable(str(tmp_path))
+    table.refresh()
+    
+    RedirectSnapshot.build([("only", "https://example.com/only")], version=5).save(str(tmp_path / snapshot_name(5)))
+    assert table.refresh() and table.version == 5
+    assert table.get("only") == "https://example.com/only" and table.get("c00001") is None
+
+def _export(directory, links, version):
+    # The steps of manage.py export-redirects: delta from the newest snapshot, index, snapshot, prune
+    current = RedirectSnapshot.build(links.items(), version=version)
+    previous = [int(match.group(1)) for match in map(SNAPSHOT_NAME.match, os.listdir(directory)) if match]
+    if previous:
+        base = RedirectSnapshot.open(str(directory / snapshot_name(max(previous))))
+        RedirectSnapshot.diff(base, current).save(str(directory / delta_name(base.version, version)))
+    PerfectHashIndex.build(current).save(str(directory / index_name(version)))
+    current.save(str(directory / snapshot_name(version)))
+    return prune_snapshots(str(directory))
+
+def test_table_moves_to_each_newer_snapshot_and_its_index(tmp_path):
+    _export(tmp_path, LINKS, 1)
+    table = RedirectTable(str(tmp_path))
+    assert table.refresh() and table.version == 1
+    
+    v2 = dict(LINKS, new="https://example.com/new")
+    _export(tmp_path, v2, 2)
+    v3 = dict(v2)
+    del v3["c00001"]
+    assert sorted(_export(tmp_path, v3, 3)) == sorted([snapshot_name(1), index_name(1), delta_name(1, 2)])
+    
+    assert table.refresh()
+    assert table.version == 3 and table.snapshot.version == 3
+    assert table.snapshot.index is not None and table.overlay == {}
+    assert table.get("new") == "https://example.com/new" and table.get("c00001") is None
+    assert sorted(os.listdir(tmp_path)) == sorted([snapshot_name(2), index_name(2), snapshot_name(3), index_name(3), delta_name(2, 3)])
+
+def test_delta_bridges_until_its_snapshot_lands(tmp_path):
+    _export(tmp_path, LINKS, 1)
+    table = RedirectTable(str(tmp_path))
+    table.refresh()
+    
+    # An edge polling between the delta and the snapshot write gets the change from the delta
+    current = RedirectSnapshot.build(dict(LINKS, new="https://example.com/new").items(), version=2)
+    RedirectSnapshot.diff(table.snapshot, current).save(str(tmp_path / delta_name(1, 2)))
+    assert table.refresh() and table.version == 2 and table.overlay
+    
+    PerfectHashIndex.build(current).save(str(tmp_path / index_name(2)))
+    current.save(str(tmp_path / snapshot_name(2)))
+    assert table.refresh() and table.snapshot.version == 2 and table.overlay == {}
+    assert table.snapshot.index is not None and table.get("new") == "https://example.com/new"
+    assert not table.refresh()
+
+def _request(app, path, method="GET", headers=()):
+    sent = []
+    
+    async def send(message):
+        sent.append(message)
+    
+    asyncio.run(app({"type": "http", "method": method, "path": path, "headers": list(headers)}, None, send))
+    return sent[0]["status"], dict(sent[0]["headers"])
+
+def test_server_redirects_without_a_database(tmp_path):
+    RedirectSnapshot.build(LINKS.items(), version=1).save(str(tmp_path / snapshot_name(1)))
+    app = SnapshotRedirectApp(str(tmp_path))
+    app.table.refresh()
+    
+    status, headers = _request(app, "/go/c00042")
+    assert status in (301, 302)
+    assert headers[b"location"] == b"https://example.com/page/42?ref=%C3%A9"
+    
+    assert _request(app, "/go/c00042", "HEAD")[0] == status
+    assert _request(app, "/go/c00042", headers=[(b"if-none-match", headers[b"etag"])])[0] == 304
+    assert _request(app, "/go/nope")[0] == 404
+    assert _request(app, "/go/c00042", "POST")[0] == 404
@@ -0,0 +1,128 @@
+"""Link shard map routing, and fan-out across real shard databases
+
+The routing tests need no database. The fan-out test needs two or more
+empty local Postgres databases for shards:
+
+    TEST_SHARD_URLS=postgresql://localhost/links_0,postgresql://localhost/links_1 \\
+    python -m pytest tests/test_sharding.py
+"""
+import asyncio
+import os
+import sys
+import uuid
+from collections import Counter
+from datetime import datetime, timedelta
+
+import pytest
+
+pytest.importorskip("sqlalchemy")
+pytest.importorskip("asyncpg")
+
+TEST_SHARD_URLS = [url for url in os.getenv("TEST_SHARD_URLS", "").split(",") if url]
+
+# database.py builds its engine from DATABASE_URL at import time; nothing connects to it here
+os.environ.setdefault("DATABASE_URL", os.getenv("TEST_DATABASE_URL", "postgresql://localhost/linkly_test"))
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "backend"))
+
+from sqlalchemy import select, insert, text  # noqa: E402
+from database import LinkTable  # noqa: E402
+from sharding import ShardMap, SHARD_BUCKETS, bucket_for_code  # noqa: E402
+
+def test_single_shard_is_the_primary():
+    shard_map = ShardMap.from_config(None)
+    assert not shard_map.sharded
+    assert set(shard_map.bucket_map) == {0}
+
+def test_buckets_split_evenly_and_explicit_ranges_are_kept():
+    shard_map = ShardMap.from_config({"shards": [
+        {"url": "postgresql://localhost/a"},
+        {"url": "postgresql://localhost/b", "buckets": [0, 99]},
+        {"url": "postgresql://localhost/c"},
+    ]})
+    counts = Counter(shard_map.bucket_map)
+    assert counts[1] == 100
+    assert counts[0] + counts[2] == SHARD_BUCKETS - 100
+    assert abs(counts[0] - counts[2]) <= 1
+    assert all(shard_map.bucket_map[bucket] == 1 for bucket in range(100))
+
+def test_codes_route_by_hash_without_lookup():
+    shard_map = ShardMap.from_config({"shards": [{"url": "postgresql://localhost/a"}, {"url": "postgresql://localhost/b"}]})
+    codes = [uuid.uuid4().hex[:6] for _ in range(2000)]
+    shards = [shard_map.shard_for_code(code) for code in codes]
+    assert shards == [shard_map.bucket_map[bucket_for_code(code)] for code in codes]
+    # Both shards get a fair share
+    assert min(Counter(shards).values()) > 800
+
+def test_unassigned_buckets_are_rejected():
+    with pytest.raises(ValueError):
+        ShardMap.from_config({"shards": [{"url": "postgresql://localhost/a", "buckets": [0, 10]}]})
+
+@pytest.mark.parametrize("buckets", [[-1, 10], [10, SHARD_BUCKETS], [20, 10]])
+def test_out_of_range_buckets_are_rejected(buckets):
+    with pytest.raises(ValueError, match="0 <= first <= last"):
+        ShardMap.from_config({"shards": [{"url": "postgresql://localhost/a", "buckets": buckets}, {"url": "postgresql://localhost/b"}]})
+
+def test_overlapping_buckets_are_rejected():
+    with pytest.raises(ValueError, match="overlap shard 0"):
+        ShardMap.from_config({"shards": [
+            {"url": "postgresql://localhost/a", "buckets": [0, 600]},
+            {"url": "postgresql://localhost/b", "buckets": [500, SHARD_BUCKETS - 1]},
+        ]})
+
+@pytest.mark.skipif(len(TEST_SHARD_URLS) < 2, reason="TEST_SHARD_URLS needs two or more databases")
+def test_links_land_on_their_shard_and_user_lists_fan_out():
+    shard_map = ShardMap.from_config({"shards": [{"url": url} for url in TEST_SHARD_URLS]})
+    user_id = str(uuid.uuid4())
+    started = datetime.utcnow()
+    links = [
+        {
+            "id": str(uuid.uuid4()),
+            "original_url": f"https://example.com/{n}",
+            "short_code": uuid.uuid4().hex[:8],
+            "user_id": user_id,
+            "clicks": 0,
+            "created_at": started + timedelta(seconds=n),
+        }
+        for n in range(40)
+    ]
+    
+    pytest.importorskip("alembic")
+    shard_map.upgrade_schemas()
+    
+    async def scenario():
+        metadata = shard_map.shard_metadata()
+        try:
+            for link in links:
+                async with shard_map.session(shard_map.shard_for_code(link["short_code"])) as db:
+                    await db.execute(insert(LinkTable).values(**link))
+                    await db.commit()
+            
+            async def on_shard(db):
+                stmt = select(LinkTable.id, LinkTable.short_code, LinkTable.created_at).where(LinkTable.user_id == user_id)
+                return (await db.execute(stmt)).fetchall()
+            
+            per_shard = await shard_map.fan_out(on_shard)
+            target = links[7]
+            found = await shard_map.find_shard(
+                lambda db: _scalar(db, select(LinkTable.id).where(LinkTable.id == target["id"]))
+            )
+            return per_shard, found
+        finally:
+            for shard in shard_map.shards:
+                async with shard.engine.begin() as conn:
+                    await conn.run_sync(metadata.drop_all)
+                    await conn.execute(text("DROP TABLE IF EXISTS alembic_version"))
+            await shard_map.dispose()
+    
+    per_shard, (found_shard, found_id) = asyncio.run(scenario())
+    
+    for shard, rows in enumerate(per_shard):
+        assert all(shard_map.shard_for_code(row.short_code) == shard for row in rows)
+    merged = sorted((row for rows in per_shard for row in rows), key=lambda row: row.created_at, reverse=True)
+    assert [row.id for row in merged] == [link["id"] for link in reversed(links)]
+    assert sum(1 for rows in per_shard if rows) >= 2
+    assert found_id == links[7]["id"]
+    assert found_shard == shard_map.shard_for_code(links[7]["short_code"])
+
+async def _scalar(db, stmt):
+    return (await db.execute(stmt)).scalar_one_or_none()
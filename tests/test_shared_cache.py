@@ -0,0 +1,123 @@
+"""Two-tier redirect cache and cross-worker invalidation, on the in-memory stand-in for Redis"""
+import asyncio
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "backend"))
+
+from shared_cache import InMemorySharedCacheBackend, SharedCache  # noqa: E402
+from redirect_cache import RedirectCache, REDIRECT_CACHE_LOCAL_TTL_SECONDS, REDIRECT_CACHE_TTL_SECONDS  # noqa: E402
+
+class Row:
+    def __init__(self, **values):
+        self.__dict__.update(values)
+
+LINK = Row(id="l1", short_url="https://sho.rt/go/abc123", original_url="https://example.com/", user_id="u1", is_active=True)
+
+def _workers(count=2):
+    backend = InMemorySharedCacheBackend()
+    shared = [SharedCache(backend) for _ in range(count)]
+    return shared, [RedirectCache(shared=cache) for cache in shared]
+
+def test_link_loaded_by_one_worker_is_a_hit_for_another():
+    async def scenario():
+        _, (first, second) = _workers()
+        assert await second.get("abc123") is None
+        await first.set("abc123", LINK)
+        link = await second.get("abc123")
+        # Now in the second worker's local tier as well
+        return link, second.get_cached("abc123")
+    
+    link, local = asyncio.run(scenario())
+    assert link.original_url == LINK.original_url and link.user_id == "u1" and link.is_active
+    assert local is link
+
+def test_invalidation_reaches_every_worker():
+    async def scenario():
+        shared, (first, second) = _workers()
+        for cache in shared:
+            cache.start()
+        await asyncio.sleep(0)
+        await first.set("abc123", LINK)
+        await second.get("abc123")
+        
+        await first.invalidate("abc123")
+        await asyncio.sleep(0.01)
+        state = first.get_cached("abc123"), second.get_cached("abc123"), await second.get("abc123")
+        for cache in shared:
+            await cache.stop()
+        return state
+    
+    assert asyncio.run(scenario()) == (None, None, None)
+
+def test_without_shared_store_caches_stay_local():
+    async def scenario():
+        first, second = RedirectCache(shared=SharedCache()), RedirectCache(shared=SharedCache())
+        await first.set("abc123", LINK)
+        await first.invalidate("zzz999")
+        return first.get_cached("abc123"), await second.get("abc123")
+    
+    local, other = asyncio.run(scenario())
+    assert local is not None and other is None
+
+def test_local_only_caches_expire_quickly():
+    # Other workers never hear about an invalidation, so their copies must not outlive it for long
+    assert RedirectCache(shared=SharedCache()).ttl_seconds == REDIRECT_CACHE_LOCAL_TTL_SECONDS
+    assert RedirectCache(shared=SharedCache(InMemorySharedCacheBackend())).ttl_seconds == REDIRECT_CACHE_TTL_SECONDS
+
+def test_concurrent_misses_share_one_load():
+    loads = []
+    
+    async def load():
+        loads.append(1)
+        await asyncio.sleep(0.05)
+        return LINK
+    
+    async def scenario():
+        cache = RedirectCache(shared=SharedCache())
+        links = await asyncio.gather(*(cache.get_or_load("abc123", load) for _ in range(200)))
+        # Later misses after expiry or invalidation start a fresh load
+        cache.drop_local("abc123")
+        again = await cache.get_or_load("abc123", load)
+        return links, again
+    
+    links, again = asyncio.run(scenario())
+    assert len(loads) == 2
+    assert all(link is links[0] for link in links) and links[0].original_url == LINK.original_url
+    assert again.id == LINK.id
+
+def test_load_survives_the_first_caller_giving_up():
+    async def load():
+        await asyncio.sleep(0.05)
+        return LINK
+    
+    async def scenario():
+        cache = RedirectCache(shared=SharedCache())
+        first = asyncio.ensure_future(cache.get_or_load("abc123", load))
+        await asyncio.sleep(0.01)
+        second = asyncio.ensure_future(cache.get_or_load("abc123", load))
+        first.cancel()
+        return await second
+    
+    assert asyncio.run(scenario()).id == LINK.id
+
+def test_load_overtaken_by_an_invalidation_is_not_cached():
+    # The first load is slow and reads the row before the link is deactivated
+    rows = [(0.1, LINK), (0.01, Row(**dict(LINK.__dict__, is_active=False)))]
+    
+    async def load():
+        delay, row = rows.pop(0)
+        await asyncio.sleep(delay)
+        return row
+    
+    async def scenario():
+        cache = RedirectCache(shared=SharedCache())
+        stale = asyncio.ensure_future(cache.get_or_load("abc123", load))
+        await asyncio.sleep(0.01)
+        await cache.invalidate("abc123")
+        fresh = await cache.get_or_load("abc123", load)
+        return await stale, fresh, cache.get_cached("abc123"), cache._loading, cache._generations
+    
+    stale, fresh, cached, loading, generations = asyncio.run(scenario())
+    assert stale.is_active and not fresh.is_active
+    assert cached is fresh and not loading and not generations